@@ -0,0 +1,55 @@
+"""Accounts of an AWS organization and sessions opened in them.
+
+Shared by the tools of the repository watching every account of an organization from its management (or a delegated
+administrator) account.
+"""
+
+from typing import Iterator
+import boto3
+
+
+def _has_tags(org_client, account_id: str, tags: dict) -> bool:
+    paginator = org_client.get_paginator("list_tags_for_resource")
+    account_tags = {tag["Key"]: tag["Value"]
+                    for page in paginator.paginate(ResourceId=account_id) for tag in page["Tags"]}
+    return all(account_tags.get(key) == value for key, value in tags.items())
+
+
+def _parent_accounts(org_client, parent_id: str, recursive: bool) -> Iterator[dict]:
+    for page in org_client.get_paginator("list_accounts_for_parent").paginate(ParentId=parent_id):
+        yield from page["Accounts"]
+    if recursive:
+        for page in org_client.get_paginator("list_organizational_units_for_parent").paginate(ParentId=parent_id):
+            for unit in page["OrganizationalUnits"]:
+                yield from _parent_accounts(org_client, unit["Id"], recursive)
+
+
+def list_member_accounts(org_client, parent_ids: list[str] = None, tags: dict = None,
+                         recursive: bool = True) -> Iterator[str]:
+    """Yield the ids of the active accounts of the organization, fetching the pages of results only when needed.
+
+    parent_ids restricts the accounts to these organizational units or roots, and to the units nested in them when
+    recursive. tags restricts them to the accounts having all these tag values, at the cost of one call per account.
+    """
+    if parent_ids:
+        accounts = (account for parent_id in parent_ids
+                    for account in _parent_accounts(org_client, parent_id, recursive))
+    else:
+        accounts = (account for page in org_client.get_paginator("list_accounts").paginate()
+                    for account in page["Accounts"])
+
+    for account in accounts:
+        if account["Status"] != "ACTIVE":
+            continue
+        if tags and not _has_tags(org_client, account["Id"], tags):
+            continue
+        yield account["Id"]
+
+
+def assume_role(sts_client, account: str, role_name: str, session_name: str) -> boto3.Session:
+    """Return a session opened in account with role_name."""
+    credentials = sts_client.assume_role(RoleArn=f"arn:aws:iam::{account}:role/{role_name}",
+                                         RoleSessionName=session_name)["Credentials"]
+    return boto3.Session(aws_access_key_id=credentials["AccessKeyId"],
+                         aws_secret_access_key=credentials["SecretAccessKey"],
+                         aws_session_token=credentials["SessionToken"])
@@ -0,0 +1,45 @@
+"""Declaration of the optional capabilities of an action."""
+
+
+class ActionFailure(Exception):
+    """Raised when an action returns a non empty list of error strings.
+
+    Arguments:
+        failures {[str]} -- Error strings returned by the action.
+
+    """
+
+    def __init__(self, failures: [str]):
+        super().__init__(", ".join(failures))
+        self.failures = failures
+
+
+def declare_action(check=None, services=None):
+    """Decorate an action function to declare its optional capabilities.
+
+    Keyword Arguments:
+        check {Callable} -- Cheap read-only function called as check(session, account), returning True when the change
+            is already applied so the action can be skipped, and used alone in dry-run (default: {None})
+        services {[str]} -- Names of the services whose clients are used by the action, so that they can be created
+            before the action runs (default: {None})
+
+    Returns:
+        Callable -- Decorator returning the action itself with its capabilities attached.
+
+    """
+    def decorator(action):
+        action.check = check
+        action.services = list(services or [])
+        return action
+
+    return decorator
+
+
+def get_check(action):
+    """Return the state check declared by action, None if it has none."""
+    return getattr(action, "check", None)
+
+
+def get_services(action) -> [str]:
+    """Return the names of the services declared by action, empty if it declares none."""
+    return getattr(action, "services", [])
@@ -1,29 +1,45 @@
 """This module regroups actions relative to EBS resource."""
 import boto3
-from botocore.exceptions import ClientError
+from actions.base import declare_action
 from logger.logger import LOG
 
+def ebs_default_encryption_enabled(session: boto3.Session, account: str) -> bool:
+    """Tell whether default EBS encryption is already enabled.
+
+    Arguments:
+        session {boto3.Session} -- a generic boto3 session opened with required privileges to perform action.
+        account {str} -- account number currently processed.
+
+    Returns:
+        bool -- True if default EBS encryption is enabled in the session region.
+
+    """
+    ec2_client = session.client('ec2')
+    return ec2_client.get_ebs_encryption_by_default()['EbsEncryptionByDefault']
+
+@declare_action(check=ebs_default_encryption_enabled, services=['ec2'])
 def enable_ebs_default_encryption(session: boto3.Session, account: str)->[]:
     """Enable default EBS encryption.
 
     Arguments:
-        session {boto3.Session} -- [description]
+        session {boto3.Session} -- a session-like object opened with required privileges, its clients are pooled.
+        account {str} -- account number currently processed, for logging purpose.
 
     Returns:
         [str] -- The list of error string encountered during action to be displayed at the end of overall process. Empty if no error.
 
+    Raises:
+        ClientError -- On any AWS error, reported in the results (throttled units are re-queued).
+
     """
     local_failure_list = []
     region = session.region_name
 
-    try:
-        ec2_client = session.client('ec2')
-        encryption_result = ec2_client.enable_ebs_encryption_by_default()
-        if encryption_result is False:
-            local_failure_list.append(f"{account}/{region}")
-        else:
-            LOG.info(f"EBS default encryption enabled on {account}/{region}")
-    except ClientError as error:
-        LOG.error(f"Error during EBS default encryption setting activation: {error}")
+    ec2_client = session.client('ec2')
+    encryption_result = ec2_client.enable_ebs_encryption_by_default()
+    if encryption_result['EbsEncryptionByDefault'] is False:
+        local_failure_list.append(f"{account}/{region}")
+    else:
+        LOG.info(f"EBS default encryption enabled on {account}/{region}")
 
     return local_failure_list
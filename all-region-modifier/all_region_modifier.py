@@ -1,89 +1,379 @@
 """Module to apply a change on multiple regions for multiple AWS accounts."""
 
-import json
+import concurrent.futures
+import multiprocessing
+import os
+import sys
+from typing import Iterable
 import boto3
 from botocore.exceptions import ClientError
 import argparse
-import tqdm
-import actions
-from actions.ebs import enable_ebs_default_encryption
-from logger.logger import LOG
 
-def all_region_modifier(role: str, account_file: str, action):
-    """all_region_modifier [summary]
+# Modules shared by all the tools live at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import actions  # noqa: E402
+from actions.base import ActionFailure, get_check, get_services  # noqa: E402
+from actions.ebs import enable_ebs_default_encryption  # noqa: E402
+from engine.clients import ClientPool  # noqa: E402
+from engine.credentials import CredentialCache  # noqa: E402
+from engine.fanout import FanOutEngine, Unit  # noqa: E402
+from engine.journal import FAILED as JOURNAL_FAILED, SUCCESS, Journal  # noqa: E402
+from engine.regions import RegionDiscovery  # noqa: E402
+from engine.throttling import AdaptiveRateLimiter, backoff_delay, is_throttling_error  # noqa: E402
+from logger.logger import LOG, add_json_log  # noqa: E402
+from report.report import (CHANGED, COMPLIANT, FAILED, PLANNED, UNKNOWN, ReportSummary, ReportWriter,  # noqa: E402
+                           Result, error_code, merge_reports)
+from sources.accounts import file_accounts, prefetch, shard  # noqa: E402
+from accounts.organization import list_member_accounts  # noqa: E402
+from instrumentation.metrics import ApiMetrics  # noqa: E402
+
+
+def all_region_modifier(role: str, accounts: Iterable[str], action, max_workers: int = 16, max_per_account: int = 4,
+                        region_discovery: RegionDiscovery = None, rate_limiter: AdaptiveRateLimiter = None,
+                        max_attempts: int = 5, journal: Journal = None, dry_run: bool = False,
+                        max_pool_connections: int = 10, report: ReportWriter = None, sts_client=None,
+                        session_hooks: list = None, metrics: ApiMetrics = None, show_progress: bool = True):
+    """all_region_modifier: Apply action on all regions of all accounts.
+
+    Every (account, region) unit is run concurrently on a bounded worker pool, see engine.fanout.FanOutEngine.
+    Accounts are consumed lazily, as the workers are ready to process them.
 
     Arguments:
-        role {str} -- [description]
-        account_file {str} -- [description]
-        action {[type]} -- [description]
+        role {str} -- The role to assume in each account to retrieve regions and perform the action.
+        accounts {Iterable[str]} -- The accounts to process (see sources.accounts), or the path of a file listing them.
+        action {Callable} -- The action to apply, called as action(session=session, account=account).
+
+    Keyword Arguments:
+        max_workers {int} -- Number of units processed at the same time (default: {16})
+        max_per_account {int} -- Number of units processed at the same time for a single account (default: {4})
+        region_discovery {RegionDiscovery} -- Regions selection and cache, all default regions if None (default: {None})
+        rate_limiter {AdaptiveRateLimiter} -- Limiter of the API calls made in accounts (default: {None})
+        max_attempts {int} -- Maximum executions of a unit failing on throttling (default: {5})
+        journal {Journal} -- Journal recording unit outcomes, units already done in it are skipped (default: {None})
+        dry_run {bool} -- Only run the state check of the action and print the resulting plan (default: {False})
+        max_pool_connections {int} -- Maximum number of HTTP connections kept per client (default: {10})
+        report {ReportWriter} -- Report receiving the result of each unit as soon as it is done (default: {None})
+        sts_client {botocore.client.STS} -- Client used to assume roles, from the default session if None
+            (default: {None})
+        session_hooks {[Callable]} -- Called as hook(session, account) on each session opened in an account
+            (default: {None})
+        metrics {ApiMetrics} -- Metrics of every AWS API call made by the run, logged at the end (default: {None})
+        show_progress {bool} -- Display the progress bars of accounts and regions (default: {True})
 
     Returns:
-        [type] -- [description]
+        [str] -- The list of account/region on which the action failed.
 
     """
-    sts_client = boto3.client('sts')
+    rate_limiter = rate_limiter or AdaptiveRateLimiter()
+    session_hooks = [rate_limiter.attach] + (session_hooks or [])
+    sts_client = sts_client or boto3.client('sts')
+    if metrics:
+        session_hooks.append(lambda session, account: metrics.instrument_session(session))
+        metrics.instrument_client(sts_client)
+    credential_cache = CredentialCache(sts_client, session_hooks=session_hooks)
+    client_pool = ClientPool(credential_cache, max_pool_connections=max_pool_connections)
+    region_discovery = region_discovery or RegionDiscovery()
+    summary = ReportSummary()
     failure_list = []
+    planned = []
 
-    with open(account_file) as file:
-        account_list = json.load(file)
+    if isinstance(accounts, str):
+        LOG.info(f"Reading accounts from {accounts}")
+        accounts = file_accounts(accounts)
 
-    LOG.info(
-        f"Default ebs encryption will be activated on all regions for the list of account(s): {account_list['accounts']}")
+    LOG.info(f"{action.__name__} will be applied on all regions of the accounts")
 
-    for account in tqdm.tqdm(account_list['accounts'], desc="Accounts"):
+    def discover(account: str) -> [Unit]:
         role_arn = f"arn:aws:iam::{account}:role/{role}"
 
-        try:
-            assume_role = sts_client.assume_role(
-                RoleArn=role_arn, RoleSessionName="get_all_regions", DurationSeconds=3600)
-            session = boto3.Session(
-                aws_access_key_id=assume_role['Credentials']['AccessKeyId'],
-                aws_secret_access_key=assume_role['Credentials']['SecretAccessKey'],
-                aws_session_token=assume_role['Credentials']['SessionToken'],
-                region_name="us-east-1"
-            )
-        except ClientError as error:
-            LOG.error(
-                f"Failed to assume role during regions retrieval {role_arn} : {error}")
+        # Resumed accounts whose regions are all done need neither a region discovery nor a role assumption
+        if journal and journal.is_account_done(account, action.__name__):
+            LOG.info(f"All regions of {account} already done in the journal")
+            return []
+
+        def get_session():
+            try:
+                return client_pool.region_session(role_arn, 'us-east-1')
+            except ClientError as error:
+                LOG.error(
+                    f"Failed to assume role during regions retrieval {role_arn} : {error}")
+                raise
 
         try:
-            ec2_client = session.client('ec2', region_name='us-east-1')
-            aws_regions = [region['RegionName']
-                           for region in ec2_client.describe_regions()['Regions']]
+            aws_regions = region_discovery.regions(get_session, account)
             LOG.info(f"Regions retrived using role {role_arn} : {aws_regions}")
         except ClientError as error:
             LOG.error(f"Failed to get regions : {error}")
+            raise
+
+        if journal:
+            journal.record_regions(account, action.__name__, aws_regions)
+            aws_regions = [region for region in aws_regions if not journal.is_done(account, region, action.__name__)]
+
+        if aws_regions and get_services(action):
+            client_pool.prewarm(role_arn, aws_regions, get_services(action))
+
+        return [Unit(account=account, region=region, action=action) for region in aws_regions]
 
-        for region in tqdm.tqdm(aws_regions, desc="Regions"):
+    def execute(unit: Unit) -> str:
+        session = client_pool.region_session(f"arn:aws:iam::{unit.account}:role/{role}", unit.region)
+
+        check = get_check(unit.action)
+        state = UNKNOWN
+        if check:
             try:
-                assume_role = sts_client.assume_role(
-                    RoleArn=role_arn, RoleSessionName=f"enable_ebs_encryption_{region}")
-                session = boto3.Session(
-                    aws_access_key_id=assume_role['Credentials']['AccessKeyId'],
-                    aws_secret_access_key=assume_role['Credentials']['SecretAccessKey'],
-                    aws_session_token=assume_role['Credentials']['SessionToken'],
-                    region_name='us-east-1'
-                )
+                state = COMPLIANT if check(session=session, account=unit.account) else PLANNED
             except ClientError as error:
-                LOG.error(f"Failed to assume role {role_arn} : {error}")
+                if is_throttling_error(error):
+                    raise
+                LOG.warning(f"State check failed on {unit.account}/{unit.region}, applying change anyway : {error}")
 
-            failure_list += action(session=session, account=account)
+        if dry_run or state == COMPLIANT:
+            return state
 
-    # Print error list
-    if failure_list:
-        LOG.error(f"Failures encountered applying change on account/region: {failure_list}")
-    else:
+        failures = unit.action(session=session, account=unit.account)
+        if failures:
+            raise ActionFailure(failures)
+        return CHANGED
+
+    def record(result: Result):
+        summary.add(result)
+        if report:
+            report.write(result)
+        if result.status == FAILED:
+            failure_list.append(f"{result.account}/{result.region}")
+        elif dry_run and result.status != COMPLIANT:
+            planned.append(result)
+
+    def on_complete(unit: Unit, status: str, error: Exception, attempts: int, latency: float):
+        result = Result(account=unit.account, region=unit.region, action=unit.action.__name__,
+                        status=FAILED if error else status, error_code=error_code(error) if error else None,
+                        error=str(error) if error else None, latency=round(latency, 3), attempts=attempts)
+        record(result)
+        if journal:
+            journal.record(unit.account, unit.region, result.action, JOURNAL_FAILED if error else SUCCESS,
+                           result.error)
+
+    def on_discover_error(account: str, error: Exception):
+        record(Result(account=account, region="*", action=action.__name__, status=FAILED,
+                      error_code=error_code(error), error=str(error)))
+
+    engine = FanOutEngine(max_workers=max_workers, max_per_account=max_per_account, retryable=is_throttling_error,
+                          backoff=backoff_delay, max_attempts=max_attempts, show_progress=show_progress)
+    engine.run(accounts, discover, execute, on_complete=on_complete, on_discover_error=on_discover_error)
+
+    if dry_run:
+        LOG.info(f"Dry run of {action.__name__}: {summary.statuses[COMPLIANT]} account/region already compliant, "
+                 f"{summary.statuses[PLANNED]} to change, {summary.statuses[UNKNOWN]} without state check")
+        for result in sorted(planned):
+            LOG.info(f"  {'~' if result.status == UNKNOWN else '+'} {result.account}/{result.region}")
+
+    summary.log()
+    if not failure_list:
         LOG.info("No error during the process")
 
+    LOG.info(f"STS credentials cache: {credential_cache.stats}")
+    LOG.info(f"describe_regions calls: {region_discovery.lookups}")
+    LOG.info(f"boto3 clients: {client_pool.stats}")
+    LOG.info(f"Throttling: {rate_limiter.throttles} throttled calls, {rate_limiter.wait_time:.1f}s waiting for rate "
+             f"limiter, {engine.retries} units re-queued for {engine.backoff_time:.1f}s of backoff")
+    if metrics:
+        LOG.info(f"AWS API calls:\n{metrics.summary()}")
+
+    return failure_list
+
 def all_region_modifier_parser():
     """all_region_modifier_parser: Collecting args to launch all region modifier function."""
     parser = argparse.ArgumentParser(description="Apply change on all regions for all accounts listed in provided input.")
 
     parser.add_argument("role", type=str, help='The role to execute describe_regions and the action')
-    parser.add_argument("account_file", type=str, help='The relative path to json file with accounts')
+    parser.add_argument("account_file", type=str, nargs="?",
+                        help='The relative path to json, jsonl or csv file with accounts')
+    parser.add_argument("--organization", action="store_true",
+                        help='Process the accounts of the AWS organization instead of account_file')
+    parser.add_argument("--ou", nargs="+", metavar="OU_ID",
+                        help='With --organization, only process accounts of these organizational units or roots')
+    parser.add_argument("--tag", action="append", metavar="KEY=VALUE", default=[],
+                        help='With --organization, only process accounts with this tag value, can be repeated')
+    parser.add_argument("--workers", type=int, default=16, help='Number of account/region processed concurrently')
+    parser.add_argument("--per-account", type=int, default=4,
+                        help='Maximum number of regions processed concurrently for a single account')
+    parser.add_argument("--regions", nargs="+", metavar="REGION", help='Only process these regions')
+    parser.add_argument("--exclude-regions", nargs="+", metavar="REGION", help='Never process these regions')
+    parser.add_argument("--exclude-opt-in-regions", action="store_true",
+                        help='Skip the opt-in regions enabled in each account, unless listed in --regions')
+    parser.add_argument("--region-cache", type=str, help='Path of a json file caching the region list between runs')
+    parser.add_argument("--region-cache-ttl", type=int, default=86400,
+                        help='Maximum age in seconds of the cached region list')
+    parser.add_argument("--api-rate", type=float, default=10,
+                        help='Initial calls per second to a single API of an account, lowered on throttling')
+    parser.add_argument("--account-rate", type=float, default=50,
+                        help='Initial calls per second to all APIs of an account, lowered on throttling')
+    parser.add_argument("--max-attempts", type=int, default=5,
+                        help='Maximum executions of a unit failing on throttling')
+    parser.add_argument("--journal", type=str, default="all_region_modifier.journal",
+                        help='Path of the journal recording the outcome of each account/region')
+    parser.add_argument("--resume", action="store_true",
+                        help='Resume from the journal: skip account/region already done, retry failures')
+    parser.add_argument("--dry-run", action="store_true",
+                        help='Only check the current state and print the account/region that would be changed')
+    parser.add_argument("--max-pool-connections", type=int, default=10,
+                        help='Maximum number of HTTP connections kept alive per client')
+    parser.add_argument("--report", type=str,
+                        help='Path of the report receiving the result of each account/region, csv if ending with .csv '
+                             'else json lines')
+    parser.add_argument("--metrics-file", type=str,
+                        help='Path of a file receiving the metrics of the AWS API calls in Prometheus text format')
+    parser.add_argument("--log-file", type=str, help='Path of a file also receiving the logs, one json object per line')
+
+    parser.add_argument("--shard", type=str, metavar="INDEX/COUNT",
+                        help='Only process the accounts of shard INDEX (from 0 to COUNT-1) out of COUNT, to spread a '
+                             'run across hosts')
+    parser.add_argument("--processes", type=int, default=1,
+                        help='Number of local processes, each processing a shard of the accounts with its own workers')
 
     args = parser.parse_args()
 
-    all_region_modifier(role=args.role, account_file=args.account_file, action=actions.ebs.enable_ebs_default_encryption)
+    if args.organization == bool(args.account_file):
+        parser.error("either account_file or --organization is required")
+
+    if any("=" not in tag for tag in args.tag):
+        parser.error("--tag expects KEY=VALUE")
+
+    if args.shard:
+        try:
+            args.shard = tuple(int(value) for value in args.shard.split("/"))
+            if len(args.shard) != 2 or not 0 <= args.shard[0] < args.shard[1]:
+                raise ValueError
+        except ValueError:
+            parser.error("--shard expects INDEX/COUNT with 0 <= INDEX < COUNT")
+
+    if args.processes < 1:
+        parser.error("--processes must be greater than 0")
+    if args.processes > 1 and args.shard:
+        parser.error("--processes and --shard cannot be combined")
+
+    if args.processes > 1:
+        run_processes(args)
+    else:
+        run(args)
+
+
+def shard_path(path: str, index: int) -> str:
+    """Return the path of the file of shard index, keeping the extension of path (e.g. report.shard0.csv)."""
+    root, extension = os.path.splitext(path)
+    return f"{root}.shard{index}{extension}"
+
+
+def run(args: argparse.Namespace, show_progress: bool = True) -> ([str], ApiMetrics):
+    """Run all_region_modifier as configured by the command line arguments args.
+
+    Returns:
+        ([str], ApiMetrics) -- The list of account/region on which the action failed and the metrics of the API calls.
+
+    """
+    if args.log_file:
+        add_json_log(args.log_file)
+
+    metrics = ApiMetrics()
+
+    if args.organization:
+        tags = dict(tag.split("=", 1) for tag in args.tag)
+        organizations_client = boto3.client('organizations')
+        metrics.instrument_client(organizations_client)
+        accounts = prefetch(list_member_accounts(organizations_client, parent_ids=args.ou, tags=tags))
+    else:
+        accounts = file_accounts(args.account_file)
+
+    if args.shard:
+        LOG.info(f"Processing shard {args.shard[0]}/{args.shard[1]} of the accounts")
+        accounts = shard(accounts, *args.shard)
+
+    region_discovery = RegionDiscovery(regions=args.regions, exclude_regions=args.exclude_regions,
+                                       opt_in=not args.exclude_opt_in_regions, cache_file=args.region_cache,
+                                       ttl=args.region_cache_ttl)
+
+    report = ReportWriter(args.report) if args.report else None
+
+    # A dry run changes nothing, recording it in the journal would make a resumed run skip everything
+    journal = Journal(args.journal, resume=args.resume) if not args.dry_run else None
+
+    try:
+        failure_list = all_region_modifier(
+            role=args.role, accounts=accounts, action=actions.ebs.enable_ebs_default_encryption,
+            max_workers=args.workers, max_per_account=args.per_account, region_discovery=region_discovery,
+            rate_limiter=AdaptiveRateLimiter(api_rate=args.api_rate, account_rate=args.account_rate),
+            max_attempts=args.max_attempts, journal=journal, dry_run=args.dry_run,
+            max_pool_connections=args.max_pool_connections, report=report, metrics=metrics,
+            show_progress=show_progress)
+    finally:
+        if args.metrics_file:
+            metrics.write_prometheus(args.metrics_file)
+        if journal:
+            journal.close()
+        if report:
+            report.close()
+
+    return failure_list, metrics
+
+
+def _run_shard(args: argparse.Namespace, index: int) -> ([str], dict):
+    """Run shard index of args in a worker process, its files are suffixed with the shard index."""
+    args = argparse.Namespace(**vars(args))
+    args.shard = (index, args.processes)
+    for name in ("journal", "report", "log_file"):
+        if getattr(args, name):
+            setattr(args, name, shard_path(getattr(args, name), index))
+    # Metrics of the shards are merged and written by the parent process
+    args.metrics_file = None
+    # Interleaved progress bars of several processes would be unreadable, the parent logs the shards completion
+    failure_list, metrics = run(args, show_progress=False)
+    return failure_list, metrics.snapshot()
+
+
+def run_processes(args: argparse.Namespace) -> [str]:
+    """Run the shards of args in args.processes local processes, then merge their reports and metrics.
+
+    Each process owns a shard of the accounts with its own workers, clients and journal (resume with the same number of
+    processes). The result of each shard is also kept in its own report.
+
+    Returns:
+        [str] -- The list of account/region on which the action failed.
+
+    """
+    if args.log_file:
+        add_json_log(args.log_file)
+
+    failure_list = []
+    metrics = ApiMetrics()
+    LOG.info(f"Spreading the accounts on {args.processes} processes of {args.workers} workers each")
+
+    # spawn gives each process a fresh interpreter, a forked one would inherit the logging and prefetch threads
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.processes,
+                                                mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(_run_shard, args, index): index for index in range(args.processes)}
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            index = futures[future]
+            try:
+                shard_failures, snapshot = future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                LOG.error(f"Shard {index} failed : {error}")
+                failure_list.append(f"shard{index}/*")
+                continue
+            failure_list += shard_failures
+            metrics.merge(snapshot)
+            LOG.info(f"Shard {index} done ({done}/{args.processes}), {len(shard_failures)} failure(s)")
+
+    if args.report:
+        summary = merge_reports([shard_path(args.report, index) for index in range(args.processes)], args.report)
+        LOG.info(f"Reports of the shards merged into {args.report}")
+        summary.log()
+    LOG.info(f"AWS API calls of all shards:\n{metrics.summary()}")
+    if args.metrics_file:
+        metrics.write_prometheus(args.metrics_file)
+
+    return failure_list
+
 
-all_region_modifier_parser()
+if __name__ == "__main__":
+    all_region_modifier_parser()
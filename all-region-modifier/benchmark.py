@@ -0,0 +1,221 @@
+"""Offline benchmark of all_region_modifier against a simulated AWS, no network nor AWS account required."""
+
+import argparse
+import logging
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs
+import boto3
+from botocore.awsrequest import AWSResponse
+from actions.ebs import enable_ebs_default_encryption
+from all_region_modifier import all_region_modifier
+from engine.regions import RegionDiscovery
+from instrumentation.metrics import ApiMetrics
+from logger.logger import LOG
+
+AWS_REGIONS = [
+    "us-east-1", "us-east-2", "us-west-1", "us-west-2", "ca-central-1", "sa-east-1", "eu-west-1", "eu-west-2",
+    "eu-west-3", "eu-central-1", "eu-north-1", "ap-south-1", "ap-northeast-1", "ap-northeast-2", "ap-northeast-3",
+    "ap-southeast-1", "ap-southeast-2",
+]
+
+
+class _RawBody:
+    """Minimal raw HTTP body accepted by botocore.awsrequest.AWSResponse."""
+
+    def __init__(self, body: bytes):
+        self._body = body
+
+    def stream(self, **kwargs):
+        yield self._body
+
+
+class SimulatedAWS:
+    """Answer STS and EC2 requests in place of AWS, through the botocore before-send event.
+
+    Unlike botocore Stubber, responses do not have to be queued in order, so the simulation can be shared by all the
+    clients used concurrently by the workers.
+
+    Keyword Arguments:
+        regions {int} -- Number of regions returned by describe_regions (default: {17})
+        latency {float} -- Mean latency of a call in seconds, with +/- 50% jitter (default: {0.05})
+        throttle_rate {float} -- Probability of a throttling response to an EC2 call (default: {0.0})
+        failure_rate {float} -- Probability of an UnauthorizedOperation response to a change (default: {0.0})
+        enabled_rate {float} -- Probability of EBS encryption to be already enabled in a region (default: {0.0})
+
+    """
+
+    def __init__(self, regions: int = 17, latency: float = 0.05, throttle_rate: float = 0.0,
+                 failure_rate: float = 0.0, enabled_rate: float = 0.0):
+        self.regions = AWS_REGIONS[:regions] + [f"xx-simulated-{index}" for index in range(regions - len(AWS_REGIONS))]
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.failure_rate = failure_rate
+        self.enabled_rate = enabled_rate
+        self.calls = Counter()
+        self._encryption = {}
+        self._lock = threading.Lock()
+
+    def attach(self, session, account: str = None):
+        """Answer the requests of all clients created afterwards from session."""
+        session.events.register('before-send', self._respond, unique_id=f"simulated-aws-{id(self)}")
+
+    @staticmethod
+    def _response(request, status: int, body: str) -> AWSResponse:
+        return AWSResponse(request.url, status, {}, _RawBody(body.encode()))
+
+    def _error(self, request, status: int, code: str) -> AWSResponse:
+        return self._response(request, status, f"<Response><Errors><Error><Code>{code}</Code><Message>Simulated"
+                                               f"</Message></Error></Errors><RequestID>1</RequestID></Response>")
+
+    def _respond(self, request, **kwargs) -> AWSResponse:
+        body = request.body.decode() if isinstance(request.body, bytes) else request.body or ""
+        params = {key: values[0] for key, values in parse_qs(body).items()}
+        operation = params.get('Action')
+        with self._lock:
+            self.calls[operation] += 1
+
+        time.sleep(self.latency * random.uniform(0.5, 1.5))
+
+        if operation == "AssumeRole":
+            return self._assume_role(request, params)
+        if random.random() < self.throttle_rate:
+            return self._error(request, 503, "RequestLimitExceeded")
+
+        # Temporary credentials of an account are named after it, see _assume_role
+        authorization = request.headers['Authorization']
+        authorization = authorization.decode() if isinstance(authorization, bytes) else authorization
+        account = re.search(r"Credential=ASIA(\d+)/", authorization).group(1)
+        region = re.search(r"ec2\.([a-z0-9-]+)\.amazonaws", request.url).group(1)
+
+        if operation == "DescribeRegions":
+            items = "".join(f"<item><regionName>{region}</regionName><optInStatus>opt-in-not-required</optInStatus>"
+                            f"</item>" for region in self.regions)
+            return self._response(request, 200, f"<DescribeRegionsResponse><regionInfo>{items}</regionInfo>"
+                                                f"</DescribeRegionsResponse>")
+        if operation == "GetEbsEncryptionByDefault":
+            with self._lock:
+                enabled = self._encryption.setdefault((account, region), random.random() < self.enabled_rate)
+            return self._response(request, 200, f"<GetEbsEncryptionByDefaultResponse><ebsEncryptionByDefault>"
+                                                f"{str(enabled).lower()}</ebsEncryptionByDefault>"
+                                                f"</GetEbsEncryptionByDefaultResponse>")
+        if operation == "EnableEbsEncryptionByDefault":
+            if random.random() < self.failure_rate:
+                return self._error(request, 400, "UnauthorizedOperation")
+            with self._lock:
+                self._encryption[(account, region)] = True
+            return self._response(request, 200, "<EnableEbsEncryptionByDefaultResponse><ebsEncryptionByDefault>true"
+                                                "</ebsEncryptionByDefault></EnableEbsEncryptionByDefaultResponse>")
+
+        return self._error(request, 400, "InvalidAction")
+
+    def _assume_role(self, request, params: dict) -> AWSResponse:
+        account = params['RoleArn'].split(':')[4]
+        expiration = (datetime.now(timezone.utc) + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        return self._response(request, 200, f"<AssumeRoleResponse><AssumeRoleResult><Credentials>"
+                                            f"<AccessKeyId>ASIA{account}</AccessKeyId>"
+                                            f"<SecretAccessKey>simulated</SecretAccessKey>"
+                                            f"<SessionToken>simulated</SessionToken>"
+                                            f"<Expiration>{expiration}</Expiration></Credentials>"
+                                            f"<AssumedRoleUser><AssumedRoleId>simulated</AssumedRoleId>"
+                                            f"<Arn>{params['RoleArn']}</Arn></AssumedRoleUser>"
+                                            f"</AssumeRoleResult></AssumeRoleResponse>")
+
+
+class _LatencyRecorder:
+    """Report collecting the results of the run instead of writing them."""
+
+    def __init__(self):
+        self.results = []
+
+    def write(self, result):
+        self.results.append(result)
+
+
+def _percentile(values: [float], percent: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def benchmark(accounts: int, regions: int, workers: int, per_account: int, simulation: SimulatedAWS,
+              metrics: ApiMetrics = None) -> dict:
+    """Run all_region_modifier on simulated accounts and return its throughput figures.
+
+    Arguments:
+        accounts {int} -- Number of simulated accounts.
+        regions {int} -- Number of simulated regions per account.
+        workers {int} -- Number of units processed at the same time.
+        per_account {int} -- Number of units processed at the same time for a single account.
+        simulation {SimulatedAWS} -- Simulated AWS answering the calls.
+
+    Keyword Arguments:
+        metrics {ApiMetrics} -- Metrics of the simulated AWS API calls (default: {None})
+
+    Returns:
+        dict -- Units per second, p50/p99 unit latency in seconds, failures and AWS calls per operation.
+
+    """
+    caller = boto3.Session(aws_access_key_id="simulated", aws_secret_access_key="simulated", region_name="us-east-1")
+    simulation.attach(caller)
+    recorder = _LatencyRecorder()
+
+    start = time.monotonic()
+    all_region_modifier(role="benchmark", accounts=(f"{index:012d}" for index in range(accounts)),
+                        action=enable_ebs_default_encryption, max_workers=workers, max_per_account=per_account,
+                        region_discovery=RegionDiscovery(), report=recorder, sts_client=caller.client('sts'),
+                        session_hooks=[simulation.attach], metrics=metrics)
+    duration = time.monotonic() - start
+
+    latencies = sorted(result.latency for result in recorder.results)
+    return {
+        "units": len(recorder.results),
+        "duration": duration,
+        "units_per_second": len(recorder.results) / duration,
+        "p50": _percentile(latencies, 50),
+        "p99": _percentile(latencies, 99),
+        "failed": sum(result.status == "failed" for result in recorder.results),
+        "calls": dict(simulation.calls),
+    }
+
+
+def benchmark_parser():
+    """benchmark_parser: Collecting args to launch the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark all_region_modifier against a simulated AWS, offline.")
+
+    parser.add_argument("--accounts", type=int, default=50, help='Number of simulated accounts')
+    parser.add_argument("--regions", type=int, default=17, help='Number of simulated regions per account')
+    parser.add_argument("--workers", type=int, default=16, help='Number of account/region processed concurrently')
+    parser.add_argument("--per-account", type=int, default=4,
+                        help='Maximum number of regions processed concurrently for a single account')
+    parser.add_argument("--latency", type=float, default=0.05, help='Mean latency of an AWS call in seconds')
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help='Probability of a throttled EC2 call')
+    parser.add_argument("--failure-rate", type=float, default=0.0, help='Probability of a failed change')
+    parser.add_argument("--enabled-rate", type=float, default=0.0,
+                        help='Probability of a region to be already compliant')
+
+    args = parser.parse_args()
+
+    # Per unit logs would measure the terminal rather than the tool
+    LOG.setLevel(logging.WARNING)
+
+    simulation = SimulatedAWS(regions=args.regions, latency=args.latency, throttle_rate=args.throttle_rate,
+                              failure_rate=args.failure_rate, enabled_rate=args.enabled_rate)
+    metrics = ApiMetrics()
+    figures = benchmark(args.accounts, args.regions, args.workers, args.per_account, simulation, metrics=metrics)
+
+    print(f"{figures['units']} units in {figures['duration']:.2f}s: {figures['units_per_second']:.1f} units/s, "
+          f"unit latency p50 {figures['p50'] * 1000:.0f}ms p99 {figures['p99'] * 1000:.0f}ms, "
+          f"{figures['failed']} failed")
+    for operation, count in sorted(figures['calls'].items()):
+        print(f"  {operation:<32} {count:>8} calls")
+    print(metrics.summary())
+
+
+if __name__ == "__main__":
+    benchmark_parser()
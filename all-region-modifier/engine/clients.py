@@ -0,0 +1,102 @@
+"""Pool of boto3 clients shared by all units of a run."""
+
+import threading
+from botocore.config import Config
+from engine.credentials import CredentialCache
+
+
+class PooledSession:
+    """Session-like view handed to actions, returning pooled clients of an account pinned to a region.
+
+    Arguments:
+        pool {ClientPool} -- Pool providing the clients.
+        role_arn {str} -- Role assumed in the account.
+        region_name {str} -- Region used by default for the clients.
+
+    """
+
+    def __init__(self, pool, role_arn: str, region_name: str):
+        self._pool = pool
+        self._role_arn = role_arn
+        self.region_name = region_name
+
+    def client(self, service_name: str, region_name: str = None, **kwargs):
+        """Return the pooled client of service_name, a new client if specific client arguments are given."""
+        return self._pool.client(self._role_arn, region_name or self.region_name, service_name, **kwargs)
+
+
+class ClientPool:
+    """Create clients once per (account, region, service) and reuse them for every unit.
+
+    boto3 clients are thread-safe once created, their creation is not: it is serialized per account. Clients are
+    created from the session of the current credentials of the account, they are recreated when the credential cache
+    refreshes them. All clients keep their HTTP connections alive in a pool of `max_pool_connections`.
+
+    Arguments:
+        credential_cache {CredentialCache} -- Cache providing the session of each account.
+
+    Keyword Arguments:
+        max_pool_connections {int} -- Maximum number of HTTP connections kept per client (default: {10})
+
+    """
+
+    def __init__(self, credential_cache: CredentialCache, max_pool_connections: int = 10):
+        self.credential_cache = credential_cache
+        self.config = Config(max_pool_connections=max_pool_connections, tcp_keepalive=True)
+        self._clients = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _account_lock(self, role_arn: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(role_arn, threading.Lock())
+
+    def client(self, role_arn: str, region_name: str, service_name: str, **kwargs):
+        """Return the client of service_name in region_name for role_arn.
+
+        Arguments:
+            role_arn {str} -- Role assumed in the account.
+            region_name {str} -- Region of the client.
+            service_name {str} -- Name of the AWS service, as given to boto3.client.
+
+        Returns:
+            botocore.client.BaseClient -- Pooled client, or a new one when specific client arguments are given.
+
+        """
+        session = self.credential_cache.session(role_arn)
+        key = (role_arn, region_name, service_name)
+
+        with self._account_lock(role_arn):
+            if kwargs:
+                return session.client(service_name, region_name=region_name, **kwargs)
+
+            pooled = self._clients.get(key)
+            # A refresh of the credentials gives a new session, clients of the previous one are outdated
+            if pooled is not None and pooled[0] is session:
+                with self._lock:
+                    self.reused += 1
+                return pooled[1]
+
+            client = session.client(service_name, region_name=region_name, config=self.config)
+            self._clients[key] = (session, client)
+            with self._lock:
+                self.created += 1
+            return client
+
+    def region_session(self, role_arn: str, region_name: str) -> PooledSession:
+        """Return the session-like view of role_arn pinned to region_name given to actions."""
+        return PooledSession(self, role_arn, region_name)
+
+    def prewarm(self, role_arn: str, region_names: [str], service_names: [str]):
+        """Create ahead of time the clients of service_names in region_names for role_arn."""
+        for region_name in region_names:
+            for service_name in service_names:
+                self.client(role_arn, region_name, service_name)
+
+    @property
+    def stats(self) -> dict:
+        """Counters of clients created and reused."""
+        with self._lock:
+            return {"created": self.created, "reused": self.reused}
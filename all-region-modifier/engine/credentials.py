@@ -0,0 +1,106 @@
+"""Cache of assumed role credentials shared by every region of an account."""
+
+import threading
+from datetime import datetime, timedelta, timezone
+import boto3
+import botocore.session
+from botocore.loaders import create_loader
+from logger.logger import LOG
+
+
+class _Entry:
+    """Credentials and session cached for a role ARN."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.credentials = None
+        self.session = None
+
+
+class CredentialCache:
+    """Assume each role once and share its credentials until they are about to expire.
+
+    Concurrent callers asking for the same role ARN wait for a single assume_role call. Credentials are refreshed
+    `refresh_margin` seconds before their `Expiration` so that units started late in a long run never use expired
+    credentials. All sessions share the same botocore data loader, service models are read once per run and not once
+    per account.
+
+    Arguments:
+        sts_client {botocore.client.STS} -- Client used to assume roles.
+
+    Keyword Arguments:
+        session_name {str} -- RoleSessionName given to assume_role (default: {"all_region_modifier"})
+        duration {int} -- Requested credentials duration in seconds (default: {3600})
+        refresh_margin {int} -- Seconds before expiration at which credentials are refreshed (default: {300})
+        region_name {str} -- Default region of the cached sessions (default: {"us-east-1"})
+        session_hooks {[Callable]} -- Called as hook(session, account) on each new session (default: {None})
+
+    """
+
+    def __init__(self, sts_client, session_name: str = "all_region_modifier", duration: int = 3600,
+                 refresh_margin: int = 300, region_name: str = "us-east-1", session_hooks: list = None):
+        self.sts_client = sts_client
+        self.session_name = session_name
+        self.duration = duration
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.region_name = region_name
+        self.session_hooks = session_hooks or []
+        # boto3 appends its data path to the loader on each session, the list grows but the lookups stop at
+        # botocore's own data path listed before it
+        self._loader = create_loader()
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def _entry(self, role_arn: str) -> _Entry:
+        with self._lock:
+            return self._entries.setdefault(role_arn, _Entry())
+
+    def _is_fresh(self, credentials: dict) -> bool:
+        return datetime.now(timezone.utc) < credentials['Expiration'] - self.refresh_margin
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _get(self, role_arn: str) -> _Entry:
+        entry = self._entry(role_arn)
+
+        with entry.lock:
+            if entry.credentials is not None and self._is_fresh(entry.credentials):
+                self._count("hits")
+                return entry
+
+            self._count("misses" if entry.credentials is None else "refreshes")
+            assume_role = self.sts_client.assume_role(
+                RoleArn=role_arn, RoleSessionName=self.session_name, DurationSeconds=self.duration)
+            entry.credentials = assume_role['Credentials']
+            botocore_session = botocore.session.get_session()
+            botocore_session.register_component('data_loader', self._loader)
+            entry.session = boto3.Session(
+                botocore_session=botocore_session,
+                aws_access_key_id=entry.credentials['AccessKeyId'],
+                aws_secret_access_key=entry.credentials['SecretAccessKey'],
+                aws_session_token=entry.credentials['SessionToken'],
+                region_name=self.region_name
+            )
+            for hook in self.session_hooks:
+                hook(entry.session, role_arn.split(':')[4])
+            LOG.debug(f"Credentials of {role_arn} valid until {entry.credentials['Expiration']}")
+            return entry
+
+    def credentials(self, role_arn: str) -> dict:
+        """Return the assume_role Credentials of role_arn, assuming it only if not cached or about to expire."""
+        return self._get(role_arn).credentials
+
+    def session(self, role_arn: str) -> boto3.Session:
+        """Return the boto3 session opened with the cached credentials of role_arn."""
+        return self._get(role_arn).session
+
+    @property
+    def stats(self) -> dict:
+        """Counters of credentials served from cache (hits), first assumed (misses) and assumed again (refreshes)."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "refreshes": self.refreshes}
@@ -0,0 +1,192 @@
+"""Bounded concurrency engine scheduling (account, region, action) units on a worker pool."""
+
+import concurrent.futures
+import heapq
+import itertools
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Any, Callable, Iterable, NamedTuple
+import tqdm
+from logger.logger import LOG, PROGRESS_INTERVAL
+
+
+class Unit(NamedTuple):
+    """Smallest piece of work: one action applied on one region of one account."""
+
+    account: str
+    region: str
+    action: Callable
+
+
+def _timed(execute: Callable, unit: Unit) -> tuple:
+    """Run execute on the worker, returning its outcome, the error it raised and its duration in seconds."""
+    start = time.monotonic()
+    try:
+        return execute(unit), None, time.monotonic() - start
+    except Exception as error:  # pylint: disable=broad-except
+        return None, error, time.monotonic() - start
+
+
+class FanOutEngine:
+    """Run every (account, region, action) unit on a bounded thread pool.
+
+    Accounts are pulled lazily from their iterable, their regions are discovered on the pool, and the resulting units
+    are handed out round-robin between accounts so that a single account never uses more than `max_per_account`
+    workers. An account yielded more than once (duplicated line, overlapping organizational units) is only processed
+    the first time. All bookkeeping (callbacks, progress bars) happens in the calling thread, workers only run
+    `discover` and `execute`, so no lock is required to aggregate results in the callbacks.
+
+    A unit raising an error accepted by `retryable` is re-queued after `backoff(attempt)` seconds, up to
+    `max_attempts` attempts. Workers are not held while a unit waits for its retry.
+
+    Arguments:
+        max_workers {int} -- Total number of units running at the same time.
+        max_per_account {int} -- Maximum number of units running at the same time for a single account.
+
+    Keyword Arguments:
+        retryable {Callable[[Exception], bool]} -- Tell whether a unit failing with an error is retried (default: {None})
+        backoff {Callable[[int], float]} -- Seconds to wait before the given retry attempt (default: {None})
+        max_attempts {int} -- Maximum number of executions of a unit (default: {5})
+        show_progress {bool} -- Display the progress bars of accounts and regions (default: {True})
+
+    """
+
+    def __init__(self, max_workers: int = 16, max_per_account: int = 4, retryable: Callable = None,
+                 backoff: Callable = None, max_attempts: int = 5, show_progress: bool = True):
+        if max_workers < 1 or max_per_account < 1:
+            raise ValueError("max_workers and max_per_account must be greater than 0")
+        self.max_workers = max_workers
+        self.max_per_account = max_per_account
+        # Bound the number of accounts opened at once to keep memory flat with very long account lists
+        self.max_open_accounts = max_workers * 2
+        self.retryable = retryable or (lambda error: False)
+        self.backoff = backoff or (lambda attempt: 0)
+        self.max_attempts = max_attempts
+        self.show_progress = show_progress
+        self.retries = 0
+        self.backoff_time = 0.0
+
+    def run(self, accounts: Iterable[str], discover: Callable[[str], Iterable[Unit]], execute: Callable[[Unit], Any],
+            on_complete: Callable, on_discover_error: Callable):
+        """Discover and execute all units for all accounts.
+
+        Arguments:
+            accounts {Iterable[str]} -- Accounts to process, consumed lazily.
+            discover {Callable[[str], Iterable[Unit]]} -- Return the units to run for an account.
+            execute {Callable[[Unit], Any]} -- Run a unit and return its outcome.
+            on_complete {Callable[[Unit, Any, Exception, int, float], None]} -- Called in the calling thread once a unit
+                is done for good, with the outcome returned (None on error), the error raised (None on success), the
+                number of attempts and the seconds spent executing the unit over all attempts.
+            on_discover_error {Callable[[str, Exception], None]} -- Called in the calling thread with the error raised
+                by the discovery of an account.
+
+        """
+        account_iterator = iter(accounts)
+        exhausted = False
+        seen = set()
+        inflight = {}
+        ready = OrderedDict()
+        account_inflight = Counter()
+        discovering = set()
+        attempts = Counter()
+        latencies = Counter()
+        delayed = []
+        delayed_per_account = Counter()
+        sequence = itertools.count()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                tqdm.tqdm(desc="Accounts", unit="account", mininterval=PROGRESS_INTERVAL,
+                          disable=not self.show_progress) as account_bar, \
+                tqdm.tqdm(desc="Regions", total=0, unit="region", mininterval=PROGRESS_INTERVAL,
+                          disable=not self.show_progress) as unit_bar:
+
+            def close_if_done(account: str):
+                if account not in discovering and account_inflight[account] == 0 and not ready.get(account) \
+                        and not delayed_per_account[account]:
+                    ready.pop(account, None)
+                    del account_inflight[account]
+                    del delayed_per_account[account]
+                    account_bar.update()
+
+            while True:
+                while not exhausted and len(discovering) + len(ready) < self.max_open_accounts \
+                        and len(inflight) < self.max_workers:
+                    try:
+                        account = next(account_iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if account in seen:
+                        LOG.warning(f"Ignoring duplicate account {account}")
+                        continue
+                    seen.add(account)
+                    discovering.add(account)
+                    account_inflight[account] += 1
+                    inflight[executor.submit(lambda acc=account: list(discover(acc)))] = (account, None)
+
+                while delayed and delayed[0][0] <= time.monotonic():
+                    _, _, unit = heapq.heappop(delayed)
+                    delayed_per_account[unit.account] -= 1
+                    ready.setdefault(unit.account, deque()).append(unit)
+
+                self._schedule(executor, execute, inflight, ready, account_inflight)
+
+                if not inflight:
+                    if not delayed:
+                        break
+                    time.sleep(max(0, delayed[0][0] - time.monotonic()))
+                    continue
+
+                timeout = max(0, delayed[0][0] - time.monotonic()) if delayed else None
+                done, _ = concurrent.futures.wait(inflight, timeout=timeout,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    account, unit = inflight.pop(future)
+                    account_inflight[account] -= 1
+
+                    if unit is None:
+                        discovering.discard(account)
+                        try:
+                            units = future.result()
+                        except Exception as error:  # pylint: disable=broad-except
+                            LOG.error(f"Failed to discover units of account {account} : {error}")
+                            on_discover_error(account, error)
+                            units = []
+                        if units:
+                            ready[account] = deque(units)
+                            # Shown on the next rate limited refresh of the bar
+                            unit_bar.total += len(units)
+                    else:
+                        attempts[unit] += 1
+                        outcome, unit_error, latency = future.result()
+                        latencies[unit] += latency
+                        if unit_error is not None:
+                            error = unit_error
+                            if self.retryable(error) and attempts[unit] < self.max_attempts:
+                                delay = self.backoff(attempts[unit])
+                                LOG.warning(f"Retrying {account}/{unit.region} in {delay:.1f}s : {error}")
+                                self.retries += 1
+                                self.backoff_time += delay
+                                heapq.heappush(delayed, (time.monotonic() + delay, next(sequence), unit))
+                                delayed_per_account[account] += 1
+                                continue
+                            LOG.error(f"Failed to apply change on {account}/{unit.region} "
+                                      f"after {attempts[unit]} attempt(s) : {error}")
+                        on_complete(unit, outcome, unit_error, attempts.pop(unit), latencies.pop(unit))
+                        unit_bar.update()
+
+                    close_if_done(account)
+
+    def _schedule(self, executor, execute, inflight: dict, ready: OrderedDict, account_inflight: Counter):
+        """Submit ready units round-robin between accounts while workers and per-account slots are available."""
+        submitted = True
+        while submitted and len(inflight) < self.max_workers:
+            submitted = False
+            for account, queue in ready.items():
+                if len(inflight) >= self.max_workers:
+                    break
+                if queue and account_inflight[account] < self.max_per_account:
+                    unit = queue.popleft()
+                    account_inflight[account] += 1
+                    inflight[executor.submit(_timed, execute, unit)] = (account, unit)
+                    submitted = True
@@ -0,0 +1,91 @@
+"""Append-only journal of completed units, used to resume an interrupted run."""
+
+import json
+import os
+import threading
+import time
+from logger.logger import LOG
+
+SUCCESS = "success"
+FAILED = "failed"
+
+
+class Journal:
+    """Record the outcome of each (account, region, action) unit as one json line, flushed as soon as written.
+
+    The regions discovered for each account and action are recorded the same way, so that an account whose regions
+    are all done can be skipped on resume without discovering its regions again.
+
+    A new run starts an empty journal. With `resume`, the existing journal is read first: units whose last outcome is
+    a success are reported as done and new outcomes are appended to the same file.
+
+    Arguments:
+        path {str} -- Path of the journal file.
+
+    Keyword Arguments:
+        resume {bool} -- Keep and load the existing journal instead of starting a new one (default: {False})
+
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._outcomes = {}
+        self._regions = {}
+        self._lock = threading.Lock()
+        if resume:
+            self._load()
+        self._file = open(path, "a" if resume else "w")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            LOG.warning(f"No journal to resume from at {self.path}")
+            return
+        with open(self.path) as file:
+            for line_number, line in enumerate(file, 1):
+                try:
+                    record = json.loads(line)
+                    if 'regions' in record:
+                        self._regions[(record['account'], record['action'])] = record['regions']
+                    else:
+                        self._outcomes[(record['account'], record['region'], record['action'])] = record['status']
+                except (ValueError, KeyError):
+                    # Last line may be truncated if the previous run was killed while writing it
+                    LOG.warning(f"Ignoring invalid journal line {line_number} of {self.path}")
+        done = sum(status == SUCCESS for status in self._outcomes.values())
+        LOG.info(f"Resuming from {self.path}: {done} unit(s) already done, {len(self._outcomes) - done} to retry")
+
+    def is_done(self, account: str, region: str, action: str) -> bool:
+        """Tell whether the unit succeeded in the journal loaded on resume or earlier in this run."""
+        with self._lock:
+            return self._outcomes.get((account, region, action)) == SUCCESS
+
+    def is_account_done(self, account: str, action: str) -> bool:
+        """Tell whether the regions discovered for account are known and all of them succeeded."""
+        with self._lock:
+            regions = self._regions.get((account, action))
+            return regions is not None and all(self._outcomes.get((account, region, action)) == SUCCESS
+                                               for region in regions)
+
+    def record(self, account: str, region: str, action: str, status: str, error: str = None):
+        """Append the outcome of a unit to the journal."""
+        line = json.dumps({"account": account, "region": region, "action": action, "status": status,
+                           "error": error, "timestamp": time.time()})
+        with self._lock:
+            self._outcomes[(account, region, action)] = status
+            self._write(line)
+
+    def record_regions(self, account: str, action: str, regions: [str]):
+        """Append the regions discovered for account to the journal."""
+        line = json.dumps({"account": account, "action": action, "regions": regions, "timestamp": time.time()})
+        with self._lock:
+            self._regions[(account, action)] = regions
+            self._write(line)
+
+    def _write(self, line: str):
+        self._file.write(line + "\n")
+        self._file.flush()
+
+    def close(self):
+        """Close the journal file."""
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,165 @@
+"""Discovery of the regions to process, cached across accounts and optionally on disk."""
+
+import json
+import os
+import threading
+import time
+from typing import Callable
+from logger.logger import LOG
+
+DEFAULT_OPT_IN_STATUS = "opt-in-not-required"
+
+
+def account_cache_path(cache_file: str) -> str:
+    """Return the path of the file caching the opt-in regions of each account next to cache_file."""
+    return f"{os.path.splitext(cache_file)[0]}.accounts.jsonl"
+
+
+class RegionDiscovery:
+    """Compute the regions to process for each account with as few describe_regions calls as possible.
+
+    Regions enabled by default are the same in every account of the organization: they are retrieved once (or loaded
+    from `cache_file` when younger than `ttl`) and reused for all accounts. Opt-in regions depend on each account: the
+    ones enabled in an account are processed too, with a per-account lookup only made when the selected regions
+    include opt-in regions. The opt-in regions of each account are also cached between runs, one json line per account
+    appended to the file next to `cache_file` (see account_cache_path) and read back when younger than `ttl`.
+
+    Keyword Arguments:
+        regions {[str]} -- Only process these regions, all regions if empty (default: {None})
+        exclude_regions {[str]} -- Never process these regions (default: {None})
+        opt_in {bool} -- Also process the opt-in regions enabled in each account (default: {True})
+        cache_file {str} -- Path of the json file caching the region list between runs (default: {None})
+        ttl {int} -- Maximum age in seconds of the region lists read from cache_file and its account cache
+            (default: {86400})
+
+    """
+
+    def __init__(self, regions: [str] = None, exclude_regions: [str] = None, opt_in: bool = True,
+                 cache_file: str = None, ttl: int = 86400):
+        self.include = set(regions or [])
+        self.exclude = set(exclude_regions or [])
+        self.opt_in = opt_in
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self._all_regions = None
+        self._account_opt_in = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+
+    def _load_cache_file(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file) as file:
+                cache = json.load(file)
+        except (OSError, ValueError) as error:
+            LOG.warning(f"Ignoring unreadable region cache {self.cache_file} : {error}")
+            return None
+        if time.time() - cache['timestamp'] > self.ttl:
+            LOG.info(f"Region cache {self.cache_file} expired")
+            return None
+        return cache['regions']
+
+    def _write_cache_file(self, regions: [dict]):
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, "w") as file:
+                json.dump({"timestamp": time.time(), "regions": regions}, file)
+        except OSError as error:
+            LOG.warning(f"Failed to write region cache {self.cache_file} : {error}")
+
+    def _get_all_regions(self, get_session: Callable) -> [dict]:
+        with self._lock:
+            if self._all_regions is None:
+                regions = self._load_cache_file()
+                if regions is None:
+                    ec2_client = get_session().client('ec2', region_name='us-east-1')
+                    regions = [{"RegionName": region['RegionName'], "OptInStatus": region['OptInStatus']}
+                               for region in ec2_client.describe_regions(AllRegions=True)['Regions']]
+                    self.lookups += 1
+                    self._write_cache_file(regions)
+                unknown = (self.include | self.exclude) - {region['RegionName'] for region in regions}
+                if unknown:
+                    LOG.warning(f"Ignoring unknown regions: {sorted(unknown)}")
+                self._all_regions = regions
+            return self._all_regions
+
+    def _is_selected(self, region_name: str) -> bool:
+        return (not self.include or region_name in self.include) and region_name not in self.exclude
+
+    def _load_account_cache(self) -> dict:
+        if not self.cache_file or not os.path.exists(account_cache_path(self.cache_file)):
+            return {}
+        path = account_cache_path(self.cache_file)
+        accounts = {}
+        lines = 0
+        try:
+            with open(path) as file:
+                for line in file:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                        if time.time() - entry['timestamp'] <= self.ttl:
+                            accounts[entry['account']] = entry
+                    except (ValueError, KeyError):
+                        # Last line may be truncated if the previous run was killed while writing it
+                        LOG.warning(f"Ignoring invalid line {lines} of region cache {path}")
+        except OSError as error:
+            LOG.warning(f"Ignoring unreadable region cache {path} : {error}")
+            return {}
+        if lines > len(accounts):
+            # Expired and superseded entries are dropped so that the file does not grow run after run
+            self._write_account_cache(accounts.values(), "w")
+        LOG.info(f"Opt-in regions of {len(accounts)} account(s) read from {path}")
+        return {account: set(entry['regions']) for account, entry in accounts.items()}
+
+    def _write_account_cache(self, entries: [dict], mode: str = "a"):
+        if not self.cache_file:
+            return
+        try:
+            with open(account_cache_path(self.cache_file), mode) as file:
+                file.writelines(json.dumps(entry) + "\n" for entry in entries)
+        except OSError as error:
+            LOG.warning(f"Failed to write region cache {account_cache_path(self.cache_file)} : {error}")
+
+    def _get_account_opt_in(self, get_session: Callable, account: str) -> set:
+        with self._lock:
+            if self._account_opt_in is None:
+                self._account_opt_in = self._load_account_cache()
+            if account in self._account_opt_in:
+                return self._account_opt_in[account]
+        ec2_client = get_session().client('ec2', region_name='us-east-1')
+        opted_in = {region['RegionName'] for region in ec2_client.describe_regions(
+            Filters=[{"Name": "opt-in-status", "Values": ["opted-in"]}])['Regions']}
+        with self._lock:
+            self.lookups += 1
+            self._account_opt_in[account] = opted_in
+            self._write_account_cache([{"account": account, "timestamp": time.time(), "regions": sorted(opted_in)}])
+        return opted_in
+
+    def regions(self, get_session: Callable, account: str) -> [str]:
+        """Return the regions to process in account.
+
+        Arguments:
+            get_session {Callable[[], boto3.Session]} -- Return a session opened in account, only called when a lookup
+                is required so that no role is assumed for nothing.
+            account {str} -- Account currently processed.
+
+        Returns:
+            [str] -- Names of the regions to process.
+
+        """
+        all_regions = self._get_all_regions(get_session)
+        default = [region['RegionName'] for region in all_regions
+                   if region['OptInStatus'] == DEFAULT_OPT_IN_STATUS and self._is_selected(region['RegionName'])]
+        # Opt-in regions enabled in the account are looked up unless excluded, or when explicitly listed by name
+        opt_in = [region['RegionName'] for region in all_regions
+                  if region['OptInStatus'] != DEFAULT_OPT_IN_STATUS and self._is_selected(region['RegionName'])
+                  and (self.opt_in or region['RegionName'] in self.include)]
+
+        if opt_in:
+            enabled = self._get_account_opt_in(get_session, account)
+            default += [region for region in opt_in if region in enabled]
+
+        return default
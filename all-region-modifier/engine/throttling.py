@@ -0,0 +1,127 @@
+"""Adaptive client side rate limiting of AWS API calls, on the token buckets of ratelimit.limiter."""
+
+import random
+import threading
+import time
+from botocore.exceptions import ClientError
+from ratelimit.limiter import THROTTLING_ERROR_CODES, RateLimiter
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """Tell whether error is an AWS throttling response."""
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter for the given attempt number (starting at 1)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket(RateLimiter):
+    """Shared token bucket (see ratelimit.limiter) whose rate decreases on throttling and slowly recovers on success
+    (AIMD).
+
+    Arguments:
+        rate {float} -- Maximum number of tokens per second, also the burst capacity.
+
+    Keyword Arguments:
+        min_rate {float} -- Rate never goes below this value (default: {0.5})
+        increase {float} -- Rate added on each success, up to the initial rate (default: {0.1})
+        decrease {float} -- Factor applied to the rate on each throttling (default: {0.5})
+
+    """
+
+    def __init__(self, rate: float, min_rate: float = 0.5, increase: float = 0.1, decrease: float = 0.5):
+        super().__init__(rate, burst=max(1.0, rate))
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.increase = increase
+        self.decrease = decrease
+
+    def _set_rate(self, rate: float):
+        # The burst capacity follows the rate, a throttled bucket does not allow a burst of its former rate
+        self.rate = rate
+        self.burst = max(1.0, rate)
+
+    def on_throttle(self):
+        """Reduce the rate after a throttling response."""
+        with self._lock:
+            self._set_rate(max(self.min_rate, self.rate * self.decrease))
+
+    def on_success(self):
+        """Increase the rate back toward its maximum after a successful call."""
+        with self._lock:
+            self._set_rate(min(self.max_rate, self.rate + self.increase))
+
+
+class AdaptiveRateLimiter:
+    """Rate limit API calls per (account, region, service, operation) and per (account, region).
+
+    AWS API quotas apply per account and per region, so are the buckets. The limiter is attached to boto3 sessions:
+    every call made by a client of the session first waits for a token of both buckets, and each throttling response
+    seen by botocore (including its own retries) lowers their rate.
+
+    Keyword Arguments:
+        api_rate {float} -- Initial calls per second for a single API of an account region (default: {10})
+        account_rate {float} -- Initial calls per second for all APIs of an account region (default: {50})
+
+    """
+
+    def __init__(self, api_rate: float = 10, account_rate: float = 50):
+        self.api_rate = api_rate
+        self.account_rate = account_rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.wait_time = 0.0
+        self.throttles = 0
+
+    def _bucket(self, key: tuple, rate: float) -> TokenBucket:
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(rate)
+            return self._buckets[key]
+
+    def _buckets_for(self, account: str, region: str, service: str, operation: str) -> [TokenBucket]:
+        return [self._bucket((account, region, service, operation), self.api_rate),
+                self._bucket((account, region), self.account_rate)]
+
+    def acquire(self, account: str, region: str, service: str, operation: str):
+        """Block until a call to service:operation is allowed in the region of account."""
+        delay = max(bucket.reserve() for bucket in self._buckets_for(account, region, service, operation))
+        if delay > 0:
+            with self._lock:
+                self.wait_time += delay
+            time.sleep(delay)
+
+    def on_response(self, account: str, region: str, service: str, operation: str, error_code: str = None):
+        """Adapt the rate of the region of account and service:operation according to the response error code."""
+        throttled = error_code in THROTTLING_ERROR_CODES
+        if throttled:
+            with self._lock:
+                self.throttles += 1
+        for bucket in self._buckets_for(account, region, service, operation):
+            if throttled:
+                bucket.on_throttle()
+            elif error_code is None:
+                bucket.on_success()
+
+    def attach(self, session, account: str):
+        """Register the limiter on the events of session, for every client created afterwards.
+
+        Arguments:
+            session {boto3.Session} -- Session opened in account.
+            account {str} -- Account used as rate limiting key.
+
+        """
+        def before_call(model, context, **kwargs):
+            self.acquire(account, context.get('client_region'), model.service_model.service_name, model.name)
+
+        def needs_retry(response, operation, request_dict, **kwargs):
+            # Called by botocore for every attempt, returning None leaves the retry decision to botocore
+            if response is not None:
+                self.on_response(account, request_dict['context'].get('client_region'),
+                                 operation.service_model.service_name, operation.name,
+                                 response[1].get('Error', {}).get('Code'))
+
+        session.events.register('before-call', before_call, unique_id=f"rate-limiter-before-call-{id(self)}")
+        session.events.register('needs-retry', needs_retry, unique_id=f"rate-limiter-needs-retry-{id(self)}")
@@ -1,8 +1,21 @@
-"""Specific logging Handler class relative to TQDM progress bar printing."""
+"""Specific logging Handler class relative to TQDM progress bar printing.
 
+Records are not written by the threads logging them: LOG only puts them in a queue, a single listener thread writes
+them by batches to the console (above the progress bars) and optionally to a json lines file, see add_json_log.
+"""
+
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import threading
 import tqdm
 
+# Minimum seconds between two refreshes of a progress bar
+PROGRESS_INTERVAL = 0.5
+
+
 class TqdmLoggingHandler(logging.Handler):
     """Special class to handle logging using tqdm progress bar.
 
@@ -16,16 +29,137 @@ class TqdmLoggingHandler(logging.Handler):
         Arguments:
             record {str} -- Record to print
 
+        """
+        self.emit_batch([record])
+
+    def emit_batch(self, records: [logging.LogRecord]):
+        """Print records at once, progress bars are cleared and redrawn a single time.
+
+        Arguments:
+            records {[logging.LogRecord]} -- Records to print
+
         """
         try:
-            msg = self.format(record)
-            tqdm.tqdm.write(msg)
+            tqdm.tqdm.write("\n".join(self.format(record) for record in records))
             self.flush()
         except (KeyboardInterrupt, SystemExit):
             raise
         except:
-            self.handleError(record)
+            for record in records:
+                self.handleError(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as a json object, one per line."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        return json.dumps(entry)
+
+
+class JsonFileHandler(logging.FileHandler):
+    """Append records to a json lines file, flushed once per batch."""
+
+    def __init__(self, filename: str, mode: str = "a"):
+        super().__init__(filename, mode=mode, encoding="utf-8")
+        self.setFormatter(JsonFormatter())
+
+    def emit_batch(self, records: [logging.LogRecord]):
+        """Write records at once.
+
+        Arguments:
+            records {[logging.LogRecord]} -- Records to write
+
+        """
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write("".join(self.format(record) + self.terminator for record in records))
+            self.flush()
+        except Exception:  # pylint: disable=broad-except
+            for record in records:
+                self.handleError(record)
+
+
+class BatchingQueueListener:
+    """Thread writing the records of a queue to its handlers, by batches of the records waiting in the queue.
+
+    Arguments:
+        record_queue {queue.SimpleQueue} -- Queue filled by a logging.handlers.QueueHandler.
+
+    Keyword Arguments:
+        batch_size {int} -- Maximum number of records written at once (default: {500})
+
+    """
+
+    _STOP = None
+
+    def __init__(self, record_queue: queue.SimpleQueue, batch_size: int = 500):
+        self.queue = record_queue
+        self.batch_size = batch_size
+        self.handlers = ()
+        self._thread = None
+
+    def add_handler(self, handler: logging.Handler):
+        """Also write records to handler."""
+        self.handlers = self.handlers + (handler,)
+
+    def start(self):
+        """Start the listener thread."""
+        self._thread = threading.Thread(target=self._monitor, name="log-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write the records still in the queue and stop the listener thread."""
+        if self._thread is not None:
+            self.queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+            for handler in self.handlers:
+                handler.close()
+
+    def _monitor(self):
+        while True:
+            batch = [self.queue.get()]
+            while batch[-1] is not self._STOP and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is self._STOP
+            self._write([record for record in batch if record is not self._STOP])
+            if stop:
+                return
+
+    def _write(self, records: [logging.LogRecord]):
+        for handler in self.handlers:
+            selected = [record for record in records if record.levelno >= handler.level]
+            if not selected:
+                continue
+            if hasattr(handler, "emit_batch"):
+                handler.emit_batch(selected)
+            else:
+                for record in selected:
+                    handler.handle(record)
+
+
+def add_json_log(path: str):
+    """Also write the records of LOG to path, one json object per line."""
+    LISTENER.add_handler(JsonFileHandler(path))
+
+
+_QUEUE = queue.SimpleQueue()
+LISTENER = BatchingQueueListener(_QUEUE)
+LISTENER.add_handler(TqdmLoggingHandler())
+LISTENER.start()
+atexit.register(LISTENER.stop)
 
 LOG = logging.getLogger(__name__)
 LOG.setLevel(logging.INFO)
-LOG.addHandler(TqdmLoggingHandler())
+LOG.addHandler(logging.handlers.QueueHandler(_QUEUE))
@@ -0,0 +1,23 @@
+"""Merge the reports of the shards of a run spread across hosts (see --shard) into a single report."""
+
+import argparse
+from logger.logger import LOG
+from report.report import merge_reports
+
+
+def merge_reports_parser():
+    """merge_reports_parser: Collecting args to merge reports."""
+    parser = argparse.ArgumentParser(description="Merge the reports of several all_region_modifier runs into one.")
+
+    parser.add_argument("output", type=str, help='Path of the merged report, csv if ending with .csv else json lines')
+    parser.add_argument("reports", type=str, nargs="+", help='Paths of the reports to merge, csv or json lines')
+
+    args = parser.parse_args()
+
+    summary = merge_reports(args.reports, args.output)
+    LOG.info(f"{len(args.reports)} report(s) merged into {args.output}")
+    summary.log()
+
+
+if __name__ == "__main__":
+    merge_reports_parser()
@@ -0,0 +1,158 @@
+"""Structured results of the units, streamed to a report file and summarized at the end of the run."""
+
+import csv
+import heapq
+import json
+import threading
+from collections import Counter
+from typing import Iterator, NamedTuple
+from botocore.exceptions import ClientError
+from logger.logger import LOG
+
+# Status of a unit
+CHANGED = "changed"
+COMPLIANT = "compliant"
+PLANNED = "planned"
+UNKNOWN = "unknown"
+FAILED = "failed"
+
+
+class Result(NamedTuple):
+    """Outcome of one action applied on one region of one account."""
+
+    account: str
+    region: str
+    action: str
+    status: str
+    error_code: str = None
+    error: str = None
+    latency: float = 0.0
+    attempts: int = 0
+
+
+def error_code(error: Exception) -> str:
+    """Return the AWS error code of error, its class name if it is not an AWS error."""
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code', type(error).__name__)
+    return type(error).__name__
+
+
+class ReportWriter:
+    """Append each result to a report file as soon as it is known.
+
+    The format is chosen from the extension of path: csv for ".csv", json lines otherwise.
+
+    Arguments:
+        path {str} -- Path of the report file.
+
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "w", newline="")
+        self._lock = threading.Lock()
+        self._csv = None
+        if path.lower().endswith(".csv"):
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(Result._fields)
+
+    def write(self, result: Result):
+        """Append result to the report."""
+        with self._lock:
+            if self._csv:
+                self._csv.writerow(result)
+            else:
+                self._file.write(json.dumps(result._asdict()) + "\n")
+            self._file.flush()
+
+    def close(self):
+        """Close the report file."""
+        with self._lock:
+            self._file.close()
+
+
+def read_report(path: str) -> Iterator[Result]:
+    """Yield the results of a report written by ReportWriter, csv or json lines according to the extension of path."""
+    with open(path, newline="") as file:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(file):
+                # csv has no null, the writer leaves missing values empty
+                row = {key: value if value != "" else None for key, value in row.items()}
+                yield Result(**dict(row, latency=float(row['latency'] or 0), attempts=int(row['attempts'] or 0)))
+        else:
+            for line in file:
+                if line.strip():
+                    yield Result(**json.loads(line))
+
+
+class ReportSummary:
+    """Aggregate results by status and error code, with constant memory whatever the number of results.
+
+    Keyword Arguments:
+        examples {int} -- Number of account/region kept as examples for each error code (default: {3})
+        slowest {int} -- Number of slowest units kept (default: {5})
+
+    """
+
+    def __init__(self, examples: int = 3, slowest: int = 5):
+        self.examples = examples
+        self.slowest = slowest
+        self.statuses = Counter()
+        self.error_counts = Counter()
+        self.error_latencies = Counter()
+        self.error_examples = {}
+        self._slowest = []
+
+    def add(self, result: Result):
+        """Account result in the summary."""
+        self.statuses[result.status] += 1
+        if result.status == FAILED:
+            self.error_counts[result.error_code] += 1
+            self.error_latencies[result.error_code] += result.latency
+            examples = self.error_examples.setdefault(result.error_code, [])
+            if len(examples) < self.examples:
+                examples.append(f"{result.account}/{result.region}")
+        heapq.heappush(self._slowest, (result.latency, f"{result.account}/{result.region}"))
+        if len(self._slowest) > self.slowest:
+            heapq.heappop(self._slowest)
+
+    def log(self):
+        """Log the summary tables."""
+        LOG.info("Results: " + ", ".join(f"{count} {status}" for status, count in sorted(self.statuses.items())))
+
+        if self.error_counts:
+            lines = [f"{'Error code':<32} {'Count':>7} {'Avg latency':>12}  Examples"]
+            for code, count in self.error_counts.most_common():
+                lines.append(f"{code:<32} {count:>7} {self.error_latencies[code] / count:>11.2f}s  "
+                             f"{', '.join(self.error_examples[code])}")
+            LOG.error("Failures by error code:\n" + "\n".join(lines))
+
+        if self._slowest:
+            LOG.info("Slowest account/region: " + ", ".join(
+                f"{unit} ({latency:.2f}s)" for latency, unit in sorted(self._slowest, reverse=True)))
+
+
+def merge_reports(paths: [str], output: str) -> ReportSummary:
+    """Combine the reports of several runs (e.g. the shards of a run) into a single report.
+
+    Arguments:
+        paths {[str]} -- Reports to merge, csv or json lines, missing ones are skipped with a warning.
+        output {str} -- Path of the merged report, csv or json lines according to its extension.
+
+    Returns:
+        ReportSummary -- Summary of all the merged results.
+
+    """
+    summary = ReportSummary()
+    writer = ReportWriter(output)
+    try:
+        for path in paths:
+            try:
+                for result in read_report(path):
+                    writer.write(result)
+                    summary.add(result)
+            except FileNotFoundError:
+                LOG.warning(f"Missing report {path}, not merged")
+    finally:
+        writer.close()
+    return summary
@@ -0,0 +1,124 @@
+"""Sources of accounts to process, all of them are generators so that accounts are read as they are consumed.
+
+The accounts of an AWS organization are listed by accounts.organization.list_member_accounts, shared with the other
+tools of the repository.
+"""
+
+import csv
+import json
+import os
+import queue
+import threading
+import zlib
+from typing import Iterable, Iterator
+from logger.logger import LOG
+
+# Column or key holding the account id in csv and jsonl files
+ACCOUNT_KEYS = ("account", "Id", "id")
+
+
+def _account_from_record(record) -> str:
+    if isinstance(record, dict):
+        for key in ACCOUNT_KEYS:
+            if key in record:
+                return str(record[key])
+        raise ValueError(f"No account id in {record}")
+    return str(record)
+
+
+def json_accounts(path: str) -> Iterator[str]:
+    """Yield the accounts of a json file formatted as accounts.json.template."""
+    with open(path) as file:
+        yield from (str(account) for account in json.load(file)['accounts'])
+
+
+def jsonl_accounts(path: str) -> Iterator[str]:
+    """Yield the accounts of a json lines file, each line being an account id or an object with an "account" key."""
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                yield _account_from_record(json.loads(line))
+
+
+def csv_accounts(path: str) -> Iterator[str]:
+    """Yield the accounts of a csv file, from its "account" column or its first column if it has no header."""
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        column = 0
+        for line_number, row in enumerate(reader):
+            if not row:
+                continue
+            if line_number == 0 and not row[0].strip().isdigit():
+                headers = [header.strip() for header in row]
+                column = next((headers.index(key) for key in ACCOUNT_KEYS if key in headers), 0)
+                continue
+            yield row[column].strip()
+
+
+def file_accounts(path: str) -> Iterator[str]:
+    """Yield the accounts of a file, its format being chosen from its extension (.json, .jsonl or .csv)."""
+    extension = os.path.splitext(path)[1].lower()
+    readers = {".json": json_accounts, ".jsonl": jsonl_accounts, ".csv": csv_accounts}
+    if extension not in readers:
+        raise ValueError(f"Unsupported account file {path}, expected one of {sorted(readers)}")
+    return readers[extension](path)
+
+
+def shard(accounts: Iterable[str], index: int, count: int) -> Iterator[str]:
+    """Yield the accounts of shard index (from 0 to count - 1) out of count.
+
+    The shard of an account only depends on its id (crc32, unlike hash() it is the same in every process and host),
+    so runs given the same source and count but different indexes process every account exactly once.
+    """
+    if not 0 <= index < count:
+        raise ValueError(f"Shard index must be between 0 and {count - 1}")
+    for account in accounts:
+        if zlib.crc32(account.encode()) % count == index:
+            yield account
+
+
+def prefetch(accounts: Iterable[str], size: int = 1000) -> Iterator[str]:
+    """Consume accounts in a background thread, keeping up to size of them ahead of the caller.
+
+    Accounts are paginated while the first ones are processed, without loading more than size in memory.
+
+    Arguments:
+        accounts {Iterable[str]} -- Accounts to read ahead.
+
+    Keyword Arguments:
+        size {int} -- Maximum number of accounts read ahead (default: {1000})
+
+    """
+    buffer = queue.Queue(maxsize=size)
+    end = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for account in accounts:
+                while not stop.is_set():
+                    try:
+                        buffer.put(account, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except Exception as error:  # pylint: disable=broad-except
+            LOG.error(f"Failed to list accounts : {error}")
+            buffer.put(error)
+            return
+        buffer.put(end)
+
+    threading.Thread(target=produce, name="accounts-prefetch", daemon=True).start()
+
+    try:
+        while True:
+            account = buffer.get()
+            if account is end:
+                return
+            if isinstance(account, Exception):
+                raise account
+            yield account
+    finally:
+        stop.set()
@@ -0,0 +1,82 @@
+import threading
+from collections import Counter
+from botocore.exceptions import ClientError
+from engine.fanout import FanOutEngine, Unit
+
+REGIONS = ("us-east-1", "eu-west-1", "ap-south-1")
+
+
+def action(session, account):
+    pass
+
+
+class Recorder:
+    """discover, execute and callbacks of FanOutEngine.run, recording their calls"""
+
+    def __init__(self, failures: dict = None):
+        self.failures = Counter(failures or {})
+        self.discovered = Counter()
+        self.executed = Counter()
+        self.completed = []
+        self.discover_errors = []
+        self.running = Counter()
+        self.max_running = Counter()
+        self._lock = threading.Lock()
+
+    def discover(self, account: str) -> [Unit]:
+        with self._lock:
+            self.discovered[account] += 1
+        if account == "broken":
+            raise ValueError("no role")
+        return [Unit(account, region, action) for region in REGIONS]
+
+    def execute(self, unit: Unit) -> str:
+        with self._lock:
+            self.executed[unit] += 1
+            self.running[unit.account] += 1
+            self.max_running[unit.account] = max(self.max_running[unit.account], self.running[unit.account])
+            failing = self.failures[unit] > 0
+            self.failures[unit] -= 1
+        try:
+            if failing:
+                raise ClientError({"Error": {"Code": "Throttling"}}, "DescribeRegions")
+            return "changed"
+        finally:
+            with self._lock:
+                self.running[unit.account] -= 1
+
+    def on_complete(self, unit: Unit, outcome, error, attempts: int, latency: float):
+        self.completed.append((unit, outcome, error is not None, attempts))
+
+    def on_discover_error(self, account: str, error: Exception):
+        self.discover_errors.append(account)
+
+    def run(self, accounts, **options):
+        engine = FanOutEngine(show_progress=False, **options)
+        engine.run(accounts, self.discover, self.execute, self.on_complete, self.on_discover_error)
+        return engine
+
+
+def test_every_unit_is_completed_once():
+    recorder = Recorder()
+    recorder.run([f"{index:012d}" for index in range(20)] + ["broken"], max_workers=8, max_per_account=2)
+    assert len(recorder.completed) == 60 and set(recorder.executed.values()) == {1}
+    assert recorder.discover_errors == ["broken"]
+    assert max(recorder.max_running.values()) <= 2
+
+
+def test_duplicate_accounts_are_processed_once():
+    recorder = Recorder()
+    # the duplicate is read while the first occurrence is still queued or running
+    recorder.run(["1", "2", "1", "3", "2", "1"], max_workers=4, max_per_account=1)
+    assert recorder.discovered == {"1": 1, "2": 1, "3": 1}
+    assert sorted((unit.account, unit.region) for unit, _, _, _ in recorder.completed) == sorted(
+        (account, region) for account in "123" for region in REGIONS)
+
+
+def test_retryable_errors_are_requeued():
+    unit = Unit("1", "eu-west-1", action)
+    recorder = Recorder(failures={unit: 2})
+    engine = recorder.run(["1"], retryable=lambda error: isinstance(error, ClientError), max_attempts=3)
+    assert (unit, "changed", False, 3) in recorder.completed
+    assert engine.retries == 2
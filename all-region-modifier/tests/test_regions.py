@@ -0,0 +1,110 @@
+import json
+import time
+from engine.journal import FAILED, SUCCESS, Journal
+from engine.regions import RegionDiscovery, account_cache_path
+
+REGIONS = [{"RegionName": "us-east-1", "OptInStatus": "opt-in-not-required"},
+           {"RegionName": "eu-west-1", "OptInStatus": "opt-in-not-required"},
+           {"RegionName": "af-south-1", "OptInStatus": "not-opted-in"},
+           {"RegionName": "me-south-1", "OptInStatus": "opted-in"}]
+
+
+class FakeEC2:
+    """describe_regions of an account where opted_in regions are enabled"""
+
+    def __init__(self, opted_in: set):
+        self.opted_in = opted_in
+        self.calls = []
+
+    def describe_regions(self, **params):
+        self.calls.append(params)
+        if params.get("AllRegions"):
+            return {"Regions": REGIONS}
+        return {"Regions": [{"RegionName": region, "OptInStatus": "opted-in"} for region in sorted(self.opted_in)]}
+
+
+class FakeSession:
+    def __init__(self, ec2: FakeEC2):
+        self.ec2 = ec2
+
+    def client(self, service: str, region_name: str):
+        return self.ec2
+
+
+def opener(opted_in: dict):
+    """get_session factory of the accounts in opted_in, sessions opened are counted as role assumptions"""
+    clients = {account: FakeEC2(regions) for account, regions in opted_in.items()}
+    assumed = []
+
+    def get_session(account: str):
+        def open_session():
+            assumed.append(account)
+            return FakeSession(clients[account])
+        return open_session
+    return get_session, assumed
+
+
+def test_opt_in_regions_are_included_by_default():
+    get_session, assumed = opener({"1": {"me-south-1"}, "2": set()})
+    discovery = RegionDiscovery()
+    assert discovery.regions(get_session("1"), "1") == ["us-east-1", "eu-west-1", "me-south-1"]
+    assert discovery.regions(get_session("2"), "2") == ["us-east-1", "eu-west-1"]
+    assert discovery.regions(get_session("1"), "1") == ["us-east-1", "eu-west-1", "me-south-1"]
+    assert discovery.lookups == 3
+
+
+def test_excluded_opt_in_regions_need_no_account_lookup():
+    get_session, assumed = opener({"1": {"me-south-1"}, "2": {"me-south-1"}})
+    discovery = RegionDiscovery(opt_in=False)
+    discovery.regions(get_session("1"), "1")
+    assert discovery.regions(get_session("2"), "2") == ["us-east-1", "eu-west-1"]
+    assert assumed == ["1"]
+
+
+def test_account_opt_in_regions_are_cached_between_runs(tmp_path):
+    cache_file = str(tmp_path / "regions.json")
+    get_session, assumed = opener({"1": {"me-south-1"}, "2": set()})
+    first = RegionDiscovery(cache_file=cache_file)
+    for account in ("1", "2"):
+        first.regions(get_session(account), account)
+    assert assumed == ["1", "1", "2"]
+
+    assumed.clear()
+    second = RegionDiscovery(cache_file=cache_file)
+    assert second.regions(get_session("1"), "1") == ["us-east-1", "eu-west-1", "me-south-1"]
+    assert second.regions(get_session("2"), "2") == ["us-east-1", "eu-west-1"]
+    assert assumed == [] and second.lookups == 0
+
+
+def test_expired_account_cache_is_looked_up_again_and_compacted(tmp_path):
+    cache_file = str(tmp_path / "regions.json")
+    with open(account_cache_path(cache_file), "w") as file:
+        file.write(json.dumps({"account": "1", "timestamp": time.time() - 100, "regions": []}) + "\n")
+        file.write(json.dumps({"account": "2", "timestamp": time.time(), "regions": []}) + "\n")
+        file.write('{"account": "3", "times')
+    get_session, assumed = opener({"1": {"me-south-1"}, "2": {"me-south-1"}})
+    discovery = RegionDiscovery(cache_file=cache_file, ttl=50)
+    assert discovery.regions(get_session("1"), "1") == ["us-east-1", "eu-west-1", "me-south-1"]
+    assert discovery.regions(get_session("2"), "2") == ["us-east-1", "eu-west-1"]
+    assert assumed == ["1", "1"]
+    with open(account_cache_path(cache_file)) as file:
+        assert [json.loads(line)["account"] for line in file] == ["2", "1"]
+
+
+def test_resumed_journal_knows_accounts_all_done(tmp_path):
+    path = str(tmp_path / "run.journal")
+    journal = Journal(path)
+    journal.record_regions("1", "action", ["us-east-1", "eu-west-1"])
+    journal.record_regions("2", "action", ["us-east-1", "eu-west-1"])
+    journal.record_regions("3", "action", [])
+    for account in ("1", "2"):
+        journal.record(account, "us-east-1", "action", SUCCESS)
+    journal.record("1", "eu-west-1", "action", SUCCESS)
+    journal.record("2", "eu-west-1", "action", FAILED, "AccessDenied")
+    journal.close()
+
+    resumed = Journal(path, resume=True)
+    assert [resumed.is_account_done(account, "action") for account in ("1", "2", "3", "4")] == [
+        True, False, True, False]
+    assert not resumed.is_account_done("1", "other")
+    resumed.close()
@@ -0,0 +1,57 @@
+from accounts.organization import list_member_accounts
+from sources.accounts import prefetch, shard
+
+# root r with the accounts 1 and 2 (suspended), OU a nested in r with 3 and 4, OU b nested in a with 5
+ACCOUNTS = {"r": [("1", "ACTIVE"), ("2", "SUSPENDED")], "a": [("3", "ACTIVE"), ("4", "ACTIVE")], "b": [("5", "ACTIVE")]}
+UNITS = {"r": ["a"], "a": ["b"], "b": []}
+TAGS = {"3": {"env": "prod"}, "5": {"env": "prod", "team": "data"}}
+
+
+class FakeOrganizations:
+    """Paginators of the organization above, each page holds a single item to exercise the paging"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_paginator(self, operation: str):
+        fake = self
+
+        class Paginator:
+            def paginate(self, **params):
+                fake.calls.append((operation, params))
+                if operation == "list_accounts":
+                    items = ("Accounts", [account for parent in ACCOUNTS.values() for account in parent])
+                elif operation == "list_accounts_for_parent":
+                    items = ("Accounts", ACCOUNTS[params["ParentId"]])
+                elif operation == "list_organizational_units_for_parent":
+                    items = ("OrganizationalUnits", [{"Id": unit} for unit in UNITS[params["ParentId"]]])
+                else:
+                    items = ("Tags", [{"Key": key, "Value": value}
+                                      for key, value in TAGS.get(params["ResourceId"], {}).items()])
+                key, values = items
+                for value in values:
+                    yield {key: [{"Id": value[0], "Status": value[1]} if key == "Accounts" else value]}
+        return Paginator()
+
+
+def test_active_accounts_of_the_organization():
+    assert list(list_member_accounts(FakeOrganizations())) == ["1", "3", "4", "5"]
+
+
+def test_accounts_of_units_nested_or_not():
+    assert list(list_member_accounts(FakeOrganizations(), parent_ids=["a"])) == ["3", "4", "5"]
+    assert list(list_member_accounts(FakeOrganizations(), parent_ids=["a"], recursive=False)) == ["3", "4"]
+
+
+def test_accounts_with_tags_are_read_lazily():
+    organizations = FakeOrganizations()
+    accounts = prefetch(list_member_accounts(organizations, tags={"env": "prod"}))
+    assert list(accounts) == ["3", "5"]
+    assert [params for operation, params in organizations.calls if operation == "list_tags_for_resource"] == [
+        {"ResourceId": account} for account in ("1", "3", "4", "5")]
+
+
+def test_shards_split_the_accounts():
+    accounts = [f"{index:012d}" for index in range(100)]
+    shards = [list(shard(accounts, index, 3)) for index in range(3)]
+    assert sorted(sum(shards, [])) == accounts and all(shards)
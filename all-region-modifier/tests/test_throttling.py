@@ -0,0 +1,45 @@
+import time
+import pytest
+from botocore.exceptions import ClientError
+from engine.throttling import AdaptiveRateLimiter, TokenBucket, is_throttling_error
+
+
+def test_bucket_reserves_tokens_ahead_at_its_rate():
+    bucket = TokenBucket(rate=10)
+    # a burst of one second of calls, then one call every 1/rate second
+    assert [bucket.reserve() for _ in range(10)] == [0.0] * 10
+    assert [round(bucket.reserve(), 2) for _ in range(3)] == [0.1, 0.2, 0.3]
+
+
+def test_bucket_rate_is_halved_on_throttling_and_recovers_on_success():
+    bucket = TokenBucket(rate=4, min_rate=0.5, increase=0.5)
+    for expected in (2, 1, 0.5, 0.5):
+        bucket.on_throttle()
+        assert bucket.rate == expected
+    assert bucket.burst == 1.0
+    for _ in range(10):
+        bucket.on_success()
+    assert bucket.rate == 4 and bucket.burst == 4
+
+
+def test_limiter_buckets_are_per_account_region_and_api():
+    limiter = AdaptiveRateLimiter(api_rate=20, account_rate=100)
+    limiter.on_response("1", "eu-west-1", "ec2", "DescribeRegions", "RequestLimitExceeded")
+    limiter.on_response("1", "eu-west-1", "ec2", "DescribeVolumes", "AccessDenied")
+    assert limiter.throttles == 1
+    rates = {key: bucket.rate for key, bucket in limiter._buckets.items()}
+    assert rates[("1", "eu-west-1", "ec2", "DescribeRegions")] == 10 and rates[("1", "eu-west-1")] == 50
+    assert rates[("1", "eu-west-1", "ec2", "DescribeVolumes")] == 20
+
+    start = time.monotonic()
+    for _ in range(12):
+        limiter.acquire("1", "eu-west-1", "ec2", "DescribeRegions")
+    # the throttled API allows a burst of 10 calls then 10 calls per second, other regions are not slowed down
+    limiter.acquire("1", "us-east-1", "ec2", "DescribeRegions")
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.1)
+
+
+def test_throttling_errors():
+    assert is_throttling_error(ClientError({"Error": {"Code": "PriorRequestNotComplete"}}, "EnableEbsEncryption"))
+    assert not is_throttling_error(ClientError({"Error": {"Code": "UnauthorizedOperation"}}, "EnableEbsEncryption"))
+    assert not is_throttling_error(ValueError("Throttling"))
@@ -0,0 +1,68 @@
+import itertools
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from ratelimit.limiter import RateLimiter, call_with_retries
+from plan import Change
+
+# status of a change
+DONE = "SUCCESS"
+FAILED = "ERROR"
+SKIPPED = "SKIPPED"
+
+# IAM write calls per second and calls made at the same time
+RATE: float = 10.0
+MAX_WORKERS: int = 8
+# the change already happened, e.g. in a former partial apply: created, or deleted by operation prefix
+ALREADY_DONE_ERROR_CODES = {"create_": "EntityAlreadyExists", "delete_": "NoSuchEntity", "detach_": "NoSuchEntity",
+                            "remove_": "NoSuchEntity"}
+
+
+class Outcome(typing.NamedTuple):
+    change: Change
+    status: str
+    detail: str = ""
+
+
+def apply_changes(iam_client, changes: list[Change], rate: float = RATE, max_workers: int = MAX_WORKERS,
+                  log: typing.Callable[[Outcome], None] = None) -> list[Outcome]:
+    """Execute the changes of a plan stage by stage, the changes of a stage concurrently under rate calls per second
+
+    A change is skipped when an entity it requires failed to be created or updated in a former stage.
+    """
+    limiter = RateLimiter(rate)
+    failed: set[tuple[str, str]] = set()
+    outcomes = []
+
+    def execute(change: Change) -> Outcome:
+        missing = [name for kind, name in change.requires if (kind, name) in failed]
+        if missing:
+            return Outcome(change, SKIPPED, f"{', '.join(missing)} failed")
+        try:
+            call_with_retries(getattr(iam_client, change.operation), change.params, limiter)
+            return Outcome(change, DONE)
+        except ClientError as err:
+            code = err.response["Error"]["Code"]
+            if code == ALREADY_DONE_ERROR_CODES.get(change.operation.split("_")[0] + "_"):
+                return Outcome(change, DONE, code)
+            return Outcome(change, FAILED, str(err))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _, stage in itertools.groupby(sorted(changes, key=lambda change: change.stage),
+                                          key=lambda change: change.stage):
+            results = list(executor.map(execute, stage))
+            # the next stage starts once every change of this one is done
+            for outcome in results:
+                if outcome.status != DONE:
+                    failed.add(outcome.change.entity)
+                if log:
+                    log(outcome)
+            outcomes += results
+    return outcomes
+
+
+def summarize(outcomes: list[Outcome]) -> typing.Dict[str, int]:
+    summary: typing.Dict[str, int] = {}
+    for outcome in outcomes:
+        summary[outcome.status] = summary.get(outcome.status, 0) + 1
+    return summary
@@ -1,23 +1,76 @@
+import argparse
+import json
+import os
+import sys
 import boto3
 
-iam_client = boto3.client("iam")
+# Modules shared by all the tools live at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from instrumentation.metrics import ApiMetrics  # noqa: E402
+from apply import DONE, MAX_WORKERS, RATE, Outcome, apply_changes, summarize  # noqa: E402
+from manifest import ManifestError, load_manifest  # noqa: E402
+from plan import Change, load_state, plan  # noqa: E402
 
+# provision the IAM policies, groups, users and roles of a manifest: the current state is read once, the changes
+# are computed locally and only they are applied
 
-def handle():
-    pass
 
+def log_outcome(outcome: Outcome):
+    print(f"{outcome.status}\t{outcome.change.describe()}" + (f"\t{outcome.detail}" if outcome.detail else ""))
 
-def create_user(username: str, email: str = "", request_id: str = ""):
-    pass
 
+def handle(manifest_path: str, apply: bool = False, session: boto3.Session = None, endpoint_url: str = None,
+           rate: float = RATE, max_workers: int = MAX_WORKERS) -> tuple[list[Change], list[Outcome]]:
+    """Plan the changes of the manifest of manifest_path, and apply them if apply
 
-def create_group():
-    pass
+    Arguments:
+        endpoint_url: IAM and STS endpoint, e.g. of a moto server
+    """
+    manifest = load_manifest(manifest_path)
+    session = session or boto3.Session()
+    iam_client = session.client("iam", endpoint_url=endpoint_url)
+    identity = session.client("sts", endpoint_url=endpoint_url).get_caller_identity()
+    changes = plan(manifest, load_state(iam_client), identity["Account"], identity["Arn"].split(":")[1])
+    outcomes = apply_changes(iam_client, changes, rate, max_workers, log=log_outcome) if apply else []
+    return changes, outcomes
 
 
-def create_policy():
-    pass
+def run():
+    parser = argparse.ArgumentParser(description="Provision IAM policies, groups, users and roles from a manifest.")
+    parser.add_argument("command", choices=["plan", "apply"], help="Show the changes, or apply them")
+    parser.add_argument("manifest", help="Yaml or json manifest of the desired entities")
+    parser.add_argument("--endpoint-url", help="IAM and STS endpoint, e.g. of a moto server")
+    parser.add_argument("--rate", type=float, default=RATE, help="IAM write calls per second")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Number of IAM calls at the same time")
+    parser.add_argument("--format", choices=["text", "json"], default="text", help="Format of the plan")
+    args = parser.parse_args()
 
+    session = boto3.Session()
+    metrics = ApiMetrics()
+    metrics.instrument_session(session)
+    try:
+        changes, outcomes = handle(args.manifest, args.command == "apply", session, args.endpoint_url, args.rate,
+                                   args.workers)
+    except ManifestError as e:
+        print(f"ERROR\t{e}", file=sys.stderr)
+        sys.exit(2)
 
-def assume_role_policy(account: str):
-    pass
+    if args.command == "plan":
+        if args.format == "json":
+            json.dump([change._asdict() for change in changes], sys.stdout, indent=2)
+            sys.stdout.write("\n")
+        else:
+            for change in changes:
+                print(change.describe())
+        print(f"{len(changes)} changes", file=sys.stderr)
+    else:
+        print(f"{len(changes)} changes: {summarize(outcomes)}", file=sys.stderr)
+    print(f"AWS API calls:\n{metrics.summary()}", file=sys.stderr)
+    if os.environ.get("METRICS_FILE"):
+        metrics.write_prometheus(os.environ["METRICS_FILE"])
+    if any(outcome.status != DONE for outcome in outcomes):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,103 @@
+import collections
+import json
+import typing
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+class ManifestError(Exception):
+    """The manifest is not readable or not valid"""
+
+
+class PolicySpec(typing.NamedTuple):
+    """Customer managed policy, document is the policy document as a dict"""
+    name: str
+    document: dict
+    path: str = "/"
+
+
+class GroupSpec(typing.NamedTuple):
+    """Group and the managed policies attached to it, by name of a manifest policy or by ARN"""
+    name: str
+    policies: tuple[str, ...] = ()
+    path: str = "/"
+
+
+class UserSpec(typing.NamedTuple):
+    """User, its groups, attached policies and tags, email being stored as the "email" tag read by iam-watcher"""
+    name: str
+    groups: tuple[str, ...] = ()
+    policies: tuple[str, ...] = ()
+    tags: tuple[tuple[str, str], ...] = ()
+    path: str = "/"
+
+
+class RoleSpec(typing.NamedTuple):
+    """Role assumable by the trusted accounts, or by the principals of assume_role_policy when given"""
+    name: str
+    trusted_accounts: tuple[str, ...] = ()
+    assume_role_policy: dict | None = None
+    policies: tuple[str, ...] = ()
+    tags: tuple[tuple[str, str], ...] = ()
+    path: str = "/"
+
+
+class Manifest(typing.NamedTuple):
+    """Desired state of the IAM entities managed by iam-builder, entities not listed are left untouched
+    """
+    policies: tuple[PolicySpec, ...] = ()
+    groups: tuple[GroupSpec, ...] = ()
+    users: tuple[UserSpec, ...] = ()
+    roles: tuple[RoleSpec, ...] = ()
+
+
+def _tags(item: dict) -> tuple[tuple[str, str], ...]:
+    tags = dict(item.get("tags", {}))
+    if item.get("email"):
+        tags["email"] = item["email"]
+    return tuple(sorted(tags.items()))
+
+
+def parse_manifest(content: dict) -> Manifest:
+    """Return the Manifest of a manifest content: lists of policies, groups, users and roles"""
+    try:
+        manifest = Manifest(
+            policies=tuple(PolicySpec(item["name"], item["document"], item.get("path", "/"))
+                           for item in content.get("policies", [])),
+            groups=tuple(GroupSpec(item["name"], tuple(item.get("policies", [])), item.get("path", "/"))
+                         for item in content.get("groups", [])),
+            users=tuple(UserSpec(item["name"], tuple(item.get("groups", [])), tuple(item.get("policies", [])),
+                                 _tags(item), item.get("path", "/"))
+                        for item in content.get("users", [])),
+            roles=tuple(RoleSpec(item["name"], tuple(str(account) for account in item.get("trusted_accounts", [])),
+                                 item.get("assume_role_policy"), tuple(item.get("policies", [])), _tags(item),
+                                 item.get("path", "/"))
+                        for item in content.get("roles", [])),
+        )
+    except (KeyError, TypeError, AttributeError) as err:
+        raise ManifestError(f"Invalid manifest -> {err!r}") from err
+
+    for kind in Manifest._fields:
+        counts = collections.Counter(entity.name for entity in getattr(manifest, kind))
+        duplicates = sorted(name for name, count in counts.items() if count > 1)
+        if duplicates:
+            raise ManifestError(f"Duplicate {kind}: {duplicates}")
+    for role in manifest.roles:
+        if not role.trusted_accounts and not role.assume_role_policy:
+            raise ManifestError(f"Role {role.name} has neither trusted_accounts nor assume_role_policy")
+    return manifest
+
+
+def load_manifest(path: str) -> Manifest:
+    """Read a manifest from a yaml (PyYAML needed) or json file"""
+    with open(path) as file:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise ManifestError(f"PyYAML is needed to read {path}, install it or use a json manifest")
+            content = yaml.safe_load(file)
+        else:
+            content = json.load(file)
+    return parse_manifest(content or {})
@@ -0,0 +1,239 @@
+import json
+import typing
+import urllib.parse
+from manifest import Manifest, ManifestError
+
+# a managed policy keeps at most 5 versions, the oldest non default one is deleted to create another
+MAX_POLICY_VERSIONS: int = 5
+
+# stages of the changes, a change only depends on changes of former stages: changes of a stage run concurrently
+CREATE = 0      # entities, and the deletion of policy versions making room for the new ones
+UPDATE = 1      # policy versions
+ATTACH = 2      # policies, group memberships and tags of the entities
+
+# kinds of entities
+POLICY = "policy"
+GROUP = "group"
+USER = "user"
+ROLE = "role"
+
+
+class Change(typing.NamedTuple):
+    """IAM call of a plan, operation is the name of the client method
+
+    Arguments:
+        entity: kind and name (ARN of policies) of the entity changed
+        requires: entities that must not have failed for the change to run, e.g. the policy of an attachment
+    """
+    stage: int
+    operation: str
+    params: typing.Dict[str, typing.Any]
+    entity: tuple[str, str]
+    requires: tuple[tuple[str, str], ...] = ()
+
+    def describe(self) -> str:
+        symbol = "+" if self.operation.startswith(("create_", "add_", "attach_", "tag_")) else \
+            "-" if self.operation.startswith(("delete_", "remove_", "detach_", "untag_")) else "~"
+        details = [", ".join(f"{tag['Key']}={tag['Value']}" for tag in value) if name == "Tags" else str(value)
+                   for name, value in self.params.items()
+                   if value != self.entity[1] and name != "PolicyName" and not name.endswith("Document")]
+        return " ".join([symbol, self.operation, *self.entity, *details])
+
+
+class PolicyState(typing.NamedTuple):
+    name: str
+    path: str
+    document: dict
+    # (VersionId, IsDefaultVersion) from the oldest to the newest
+    versions: tuple[tuple[str, bool], ...]
+
+
+class UserState(typing.NamedTuple):
+    groups: frozenset[str]
+    policies: frozenset[str]
+    tags: typing.Dict[str, str]
+
+
+class GroupState(typing.NamedTuple):
+    policies: frozenset[str]
+
+
+class RoleState(typing.NamedTuple):
+    assume_role_policy: dict
+    policies: frozenset[str]
+    tags: typing.Dict[str, str]
+
+
+class AccountState(typing.NamedTuple):
+    """IAM entities of an account, customer managed policies by ARN, the others by name
+    """
+    policies: typing.Dict[str, PolicyState]
+    groups: typing.Dict[str, GroupState]
+    users: typing.Dict[str, UserState]
+    roles: typing.Dict[str, RoleState]
+
+
+def _document(document: str | dict) -> dict:
+    # botocore decodes the url encoded json documents of IAM, unless its handlers are disabled
+    return json.loads(urllib.parse.unquote(document)) if isinstance(document, str) else document
+
+
+def _attached(entity: dict) -> frozenset[str]:
+    return frozenset(policy["PolicyArn"] for policy in entity.get("AttachedManagedPolicies", []))
+
+
+def _tags(entity: dict) -> typing.Dict[str, str]:
+    return {tag["Key"]: tag["Value"] for tag in entity.get("Tags", [])}
+
+
+def load_state(iam_client) -> AccountState:
+    """Return the IAM entities of the account, read with the pages of a single get_account_authorization_details"""
+    state = AccountState({}, {}, {}, {})
+    paginator = iam_client.get_paginator("get_account_authorization_details")
+    for page in paginator.paginate(Filter=["User", "Group", "Role", "LocalManagedPolicy"],
+                                   PaginationConfig={"PageSize": 1000}):
+        for user in page.get("UserDetailList", []):
+            state.users[user["UserName"]] = UserState(frozenset(user.get("GroupList", [])), _attached(user),
+                                                      _tags(user))
+        for group in page.get("GroupDetailList", []):
+            state.groups[group["GroupName"]] = GroupState(_attached(group))
+        for role in page.get("RoleDetailList", []):
+            state.roles[role["RoleName"]] = RoleState(_document(role["AssumeRolePolicyDocument"]), _attached(role),
+                                                      _tags(role))
+        for policy in page.get("Policies", []):
+            versions = sorted(policy.get("PolicyVersionList", []), key=lambda version: version["CreateDate"])
+            default = next(version for version in versions if version["IsDefaultVersion"])
+            state.policies[policy["Arn"]] = PolicyState(
+                policy["PolicyName"], policy["Path"], _document(default["Document"]),
+                tuple((version["VersionId"], version["IsDefaultVersion"]) for version in versions))
+    return state
+
+
+def assume_role_policy(accounts: list[str], partition: str = "aws") -> dict:
+    """Return the trust policy of a role assumable from accounts"""
+    return {
+        "Version": "2012-10-17",
+        "Statement": [{
+            "Effect": "Allow",
+            "Principal": {"AWS": [f"arn:{partition}:iam::{account}:root" for account in accounts]},
+            "Action": "sts:AssumeRole",
+        }],
+    }
+
+
+def normalize(document: typing.Any) -> typing.Any:
+    """Return a policy document comparable with the ones stored by IAM: lists of one element are stored as the
+    element, the order of the lists does not matter"""
+    if isinstance(document, dict):
+        return {key: normalize(value) for key, value in document.items()}
+    if isinstance(document, list):
+        items = [normalize(item) for item in document]
+        return items[0] if len(items) == 1 else sorted(items, key=lambda item: json.dumps(item, sort_keys=True))
+    return document
+
+
+def _attachments(kind: str, name: str, desired: set[str], current: frozenset[str]) -> list[Change]:
+    key = {USER: "UserName", GROUP: "GroupName", ROLE: "RoleName"}[kind]
+    return [Change(ATTACH, f"attach_{kind}_policy", {key: name, "PolicyArn": arn}, (kind, name),
+                   ((kind, name), (POLICY, arn)))
+            for arn in sorted(desired - current)] + \
+           [Change(ATTACH, f"detach_{kind}_policy", {key: name, "PolicyArn": arn}, (kind, name), ((kind, name),))
+            for arn in sorted(current - desired)]
+
+
+def _tag_changes(kind: str, name: str, desired: typing.Dict[str, str], current: typing.Dict[str, str]) -> list[Change]:
+    key = {USER: "UserName", ROLE: "RoleName"}[kind]
+    changes = []
+    tags = [{"Key": tag, "Value": value} for tag, value in sorted(desired.items()) if current.get(tag) != value]
+    if tags:
+        changes.append(Change(ATTACH, f"tag_{kind}", {key: name, "Tags": tags}, (kind, name), ((kind, name),)))
+    removed = sorted(set(current) - set(desired))
+    if removed:
+        changes.append(Change(ATTACH, f"untag_{kind}", {key: name, "TagKeys": removed}, (kind, name),
+                              ((kind, name),)))
+    return changes
+
+
+def plan(manifest: Manifest, state: AccountState, account: str, partition: str = "aws") -> list[Change]:
+    """Return the changes bringing the entities of manifest from state to their desired state, by stage
+
+    Managed entities are created and their policies, groups and tags reconciled, entities absent from the manifest
+    are never changed nor deleted.
+    """
+    changes: list[Change] = []
+    policy_arns = {policy.name: arn for arn, policy in state.policies.items()}
+    policy_arns.update({policy.name: f"arn:{partition}:iam::{account}:policy{policy.path}{policy.name}"
+                        for policy in manifest.policies})
+
+    def arns(references: tuple[str, ...], owner: str) -> set[str]:
+        unknown = [reference for reference in references
+                   if not reference.startswith("arn:") and reference not in policy_arns]
+        if unknown:
+            raise ManifestError(f"Unknown policies of {owner}: {unknown}")
+        return {reference if reference.startswith("arn:") else policy_arns[reference] for reference in references}
+
+    for policy in manifest.policies:
+        arn = policy_arns[policy.name]
+        current = state.policies.get(arn)
+        document = json.dumps(policy.document)
+        if current is None:
+            changes.append(Change(CREATE, "create_policy",
+                                  {"PolicyName": policy.name, "Path": policy.path, "PolicyDocument": document},
+                                  (POLICY, arn)))
+        elif normalize(current.document) != normalize(policy.document):
+            if len(current.versions) >= MAX_POLICY_VERSIONS:
+                oldest = next(version for version, default in current.versions if not default)
+                changes.append(Change(CREATE, "delete_policy_version", {"PolicyArn": arn, "VersionId": oldest},
+                                      (POLICY, arn)))
+            changes.append(Change(UPDATE, "create_policy_version",
+                                  {"PolicyArn": arn, "PolicyDocument": document, "SetAsDefault": True},
+                                  (POLICY, arn), ((POLICY, arn),)))
+
+    for group in manifest.groups:
+        current = state.groups.get(group.name)
+        if current is None:
+            changes.append(Change(CREATE, "create_group", {"GroupName": group.name, "Path": group.path},
+                                  (GROUP, group.name)))
+        changes += _attachments(GROUP, group.name, arns(group.policies, f"group {group.name}"),
+                                current.policies if current else frozenset())
+
+    groups = set(state.groups) | {group.name for group in manifest.groups}
+    for user in manifest.users:
+        unknown = sorted(set(user.groups) - groups)
+        if unknown:
+            raise ManifestError(f"Unknown groups of user {user.name}: {unknown}")
+        current = state.users.get(user.name)
+        if current is None:
+            params = {"UserName": user.name, "Path": user.path}
+            if user.tags:
+                params["Tags"] = [{"Key": tag, "Value": value} for tag, value in user.tags]
+            changes.append(Change(CREATE, "create_user", params, (USER, user.name)))
+            current = UserState(frozenset(), frozenset(), dict(user.tags))
+        else:
+            changes += _tag_changes(USER, user.name, dict(user.tags), current.tags)
+        changes += [Change(ATTACH, "add_user_to_group", {"UserName": user.name, "GroupName": group},
+                           (USER, user.name), ((USER, user.name), (GROUP, group)))
+                    for group in sorted(set(user.groups) - current.groups)]
+        changes += [Change(ATTACH, "remove_user_from_group", {"UserName": user.name, "GroupName": group},
+                           (USER, user.name), ((USER, user.name),))
+                    for group in sorted(current.groups - set(user.groups))]
+        changes += _attachments(USER, user.name, arns(user.policies, f"user {user.name}"), current.policies)
+
+    for role in manifest.roles:
+        document = role.assume_role_policy or assume_role_policy(list(role.trusted_accounts), partition)
+        current = state.roles.get(role.name)
+        if current is None:
+            params = {"RoleName": role.name, "Path": role.path, "AssumeRolePolicyDocument": json.dumps(document)}
+            if role.tags:
+                params["Tags"] = [{"Key": tag, "Value": value} for tag, value in role.tags]
+            changes.append(Change(CREATE, "create_role", params, (ROLE, role.name)))
+            current = RoleState(document, frozenset(), dict(role.tags))
+        else:
+            if normalize(current.assume_role_policy) != normalize(document):
+                changes.append(Change(UPDATE, "update_assume_role_policy",
+                                      {"RoleName": role.name, "PolicyDocument": json.dumps(document)},
+                                      (ROLE, role.name), ((ROLE, role.name),)))
+            changes += _tag_changes(ROLE, role.name, dict(role.tags), current.tags)
+        changes += _attachments(ROLE, role.name, arns(role.policies, f"role {role.name}"), current.policies)
+
+    return sorted(changes, key=lambda change: change.stage)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the modules of the tool and the packages shared at the root of the repository are imported as by main.py
+TOOL_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path[:0] = [TOOL_DIRECTORY, os.path.join(TOOL_DIRECTORY, os.pardir)]
@@ -0,0 +1,157 @@
+import copy
+import json
+import pytest
+from apply import DONE, FAILED, SKIPPED, apply_changes
+from manifest import ManifestError, parse_manifest
+from plan import ATTACH, CREATE, MAX_POLICY_VERSIONS, UPDATE, assume_role_policy, load_state, plan
+from testing.fake_iam import ACCOUNT, FakeIAM
+
+READ_ONLY = "arn:aws:iam::aws:policy/ReadOnlyAccess"
+
+
+def document(*actions: str) -> dict:
+    return {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": list(actions), "Resource": "*"}]}
+
+
+MANIFEST = {
+    "policies": [{"name": "read-reports", "document": document("s3:GetObject")}],
+    "groups": [{"name": "analysts", "policies": ["read-reports", READ_ONLY]}],
+    "users": [{"name": "alice", "email": "alice@example.com", "groups": ["analysts"]},
+              {"name": "bob", "policies": ["read-reports"], "tags": {"team": "data"}}],
+    "roles": [{"name": "audit", "trusted_accounts": ["111111111111", 222222222222], "policies": ["read-reports"]}],
+}
+
+
+def plan_of(iam: FakeIAM, content: dict) -> list:
+    return plan(parse_manifest(content), load_state(iam), ACCOUNT)
+
+
+def operations(changes) -> list[tuple[int, str, str]]:
+    return [(change.stage, change.operation, change.entity[1]) for change in changes]
+
+
+def provisioned(content: dict = MANIFEST) -> FakeIAM:
+    iam = FakeIAM()
+    outcomes = apply_changes(iam, plan_of(iam, content), rate=1000)
+    assert {outcome.status for outcome in outcomes} == {DONE}
+    return iam
+
+
+def test_empty_account_is_created_by_stage():
+    arn = f"arn:aws:iam::{ACCOUNT}:policy/read-reports"
+    assert operations(plan_of(FakeIAM(), MANIFEST)) == [
+        (CREATE, "create_policy", arn),
+        (CREATE, "create_group", "analysts"),
+        (CREATE, "create_user", "alice"),
+        (CREATE, "create_user", "bob"),
+        (CREATE, "create_role", "audit"),
+        (ATTACH, "attach_group_policy", "analysts"),
+        (ATTACH, "attach_group_policy", "analysts"),
+        (ATTACH, "add_user_to_group", "alice"),
+        (ATTACH, "attach_user_policy", "bob"),
+        (ATTACH, "attach_role_policy", "audit"),
+    ]
+
+
+def test_applied_manifest_plans_nothing_from_one_read():
+    iam = provisioned()
+    iam.calls.clear()
+    assert plan_of(iam, MANIFEST) == []
+    assert iam.operations() == ["get_account_authorization_details"]
+    assert iam.users["alice"]["tags"] == {"email": "alice@example.com"}
+    assert iam.roles["audit"]["trust"] == assume_role_policy(["111111111111", "222222222222"])
+
+
+def test_drift_is_reconciled_for_managed_entities_only():
+    iam = provisioned()
+    iam.add_user("stranger", groups=("analysts",))
+    iam.users["alice"]["groups"].add("admins")
+    iam.users["alice"]["tags"]["email"] = "old@example.com"
+    iam.users["bob"]["tags"]["owner"] = "nobody"
+    iam.users["bob"]["policies"].add("arn:aws:iam::aws:policy/AdministratorAccess")
+    iam.roles["audit"]["trust"] = assume_role_policy(["111111111111"])
+    changes = plan_of(iam, MANIFEST)
+    assert [(change.operation, change.entity[1], change.params) for change in changes] == [
+        ("update_assume_role_policy", "audit",
+         {"RoleName": "audit", "PolicyDocument": json.dumps(assume_role_policy(["111111111111", "222222222222"]))}),
+        ("tag_user", "alice", {"UserName": "alice", "Tags": [{"Key": "email", "Value": "alice@example.com"}]}),
+        ("remove_user_from_group", "alice", {"UserName": "alice", "GroupName": "admins"}),
+        ("untag_user", "bob", {"UserName": "bob", "TagKeys": ["owner"]}),
+        ("detach_user_policy", "bob", {"UserName": "bob", "PolicyArn": "arn:aws:iam::aws:policy/AdministratorAccess"}),
+    ]
+    assert {outcome.status for outcome in apply_changes(iam, changes, rate=1000)} == {DONE}
+    assert plan_of(iam, MANIFEST) == []
+    assert iam.users["stranger"]["groups"] == {"analysts"}
+
+
+def test_documents_are_compared_as_iam_stores_them():
+    iam = provisioned()
+    content = copy.deepcopy(MANIFEST)
+    # single element lists are stored as the element, and the order of lists does not matter
+    content["policies"][0]["document"] = {"Version": "2012-10-17", "Statement": {
+        "Effect": "Allow", "Action": "s3:GetObject", "Resource": ["*"]}}
+    content["roles"][0]["trusted_accounts"] = ["222222222222", "111111111111"]
+    assert plan_of(iam, content) == []
+
+
+def test_changed_policy_makes_room_for_its_new_version():
+    iam = provisioned()
+    content = copy.deepcopy(MANIFEST)
+    arn = iam.policy_arn("read-reports")
+    for version in range(2, 6):
+        content["policies"][0]["document"] = document("s3:GetObject", f"s3:Action{version}")
+        changes = plan_of(iam, content)
+        assert operations(changes) == [(UPDATE, "create_policy_version", arn)]
+        apply_changes(iam, changes, rate=1000)
+    assert len(iam.policies[arn]["versions"]) == MAX_POLICY_VERSIONS
+
+    content["policies"][0]["document"] = document("s3:ListBucket")
+    changes = plan_of(iam, content)
+    assert operations(changes) == [(CREATE, "delete_policy_version", arn), (UPDATE, "create_policy_version", arn)]
+    assert changes[0].params["VersionId"] == "v1"
+    assert {outcome.status for outcome in apply_changes(iam, changes, rate=1000)} == {DONE}
+    assert plan_of(iam, content) == []
+
+
+def test_changes_requiring_a_failed_entity_are_skipped():
+    iam = FakeIAM()
+    iam.errors["create_policy"] = ["MalformedPolicyDocument"]
+    outcomes = apply_changes(iam, plan_of(iam, MANIFEST), rate=1000)
+    status = {(outcome.change.operation, outcome.change.params.get("PolicyArn", "")): outcome.status
+              for outcome in outcomes}
+    arn = iam.policy_arn("read-reports")
+    assert status["create_policy", ""] == FAILED
+    assert status["attach_group_policy", arn] == status["attach_user_policy", arn] == SKIPPED
+    assert status["attach_group_policy", READ_ONLY] == status["add_user_to_group", ""] == DONE
+
+
+def test_partial_apply_is_resumed():
+    iam = FakeIAM()
+    changes = plan_of(iam, MANIFEST)
+    # created by a former apply stopped before the attachments
+    iam.create_group(GroupName="analysts")
+    iam.errors["attach_user_policy"] = ["Throttling"]
+    outcomes = apply_changes(iam, changes, rate=1000)
+    assert {outcome.status for outcome in outcomes} == {DONE}
+    assert [outcome.detail for outcome in outcomes if outcome.change.operation == "create_group"] == [
+        "EntityAlreadyExists"]
+    assert plan_of(iam, MANIFEST) == []
+
+
+@pytest.mark.parametrize("content, message", [
+    ({"users": [{"name": "alice", "groups": ["missing"]}]}, "Unknown groups"),
+    ({"users": [{"name": "alice", "policies": ["missing"]}]}, "Unknown policies"),
+    ({"roles": [{"name": "audit"}]}, "neither trusted_accounts"),
+    ({"groups": [{"name": "devs"}, {"name": "devs"}]}, "Duplicate groups"),
+])
+def test_invalid_manifests(content, message):
+    with pytest.raises(ManifestError, match=message):
+        plan_of(FakeIAM(), content)
+
+
+def test_existing_policies_are_referenced_by_name():
+    iam = FakeIAM()
+    iam.create_policy(PolicyName="legacy", PolicyDocument=json.dumps(document("ec2:Describe*")), Path="/team/")
+    changes = plan_of(iam, {"groups": [{"name": "ops", "policies": ["legacy"]}]})
+    assert [change.params for change in changes if change.stage == ATTACH] == [
+        {"GroupName": "ops", "PolicyArn": f"arn:aws:iam::{ACCOUNT}:policy/team/legacy"}]
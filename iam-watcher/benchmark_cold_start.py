@@ -0,0 +1,68 @@
+"""Measure the init duration of main.py as on a Lambda cold start: its import by a fresh interpreter."""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# run by each fresh interpreter, the handler is not invoked
+SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import main
+init = time.perf_counter() - start
+# revisions older than the API metrics do not count the calls
+metrics = getattr(main, "metrics", None)
+calls = sum(stats.calls for stats in metrics.snapshot().values()) if metrics else None
+print(json.dumps({"init": init, "calls": calls, "modules": len(sys.modules)}))
+"""
+
+
+def cold_start(directory: str, env: dict[str, str], importtime: bool = False) -> tuple[dict, str]:
+    """Import main in a new interpreter, return its measures and the -X importtime output if requested"""
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", SNIPPET]
+    result = subprocess.run(command, cwd=directory, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(importtime: str, count: int) -> list[tuple[int, str]]:
+    """Return the count modules imported by main with the highest cumulative time in microseconds"""
+    imports = []
+    for line in importtime.splitlines():
+        # nested imports are indented by 2 spaces per level, the imports of main by 2
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)", line)
+        if match and len(match.group(3)) == 2:
+            imports.append((int(match.group(2)), match.group(4)))
+    return sorted(imports, reverse=True)[:count]
+
+
+def benchmark_cold_start():
+    parser = argparse.ArgumentParser(description="Benchmark the import of main.py by fresh interpreters.")
+    parser.add_argument("--runs", type=int, default=10, help="Number of cold starts")
+    parser.add_argument("--directory", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Directory of the main.py to import, e.g. a checkout of another revision")
+    parser.add_argument("--imports", type=int, default=10, help="Number of slowest imports of main to list")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    # the handler is not invoked, unset environment variables keep the defaults of main.py
+    runs = [cold_start(args.directory, env)[0] for _ in range(args.runs)]
+    inits = [run["init"] * 1000 for run in runs]
+    print(f"Import of {os.path.join(args.directory, 'main.py')}, {args.runs} cold starts")
+    print(f"  init     median {statistics.median(inits):>8.1f} ms  min {min(inits):>8.1f} ms  "
+          f"max {max(inits):>8.1f} ms")
+    calls = "not measured" if runs[0]["calls"] is None else runs[0]["calls"]
+    print(f"  AWS API calls {calls}, modules loaded {runs[0]['modules']}")
+
+    _, importtime = cold_start(args.directory, env, importtime=True)
+    print("  slowest imports of main (cumulative):")
+    for microseconds, module in slowest_imports(importtime, args.imports):
+        print(f"    {microseconds / 1000:>8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    benchmark_cold_start()
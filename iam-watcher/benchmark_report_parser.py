@@ -0,0 +1,140 @@
+"""Compare the credential report parser with the former split and dateutil path on a synthetic report."""
+
+import argparse
+import random
+import time
+import tracemalloc
+import typing
+from datetime import datetime, timedelta, timezone
+from dateutil import parser as dateParser
+from report_parser import parse_credential_report
+
+HEADER = ("user,arn,user_creation_time,password_enabled,password_last_used,password_last_changed,"
+          "password_next_rotation,mfa_active,access_key_1_active,access_key_1_last_rotated,"
+          "access_key_1_last_used_date,access_key_1_last_used_region,access_key_1_last_used_service,"
+          "access_key_2_active,access_key_2_last_rotated,access_key_2_last_used_date,access_key_2_last_used_region,"
+          "access_key_2_last_used_service,cert_1_active,cert_1_last_rotated,cert_2_active,cert_2_last_rotated")
+
+REGIONS = ["us-east-1", "eu-west-1", "eu-west-3", "ap-south-1"]
+SERVICES = ["s3", "ec2", "sts", "iam", "dynamodb"]
+
+
+class User(typing.NamedTuple):
+    """Former representation of a user: the 22 fields of the report as strings"""
+    user: str
+    arn: str
+    user_creation_time: str
+    password_enabled: str
+    password_last_used: str
+    password_last_changed: str
+    password_next_rotation: str
+    mfa_active: str
+    access_key_1_active: str
+    access_key_1_last_rotated: str
+    access_key_1_last_used_date: str
+    access_key_1_last_used_region: str
+    access_key_1_last_used_service: str
+    access_key_2_active: str
+    access_key_2_last_rotated: str
+    access_key_2_last_used_date: str
+    access_key_2_last_used_region: str
+    access_key_2_last_used_service: str
+    cert_1_active: str
+    cert_1_last_rotated: str
+    cert_2_active: str
+    cert_2_last_rotated: str
+
+
+def synthetic_report(users: int, seed: int = 0) -> bytes:
+    """Return a credential report of users, a third of them with console access and most with access keys"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def timestamp(max_days: int) -> str:
+        return (now - timedelta(days=rng.randint(0, max_days), seconds=rng.randint(0, 86400))).isoformat()
+
+    lines = [HEADER]
+    for index in range(users):
+        console = rng.random() < 0.33
+        keys = []
+        for _ in range(2):
+            if rng.random() < 0.6:
+                used = rng.random() < 0.8
+                keys.append(["true", timestamp(700), timestamp(200) if used else "N/A",
+                             rng.choice(REGIONS) if used else "N/A", rng.choice(SERVICES) if used else "N/A"])
+            else:
+                keys.append(["false", "N/A", "N/A", "N/A", "N/A"])
+        lines.append(",".join([
+            f"user{index}", f"arn:aws:iam::123456789012:user/user{index}", timestamp(1000),
+            "true" if console else "false",
+            (timestamp(200) if rng.random() < 0.8 else "no_information") if console else "N/A",
+            timestamp(300) if console else "N/A", "N/A", "true" if console and rng.random() < 0.7 else "false",
+            *keys[0], *keys[1], "false", "N/A", "false", "N/A",
+        ]))
+    return "\n".join(lines).encode("utf-8")
+
+
+def legacy_path(content: bytes) -> int:
+    """Former parsing and evaluation of lambda_handler, return the number of inactive users and keys"""
+    today = datetime.now()
+    users = [User(*line.split(",")) for line in content.decode("utf-8").split("\n")[1:]]
+    inactive = 0
+    for user in users:
+        if user.password_enabled == "true":
+            if user.password_last_used != "N/A" and user.password_last_used != "no_information":
+                inactive += (today - dateParser.parse(user.password_last_used).replace(tzinfo=None)).days >= 90
+        else:
+            for active, last_used in ((user.access_key_1_active, user.access_key_1_last_used_date),
+                                      (user.access_key_2_active, user.access_key_2_last_used_date)):
+                if active == "true":
+                    try:
+                        inactive += (today - dateParser.parse(last_used).replace(tzinfo=None)).days >= 90
+                    except Exception:
+                        pass
+    return inactive
+
+
+def streaming_path(content: bytes) -> int:
+    """Parsing with report_parser and the same evaluation as legacy_path"""
+    now = time.time()
+    users = parse_credential_report(content)
+    inactive = 0
+    for user in users:
+        if user.password_enabled:
+            if user.password_last_used is not None:
+                inactive += (now - user.password_last_used) // 86400 >= 90
+        else:
+            for active, last_used in ((user.access_key_1_active, user.access_key_1_last_used_date),
+                                      (user.access_key_2_active, user.access_key_2_last_used_date)):
+                if active and last_used is not None:
+                    inactive += (now - last_used) // 86400 >= 90
+    return inactive
+
+
+def measure(path: typing.Callable[[bytes], int], content: bytes) -> tuple[float, float, int]:
+    """Return the duration in seconds, the peak of allocated memory in MiB and the result of path on content"""
+    start = time.perf_counter()
+    result = path(content)
+    duration = time.perf_counter() - start
+    # memory is measured on a second run, tracemalloc slows down the allocations
+    tracemalloc.start()
+    path(content)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return duration, peak, result
+
+
+def benchmark_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the credential report parser on a synthetic report.")
+    parser.add_argument("--users", type=int, default=100000, help="Number of users of the synthetic report")
+    args = parser.parse_args()
+
+    content = synthetic_report(args.users)
+    print(f"Synthetic credential report: {args.users} users, {len(content) / 2 ** 20:.1f} MiB")
+    for name, path in (("legacy split + dateutil", legacy_path), ("streaming csv + columns", streaming_path)):
+        duration, peak, result = measure(path, content)
+        print(f"  {name:<24} {duration:>7.2f}s  peak {peak:>7.1f} MiB  {result} inactive")
+
+
+if __name__ == "__main__":
+    benchmark_parser()
@@ -0,0 +1,153 @@
+import os
+import time
+import typing
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+# IAM keeps a single credential report per account, generating a new one takes from seconds to minutes
+REPORT_MAX_AGE: int = 4 * 3600
+REPORT_DEADLINE: int = 600
+
+# error codes of get_credential_report
+REPORT_NOT_PRESENT = "ReportNotPresent"
+REPORT_EXPIRED = "ReportExpired"
+REPORT_IN_PROGRESS = "ReportInProgress"
+
+
+class CredentialReportTimeout(Exception):
+    """The credential report was not generated before the deadline"""
+
+
+class CredentialReport(typing.NamedTuple):
+    """Content of a credential report (csv) with its generation time
+    """
+    content: bytes
+    generated_time: datetime
+
+
+class FileReportCache:
+    """Keep credential reports in a local directory, e.g. /tmp which survives between warm Lambda invocations
+
+    Files are named <account>-<generated timestamp>.csv, only the most recent report of an account is kept.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _files(self, account: str) -> list[tuple[int, str]]:
+        files = []
+        for name in os.listdir(self.directory):
+            prefix, _, timestamp = name.removesuffix(".csv").rpartition("-")
+            if prefix == account and timestamp.isdigit():
+                files.append((int(timestamp), os.path.join(self.directory, name)))
+        return sorted(files)
+
+    def get(self, account: str) -> CredentialReport | None:
+        files = self._files(account)
+        if not files:
+            return None
+        timestamp, path = files[-1]
+        with open(path, "rb") as file:
+            return CredentialReport(file.read(), datetime.fromtimestamp(timestamp, timezone.utc))
+
+    def put(self, account: str, report: CredentialReport):
+        previous = self._files(account)
+        path = os.path.join(self.directory, f"{account}-{int(report.generated_time.timestamp())}.csv")
+        with open(path, "wb") as file:
+            file.write(report.content)
+        for _, old_path in previous:
+            if old_path != path:
+                os.remove(old_path)
+
+
+class S3ReportCache:
+    """Keep credential reports in S3 under <prefix><account>/<generated timestamp>.csv
+
+    Shared by all the invocations, whatever the Lambda instance running them. Only the most recent report of an
+    account is kept.
+    """
+
+    def __init__(self, s3_client, bucket: str, prefix: str = "credential-reports/"):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _keys(self, account: str) -> list[tuple[int, str]]:
+        keys = []
+        for page in self.s3_client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket,
+                                                                             Prefix=f"{self.prefix}{account}/"):
+            for item in page.get("Contents", []):
+                timestamp = item["Key"].removesuffix(".csv").rpartition("/")[2]
+                if item["Key"].endswith(".csv") and timestamp.isdigit():
+                    keys.append((int(timestamp), item["Key"]))
+        return sorted(keys)
+
+    def get(self, account: str) -> CredentialReport | None:
+        keys = self._keys(account)
+        if not keys:
+            return None
+        timestamp, key = keys[-1]
+        body = self.s3_client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        return CredentialReport(body.read(), datetime.fromtimestamp(timestamp, timezone.utc))
+
+    def put(self, account: str, report: CredentialReport):
+        previous = self._keys(account)
+        key = f"{self.prefix}{account}/{int(report.generated_time.timestamp())}.csv"
+        self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=report.content)
+        old_keys = [old_key for _, old_key in previous if old_key != key]
+        # delete_objects takes at most 1000 keys
+        for start in range(0, len(old_keys), 1000):
+            self.s3_client.delete_objects(Bucket=self.bucket, Delete={
+                "Objects": [{"Key": old_key} for old_key in old_keys[start:start + 1000]], "Quiet": True})
+
+
+def _is_recent(report: CredentialReport, max_age: int) -> bool:
+    return (datetime.now(timezone.utc) - report.generated_time).total_seconds() <= max_age
+
+
+def _get_report(iam_client) -> CredentialReport | None:
+    """Return the current report of the account, None if there is none or it is being generated"""
+    try:
+        response: typing.Dict[str, typing.Any] = iam_client.get_credential_report()
+    except ClientError as err:
+        if err.response["Error"]["Code"] in (REPORT_NOT_PRESENT, REPORT_EXPIRED, REPORT_IN_PROGRESS):
+            return None
+        raise
+    return CredentialReport(response["Content"], response["GeneratedTime"])
+
+
+def fetch_credential_report(iam_client, account: str = None, max_age: int = REPORT_MAX_AGE,
+                            deadline: int = REPORT_DEADLINE, cache: FileReportCache | S3ReportCache = None,
+                            base_delay: float = 1.0, max_delay: float = 15.0) -> CredentialReport:
+    """Return the credential report of the account, reusing one generated less than max_age seconds ago
+
+    The report is taken, in order, from the cache, from IAM if its current report is recent enough, or generated.
+    Generation is polled with an exponential backoff (base_delay doubled up to max_delay) until deadline seconds.
+    The cache is only used when account is given.
+
+    Raises:
+        CredentialReportTimeout: the report was still being generated at the deadline
+    """
+    if cache is not None and account is not None:
+        report = cache.get(account)
+        if report is not None and _is_recent(report, max_age):
+            return report
+
+    report = _get_report(iam_client)
+
+    if report is None or not _is_recent(report, max_age):
+        start = time.monotonic()
+        delay = base_delay
+        # generate_credential_report starts a generation when none is running and returns its state otherwise,
+        # IAM does not generate a new report while the current one is less than 4 hours old
+        while iam_client.generate_credential_report()["State"] != "COMPLETE" \
+                or (report := _get_report(iam_client)) is None:
+            if time.monotonic() - start + delay > deadline:
+                raise CredentialReportTimeout(f"Credential report not generated after {deadline}s")
+            time.sleep(delay)
+            delay = min(max_delay, delay * 2)
+
+    if cache is not None and account is not None:
+        cache.put(account, report)
+    return report
@@ -0,0 +1,132 @@
+import atexit
+import threading
+import time
+import typing
+from botocore.exceptions import ClientError
+
+# put_log_events limits
+MAX_BATCH_EVENTS: int = 10000
+MAX_BATCH_BYTES: int = 1048576
+MAX_BATCH_SPAN_MS: int = 24 * 3600 * 1000
+EVENT_OVERHEAD_BYTES: int = 26
+MAX_EVENT_BYTES: int = 262144 - EVENT_OVERHEAD_BYTES
+
+
+def _truncate(message: str) -> str:
+    encoded = message.encode("utf-8")
+    if len(encoded) <= MAX_EVENT_BYTES:
+        return message
+    return encoded[:MAX_EVENT_BYTES].decode("utf-8", errors="ignore")
+
+
+class CloudWatchLogSink:
+    """Buffer log events per stream of a log group and send them with put_log_events by batches
+
+    A stream is flushed when it holds max_batch_events events or max_batch_bytes bytes, every flush_interval seconds
+    and on close (also registered at exit). put_log_events no longer needs sequence tokens, streams are never described.
+    A missing log group or stream is created when a flush finds it missing, once per stream: nothing is checked
+    beforehand.
+
+    Arguments:
+        logs_client: CloudWatch Logs client, e.g. created with an endpoint_url to a local stand-in
+        log_group: log group of the streams
+        flush_interval: maximum seconds an event waits in the buffer, 0 to flush only on size and close
+    """
+
+    def __init__(self, logs_client, log_group: str, flush_interval: float = 5.0,
+                 max_batch_events: int = MAX_BATCH_EVENTS, max_batch_bytes: int = MAX_BATCH_BYTES):
+        self.logs_client = logs_client
+        self.log_group = log_group
+        self.max_batch_events = max_batch_events
+        self.max_batch_bytes = max_batch_bytes
+        self.put_calls = 0
+        self._created: set[str] = set()
+        self._buffers: dict[str, list[tuple[int, str]]] = {}
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._flush_periodically, args=(flush_interval,),
+                                            name="cloudwatch-log-sink", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, stream: str, message: str, timestamp: int = None):
+        """Buffer message for stream, timestamp in milliseconds defaults to now"""
+        message = _truncate(message)
+        event = (timestamp if timestamp is not None else int(round(time.time() * 1000)), message)
+        with self._lock:
+            self._buffers.setdefault(stream, []).append(event)
+            self._sizes[stream] = self._sizes.get(stream, 0) + len(message.encode("utf-8")) + EVENT_OVERHEAD_BYTES
+            full = len(self._buffers[stream]) >= self.max_batch_events or self._sizes[stream] >= self.max_batch_bytes
+        if full:
+            self.flush(stream)
+
+    def flush(self, stream: str = None):
+        """Send the buffered events of stream, of all streams if None"""
+        with self._lock:
+            streams = [stream] if stream is not None else list(self._buffers)
+            pending = {name: self._buffers.pop(name) for name in streams if self._buffers.get(name)}
+            for name in pending:
+                self._sizes.pop(name, None)
+        for name, events in pending.items():
+            for batch in self._batches(events):
+                self._put(name, batch)
+
+    def close(self):
+        """Stop the periodic flush and send all buffered events"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _flush_periodically(self, interval: float):
+        # an error must not end the thread, the events would then wait for the process exit
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as err:
+                print(f"ERROR\t{self.log_group}\tPeriodic flush failed -> {err!r}")
+
+    def _batches(self, events: list[tuple[int, str]]) -> typing.Iterator[list[dict]]:
+        # events of a batch must be in chronological order and span less than 24 hours
+        batch, size = [], 0
+        for timestamp, message in sorted(events, key=lambda event: event[0]):
+            event_size = len(message.encode("utf-8")) + EVENT_OVERHEAD_BYTES
+            if batch and (len(batch) >= self.max_batch_events or size + event_size > self.max_batch_bytes
+                          or timestamp - batch[0]["timestamp"] >= MAX_BATCH_SPAN_MS):
+                yield batch
+                batch, size = [], 0
+            batch.append({"timestamp": timestamp, "message": message})
+            size += event_size
+        if batch:
+            yield batch
+
+    def _put(self, stream: str, batch: list[dict]):
+        try:
+            try:
+                self.logs_client.put_log_events(logGroupName=self.log_group, logStreamName=stream, logEvents=batch)
+            except ClientError as err:
+                if err.response["Error"]["Code"] != "ResourceNotFoundException" or stream in self._created:
+                    raise
+                self._create(stream)
+                self.logs_client.put_log_events(logGroupName=self.log_group, logStreamName=stream, logEvents=batch)
+            with self._lock:
+                self.put_calls += 1
+        except Exception as err:
+            # e.g. EndpointConnectionError, the other streams and batches are still sent
+            print(f"ERROR\t{self.log_group}/{stream}\t{len(batch)} log events lost -> {err}")
+
+    def _create(self, stream: str):
+        # the group is created along with the first missing stream, both may already exist if created concurrently
+        with self._lock:
+            self._created.add(stream)
+        for create, params in ((self.logs_client.create_log_group, {}),
+                               (self.logs_client.create_log_stream, {"logStreamName": stream})):
+            try:
+                create(logGroupName=self.log_group, **params)
+            except ClientError as err:
+                if err.response["Error"]["Code"] != "ResourceAlreadyExistsException":
+                    raise
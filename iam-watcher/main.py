@@ -1,25 +1,37 @@
 import boto3
-from botocore.exceptions import ClientError
+import functools
 import json
-from datetime import datetime, timedelta, date
-from dateutil import parser as dateParser
+import os
+import sys
 import typing
 import time
-import pprint
-
-# boto3 clients used
-iam_client = boto3.client("iam")
-dynamo_client = boto3.client("dynamodb")
-ses_client = boto3.client("ses")
-
-# custom log stream
-logs = boto3.client("logs")
-try:
-    logs.create_log_group(logGroupName="disable-inactive-unused-iam")
-    logs.create_log_stream(logGroupName="disable-inactive-unused-iam", logStreamName="user")
-    logs.create_log_stream(logGroupName="disable-inactive-unused-iam", logStreamName="key")
-except Exception as e:
-    print(f"Ignoring the exception: {e}")
+
+# Modules shared by all the tools live at the root of the repository, package them along with this file
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from accounts.organization import list_member_accounts  # noqa: E402
+from instrumentation.metrics import ApiMetrics  # noqa: E402
+from credential_report import FileReportCache, S3ReportCache, fetch_credential_report  # noqa: E402
+from report_parser import CredentialReportTable, parse_credential_report  # noqa: E402
+from organization import audit_organization  # noqa: E402
+from log_sink import CloudWatchLogSink  # noqa: E402
+from snapshot import SnapshotStore, changed_users  # noqa: E402
+from remediation import (DELETE_KEY, DELETE_USER, DISABLE_CONSOLE, DONE, Remediation, Remediator,  # noqa: E402
+                         summarize)
+from reminders import ReminderSender, SentLog, collect_reminders  # noqa: E402
+from rules import (AGE, INACTIVITY, MFA_MISSING, NEVER_USED, NO_CREDENTIALS, PROGRAMMATIC_USERS, REMINDER,  # noqa: E402
+                   CONSOLE_USERS, Rule, evaluate, load_rules)
+
+# Metrics of every AWS API call, all clients are created from the instrumented default session
+metrics = ApiMetrics()
+
+# custom log stream, LOGS_ENDPOINT_URL points to a local CloudWatch Logs stand-in for tests
+LOG_GROUP = "disable-inactive-unused-iam"
+# endpoints of local stand-ins by service, DYNAMODB_ENDPOINT_URL points to DynamoDB Local for tests
+ENDPOINT_URLS: typing.Dict[str, str] = {
+    "logs": os.environ.get("LOGS_ENDPOINT_URL"),
+    "dynamodb": os.environ.get("DYNAMODB_ENDPOINT_URL"),
+    "ses": os.environ.get("SES_ENDPOINT_URL"),
+}
 
 # limits' settings - duration in days
 MAX_AKSK_AGE: int = 90
@@ -27,314 +39,207 @@ MAX_PASSWORD_AGE: int = 90
 GRACE_PERIOD: int = 7
 REMINDER_SCHEDULE: list[int] = [28, 21, 14, 7, 6, 5, 4, 3, 2, 1, 0]
 
+# policies evaluated on every user, RULES_FILE replaces them with rules read from a json file
+RULES: list[Rule] = [
+    Rule("inactive_past_90_days_user", INACTIVITY, "password", days=MAX_PASSWORD_AGE),
+    Rule("never_logged_in_user", NEVER_USED, "password"),
+    # access keys of users with console access are left to the password rules
+    Rule("inactive_past_90_days_key", INACTIVITY, "access_key", days=MAX_AKSK_AGE, users=PROGRAMMATIC_USERS),
+    Rule("never_used_key", NEVER_USED, "access_key", users=PROGRAMMATIC_USERS),
+    Rule("expired_password", AGE, "password", days=MAX_PASSWORD_AGE + GRACE_PERIOD),
+    Rule("expired_key", AGE, "access_key", days=MAX_AKSK_AGE + GRACE_PERIOD),
+    Rule("password_rotation_reminder", REMINDER, "password", days=MAX_PASSWORD_AGE,
+         schedule=tuple(REMINDER_SCHEDULE)),
+    Rule("key_rotation_reminder", REMINDER, "access_key", days=MAX_AKSK_AGE, schedule=tuple(REMINDER_SCHEDULE)),
+    Rule("mfa_missing_user", MFA_MISSING, "password", users=CONSOLE_USERS),
+    Rule("no_credentials_user", NO_CREDENTIALS),
+]
+if os.environ.get("RULES_FILE"):
+    RULES = load_rules(os.environ["RULES_FILE"])
+
+# remediation of the findings of each rule, rules not listed are only reported
+REMEDIATIONS: typing.Dict[str, str] = {
+    "inactive_past_90_days_user": DISABLE_CONSOLE,
+    "never_logged_in_user": DISABLE_CONSOLE,
+    "expired_password": DISABLE_CONSOLE,
+    "inactive_past_90_days_key": DELETE_KEY,
+    "never_used_key": DELETE_KEY,
+    "expired_key": DELETE_KEY,
+    "no_credentials_user": DELETE_USER,
+}
+# "dry_run" to log the remediation plans only, "apply" to execute them, unset to only report the findings
+REMEDIATION: str = os.environ.get("REMEDIATION")
+REMEDIATION_MAX_ACTIONS: int = int(os.environ.get("REMEDIATION_MAX_ACTIONS", 500))
+REMEDIATION_RATE: float = float(os.environ.get("REMEDIATION_RATE", 10))
+REMEDIATION_WORKERS: int = int(os.environ.get("REMEDIATION_WORKERS", 8))
+
 # Various variables
 SENDER_EMAIL = "iam.watcher@nawrocki.cc"
 
-
-class User(typing.NamedTuple):
-    """Represents an AWS IAM user with its attributes from credential report
-    """
-    user: str
-    arn: str
-    user_creation_time: str
-    password_enabled: str
-    password_last_used: str
-    password_last_changed: str
-    password_next_rotation: str
-    mfa_active: str
-    access_key_1_active: str
-    access_key_1_last_rotated: str
-    access_key_1_last_used_date: str
-    access_key_1_last_used_region: str
-    access_key_1_last_used_service: str
-    access_key_2_active: str
-    access_key_2_last_rotated: str
-    access_key_2_last_used_date: str
-    access_key_2_last_used_region: str
-    access_key_2_last_used_service: str
-    cert_1_active: str
-    cert_1_last_rotated: str
-    cert_2_active: str
-    cert_2_last_rotated: str
-
-
-def get_users_credential_report() -> list:
-    generate_report_response = iam_client.generate_credential_report()
-
-    while generate_report_response["State"] != "COMPLETE":
-        time.sleep(2)
-
-    # format report to readable
-    response: typing.Dict[str, typing.Any] = iam_client.get_credential_report()
-    body: str = response["Content"].decode("utf-8")
-    lines = body.split("\n")
-    users = [User(*line.split(",")) for line in lines[1:]]
-
-    return users
+# reminders - "true" to email the users reaching a day of REMINDER_SCHEDULE, at most once a day with a REMINDER_TABLE,
+# a table of its own (not SNAPSHOT_TABLE)
+SEND_REMINDERS: bool = os.environ.get("SEND_REMINDERS", "").lower() == "true"
+REMINDER_TABLE: str = os.environ.get("REMINDER_TABLE")
+# emails per second, the SES maximum send rate of the account if unset
+REMINDER_SEND_RATE: float = float(os.environ["REMINDER_SEND_RATE"]) if os.environ.get("REMINDER_SEND_RATE") else None
+
+# credential report reuse - duration in seconds, cache in a local directory (e.g. /tmp) or a S3 bucket
+REPORT_MAX_AGE: int = int(os.environ.get("REPORT_MAX_AGE", 4 * 3600))
+REPORT_DEADLINE: int = int(os.environ.get("REPORT_DEADLINE", 600))
+REPORT_CACHE_DIR: str = os.environ.get("REPORT_CACHE_DIR")
+REPORT_CACHE_BUCKET: str = os.environ.get("REPORT_CACHE_BUCKET")
+
+# organization mode - role assumed in every member account, unset to only watch the current account
+ORGANIZATION_ROLE: str = os.environ.get("ORGANIZATION_ROLE")
+ORGANIZATION_WORKERS: int = int(os.environ.get("ORGANIZATION_WORKERS", 8))
+FINDINGS_FILE: str = os.environ.get("FINDINGS_FILE")
+
+# incremental evaluation - table of the last evaluation of each user, unset to evaluate every user on each run
+SNAPSHOT_TABLE: str = os.environ.get("SNAPSHOT_TABLE")
+
+
+# Clients and the objects using them are created on first use and kept by warm Lambda invocations, nothing is
+# created nor called at import. Create them before starting threads: creating clients is not thread safe.
+@functools.cache
+def get_session() -> boto3.Session:
+    boto3.setup_default_session()
+    metrics.instrument_session(boto3.DEFAULT_SESSION)
+    return boto3.DEFAULT_SESSION
+
+
+@functools.cache
+def get_client(service: str):
+    return get_session().client(service, endpoint_url=ENDPOINT_URLS.get(service))
+
+
+@functools.cache
+def get_log_sink() -> CloudWatchLogSink:
+    # events are sent by batches, the sink is flushed before the end of each invocation. The log group and streams
+    # are created by the sink the first time they are found missing, not checked on every cold start
+    return CloudWatchLogSink(get_client("logs"), LOG_GROUP)
+
+
+@functools.cache
+def get_snapshot_store() -> SnapshotStore | None:
+    return SnapshotStore(get_client("dynamodb"), SNAPSHOT_TABLE) if SNAPSHOT_TABLE else None
+
+
+@functools.cache
+def get_report_cache():
+    if REPORT_CACHE_BUCKET:
+        return S3ReportCache(get_client("s3"), REPORT_CACHE_BUCKET)
+    if REPORT_CACHE_DIR:
+        return FileReportCache(REPORT_CACHE_DIR)
+    return None
+
+
+def get_users_credential_report(iam=None, account: str = None) -> CredentialReportTable:
+    cache = get_report_cache()
+    # reports are cached per account
+    if cache and account is None:
+        account = get_client("sts").get_caller_identity()["Account"]
+    report = fetch_credential_report(iam or get_client("iam"), account=account, max_age=REPORT_MAX_AGE,
+                                     deadline=REPORT_DEADLINE, cache=cache)
+    print(f"Using credential report {f'of {account} ' if account else ''}generated at {report.generated_time}")
+
+    # one typed column per field, timestamps in epoch seconds and None for N/A
+    return parse_credential_report(report.content)
+
+
+def evaluate_users(users: CredentialReportTable, now: float, account: str = None, iam=None,
+                   remediator: Remediator = None, reminder_sender: ReminderSender = None) -> typing.Dict[str, list]:
+    # with a snapshot table, only the users new, changed or crossing a threshold since their last evaluation are
+    # evaluated, and so notified or remediated
+    indexes, states = None, {}
+    snapshot_store = get_snapshot_store()
+    if snapshot_store:
+        account = account or get_client("sts").get_caller_identity()["Account"]
+        indexes, states = changed_users(snapshot_store, account, users, RULES, now)
+        print(f"Evaluating {len(indexes)}/{len(users)} users of {account} changed since their last evaluation")
+
+    # all rules are evaluated in a single pass over the report, findings are listed by rule
+    findings: typing.Dict[str, list[typing.Dict[str, str | int]]] = {rule.name: [] for rule in RULES}
+    evaluated = evaluate(RULES, users, now, indexes)
+    for finding in evaluated:
+        findings[finding.rule].append(finding.to_dict())
+
+    # users whose reminder or remediation is not done are evaluated again on the next run
+    pending = set()
+    if reminder_sender:
+        report = reminder_sender.send(iam or get_client("iam"), collect_reminders(evaluated), account, now)
+        pending.update(report.failed)
+        print(f"Reminders {f'of {account} ' if account else ''}-> {report.counts()}")
+    if remediator:
+        remediations = [Remediation(finding.username, REMEDIATIONS[finding.rule], finding.key, finding.rule,
+                                    finding.last_rotated)
+                        for finding in evaluated if finding.rule in REMEDIATIONS]
+        outcomes = remediator.remediate(iam or get_client("iam"), remediations)
+        pending.update(outcome.action.username for outcome in outcomes if outcome.status != DONE)
+        print(f"Remediation {f'of {account} ' if account else ''}-> {summarize(outcomes)}")
+
+    if snapshot_store:
+        snapshot_store.save(account, {username: state for username, state in states.items() if username not in pending})
+    return findings
+
+
+def audit_member_account(account: str, session: boto3.Session, remediator: Remediator = None,
+                         reminder_sender: ReminderSender = None) -> typing.Dict[str, list]:
+    iam = session.client("iam")
+    users = get_users_credential_report(iam, account)
+    return evaluate_users(users, time.time(), account, iam, remediator, reminder_sender)
 
 
 # def lambda_handler(event: typing.Dict[str, typing.Any], context):
 def lambda_handler():
-    users = get_users_credential_report()
-
-    today = datetime.now()
-
-    # console user
-    never_logged_in_user: list[typing.Dict[str, str]] = []
-    inactive_past_90_days_user: list[typing.Dict[str, str | int]] = []
-    # access key user
-    never_used_key: list[typing.Dict[str, str]] = []
-    inactive_past_90_days_key: list[typing.Dict[str, str | int]] = []
-
-    for user in users:
-        # user has access privilege to web aws console
-        if user.password_enabled == "true":
-
-            # user used their password at least one time
-            if (user.password_last_used != "N/A" and user.password_last_used != "no_information"):
-
-                # convert string to datetime
-                temp_user_password_last_used = dateParser.parse(user.password_last_used)
-                delta: int = (today - temp_user_password_last_used.replace(tzinfo=None)).days
-
-                # check if user dont logged in for the past 90 days
-                if delta >= 90:
-                    inactive_past_90_days_user.append({"username": user.user, "inactivity_time": delta})
-
-            # user never used password (never made login)
-            else:
-                never_logged_in_user.append({"username": user.user})
-
-        #########################
-        # user has only api keys
-        else:
-            # check if access key 1 is active
-            if user.access_key_1_active == "true":
-
-                # user used this key at least one time
-                try:
-                    # convert string to datetime
-                    temp_user_password_last_used = dateParser.parse(user.access_key_1_last_used_date)
-                    delta = (today - temp_user_password_last_used.replace(tzinfo=None)).days
-
-                    # check if user dont logged in for the past 90 days
-                    if delta >= 90:
-                        inactive_past_90_days_key.append(
-                            {
-                                "username": user.user,
-                                "key": "1",
-                                "inactivity_time": delta,
-                            }
-                        )
-
-                except:
-                    never_used_key.append({"username": user.user, "key": "1"})
-
-            # check if access key 1 is active
-            if user.access_key_2_active == "true":
-
-                # user used this key at least one time
-                try:
-                    # convert string to datetime
-                    temp_user_password_last_used = dateParser.parse(user.access_key_2_last_used_date)
-                    delta = (today - temp_user_password_last_used.replace(tzinfo=None)).days
-
-                    # check if user dont logged in for the past 90 days
-                    if delta >= 90:
-                        inactive_past_90_days_key.append(
-                            {
-                                "username": user.user,
-                                "key": "2",
-                                "inactivity_time": delta,
-                            }
-                        )
-
-                except:
-                    never_used_key.append({"username": user.user, "key": "2"})
+    # metrics are kept by warm Lambda invocations, each invocation reports its own calls only
+    metrics.reset()
+
+    # the cap on the number of actions is shared by all the accounts of an invocation
+    remediator = None
+    if REMEDIATION:
+        remediator = Remediator(dry_run=REMEDIATION != "apply", max_actions=REMEDIATION_MAX_ACTIONS,
+                                rate=REMEDIATION_RATE, max_workers=REMEDIATION_WORKERS, log=get_log_sink().log)
+    # so is the SES send rate
+    reminder_sender = None
+    if SEND_REMINDERS:
+        if REMINDER_TABLE and REMINDER_TABLE == SNAPSHOT_TABLE:
+            # each would replace the items of the other, see SentLog
+            raise ValueError("REMINDER_TABLE must be another table than SNAPSHOT_TABLE")
+        sent_log = SentLog(get_client("dynamodb"), REMINDER_TABLE) if REMINDER_TABLE else None
+        reminder_sender = ReminderSender(get_client("ses"), SENDER_EMAIL, max_rate=REMINDER_SEND_RATE,
+                                         sent_log=sent_log)
+
+    if ORGANIZATION_ROLE:
+        # every finding is tagged with its "account"
+        accounts = list(list_member_accounts(get_client("organizations")))
+        # the cache and snapshot store are shared by the threads auditing the accounts, created before them
+        get_report_cache()
+        get_snapshot_store()
+        audit_account = functools.partial(audit_member_account, remediator=remediator, reminder_sender=reminder_sender)
+        findings, errors = audit_organization(audit_account, accounts, ORGANIZATION_ROLE, get_client("sts"),
+                                              max_workers=ORGANIZATION_WORKERS, session_hook=metrics.instrument_session)
+        print(f"Audited {len(accounts) - len(errors)}/{len(accounts)} accounts")
+    else:
+        findings = evaluate_users(get_users_credential_report(), time.time(), remediator=remediator,
+                                  reminder_sender=reminder_sender)
+        errors = {}
+
+    if FINDINGS_FILE:
+        with open(FINDINGS_FILE, "w") as file:
+            json.dump({"findings": findings, "errors": errors}, file, indent=2)
 
     # Log to lambda cloudwatch operational info
-    pprint.pprint(f"inactive_past_90_days_user\n{inactive_past_90_days_user}")
-    pprint.pprint(f"never_logged_in_user\n{never_logged_in_user}")
-    pprint.pprint(f"inactive_past_90_days_key\n{inactive_past_90_days_key}")
-    pprint.pprint(f"never_used_key\n{never_used_key}")
-
-    # for user in inactive_past_90_days_user:
-    #     str_aux = str(user["username"]) + "\t" + "disable_console_access"
-    #     str_aux += "\t" + str(user["inactivity_time"]) + "\tdays_inactive"
-    #     try:
-    #         # remove the login_profile/password/ability to use the Console
-    #         iam_client.delete_login_profile(UserName=user["username"])
-    #         str_aux = "SUCCESS\t" + str_aux
-    #         create_log_cloudwatch(str_aux, "user")
-    #     except ClientError as e:
-    #         # error to remove ability to use console
-    #         str_aux = "ERROR\t" + str_aux
-    #         create_log_cloudwatch(str_aux, "user")
-    #         print(e)
-
-    # for user in never_logged_in_user:
-    #     str_aux = str(user["username"]) + "\t" + "disable_console_access"
-    #     try:
-    #         # remove the login_profile/password/ability to use the Console
-    #         iam_client.delete_login_profile(UserName=user["username"])
-    #         str_aux = "SUCCESS\t" + str_aux
-    #         create_log_cloudwatch(str_aux, "user")
-    #     except Exception as e:
-    #         # error to remove ability to use console
-    #         str_aux = "ERROR\t" + str_aux
-    #         create_log_cloudwatch(str_aux, "user")
-    #         print(e)
-
-    # # Delete unused access keys
-    # timeLimit = datetime.now() - timedelta(days=int(90))
-    # concat_list_key = inactive_past_90_days_key + never_used_key
-    # for user in concat_list_key:
-    #     try:
-    #         accessKeys = iam_client.list_access_keys(UserName=user["username"])
-
-    #         for key in accessKeys["AccessKeyMetadata"]:
-    #             if key["CreateDate"].date() <= timeLimit.date():
-
-    #                 str_aux = (
-    #                     str(user["username"])
-    #                     + "\tdisable_access_key\t"
-    #                     + str(key["AccessKeyId"])
-    #                     + "\t"
-    #                     + str((date.today() - key["CreateDate"].date()).days)
-    #                     + "\t"
-    #                     + str("key_age")
-    #                 )
-    #                 if "inactivity_time" in user:
-    #                     str_aux += (
-    #                         "\t" + str(user["inactivity_time"]
-    #                                    ) + "\tdays_inactive"
-    #                     )
-
-    #                 try:
-    #                     response = iam_client.delete_access_key(
-    #                         AccessKeyId=key["AccessKeyId"],
-    #                         UserName=user["username"],
-    #                     )
-    #                     str_aux = "SUCCESS\t" + str_aux
-    #                     create_log_cloudwatch(str_aux, "key")
-    #                 except Exception as e:
-    #                     str_aux = "ERROR\t" + str(e) + "\t" + str_aux
-    #                     create_log_cloudwatch(str_aux, "key")
-    #                     print(e)
-    #     except:
-    #         pass
-
-    # # delete users without login and at least one key
-    # for user in users:
-    #     if user.password_enabled == "false" or user.password_enabled == "N/A":
-    #         if user.access_key_1_active == "false" or user.access_key_1_active == "N/A":
-    #             if (
-    #                 user.access_key_2_active == "false"
-    #                 or user.access_key_2_active == "N/A"
-    #             ):
-
-    #                 # detach attached policies
-    #                 try:
-    #                     policies = iam_client.list_attached_user_policies(UserName=user.user)
-    #                     for policy in policies["AttachedPolicies"]:
-    #                         try:
-    #                             response = iam_client.detach_user_policy(
-    #                                 UserName=user.user, PolicyArn=policy["PolicyArn"])
-    #                             str_aux = (
-    #                                 "INFO\t"
-    #                                 + str(user.user)
-    #                                 + "\tdetach_policy"
-    #                                 + str(policy["PolicyArn"])
-    #                             )
-    #                             create_log_cloudwatch(str_aux, "user")
-    #                             print(str_aux)
-    #                         except Exception as e:
-    #                             str_aux = (
-    #                                 "ERROR\t"
-    #                                 + str(e)
-    #                                 + "\t"
-    #                                 + str(user.user)
-    #                                 + "\tdetach_policy\t"
-    #                                 + str(policy["PolicyArn"])
-    #                             )
-    #                             print(str_aux)
-    #                 except Exception as e:
-    #                     str_aux = ("ERROR\t" + str(e) + "\t" + str(user.user) + "\tlist_policy")
-    #                     print(str_aux)
-
-    #                 # detach user groups
-    #                 try:
-    #                     groups = iam_client.list_groups_for_user(UserName=user.user)
-    #                     for group in groups["Groups"]:
-    #                         try:
-    #                             response = iam_client.remove_user_from_group(
-    #                                 GroupName=group["GroupName"], UserName=user.user)
-    #                             str_aux = (
-    #                                 "INFO\t"
-    #                                 + str(user.user)
-    #                                 + "\tremove_user_from_group\t"
-    #                                 + str(group["GroupName"])
-    #                             )
-    #                             create_log_cloudwatch(str_aux, "user")
-    #                             print(str_aux)
-    #                         except Exception as e:
-    #                             str_aux = (
-    #                                 "ERROR\t"
-    #                                 + str(e)
-    #                                 + "\t"
-    #                                 + str(user.user)
-    #                                 + "\tremove_user_from_group\t"
-    #                                 + str(group["GroupName"])
-    #                             )
-    #                             print(str_aux)
-    #                 except Exception as e:
-    #                     str_aux = ("ERROR\t" + str(e) + "\t" + str(user.user) + "\tlist_groups")
-    #                     print(str_aux)
-
-    #                 # remove user policies
-    #                 try:
-    #                     policies = iam_client.list_user_policies(UserName=user.user)
-    #                     for policy in policies["PolicyNames"]:
-    #                         try:
-    #                             response = iam_client.delete_user_policy(UserName=user.user, PolicyName=policy)
-    #                             str_aux = (
-    #                                 "INFO\t"
-    #                                 + str(user.user)
-    #                                 + "\tdetach_policy_user"
-    #                                 + str(policy)
-    #                             )
-    #                             create_log_cloudwatch(str_aux, "user")
-    #                             print(str_aux)
-    #                         except Exception as e:
-    #                             str_aux = (
-    #                                 "ERROR\t"
-    #                                 + str(e)
-    #                                 + "\t"
-    #                                 + str(user.user)
-    #                                 + "\tdetach_policy_user\t"
-    #                                 + str(policy)
-    #                             )
-    #                             print(str_aux)
-    #                 except Exception as e:
-    #                     str_aux = (
-    #                         "ERROR\t"
-    #                         + str(e)
-    #                         + "\t"
-    #                         + str(user.user)
-    #                         + "\tlist_policy_user"
-    #                     )
-    #                     print(str_aux)
-
-    #                 str_aux = str(user.user) + "\tusername_deleted"
-    #                 try:
-    #                     response = iam_client.delete_user(UserName=user.user)
-    #                     str_aux = "SUCCESS\t" + str_aux
-    #                 except Exception as e:
-    #                     str_aux = "ERROR\t" + str(e) + "\t" + str_aux
-    #                     print(f"ERROR\tEXCEPTION during user deletion -> {e}")
-    #                 finally:
-    #                     create_log_cloudwatch(str_aux, "user")
-    #                     print(str_aux)
+    import pprint
+    for name, items in findings.items():
+        pprint.pprint(f"{name}\n{items}")
+
+    # a frozen Lambda would not run the periodic flush
+    get_log_sink().flush()
+
+    # Log to lambda cloudwatch the AWS API calls made, optionally to a Prometheus text file as well
+    print(f"AWS API calls:\n{metrics.summary()}")
+    if os.environ.get("METRICS_FILE"):
+        metrics.write_prometheus(os.environ["METRICS_FILE"])
 
     return {
         "statusCode": 200,
@@ -346,84 +251,12 @@ def lambda_handler():
     }
 
 
-def update_statistics_database(reminder_age: int):
-    pass
-
-
-def delete_aksk(username: str, inactivity_time: int = 0):
-    time_limit = datetime.now() - timedelta(days=int(90))
-
-    try:
-        access_keys = iam_client.list_access_keys(UserName=username)
-
-        for key in access_keys["AccessKeyMetadata"]:
-            if key["CreateDate"].date() <= time_limit.date():
-
-                str_aux = (
-                    str(username)
-                    + "\tdisable_access_key\t"
-                    + str(key["AccessKeyId"])
-                    + "\t"
-                    + str((date.today() - key["CreateDate"].date()).days)
-                    + "\t"
-                    + str("key_age")
-                )
-                if inactivity_time != 0:
-                    str_aux += (f"\t{str(inactivity_time)}\tdays_inactive")
-
-                try:
-                    iam_client.delete_access_key(
-                        AccessKeyId=key["AccessKeyId"],
-                        UserName=username,
-                    )
-                    str_aux = "SUCCESS\t" + str_aux
-                    create_log_cloudwatch(str_aux, "key")
-                except Exception as e:
-                    str_aux = "ERROR\t" + str(e) + "\t" + str_aux
-                    create_log_cloudwatch(str_aux, "key")
-                    print(e)
-    except ClientError as err:
-        print(f"ERROR\t{username}\tSomething went wrong during AK/SK deletion -> {err}")
-
-
-def delete_password(username: str):
-    pass
-
-
-def delete_user(username: str):
-    pass
-
-
-def get_username_email(username: str):
-    pass
-
-
-def send_email_warning_email(dest_email: str, password_age: int, aksk_age: int):
-    pass
-
-
 def create_log_cloudwatch(message: str, log_stream_name):
-    logs = boto3.client("logs")
-
-    response: typing.Dict[str, typing.Any] = logs.describe_log_streams(
-        logGroupName="disable-inactive-unused-iam", logStreamNamePrefix=log_stream_name
-    )
-
-    event_log: typing.Dict[str, typing.Any] = {
-        "logGroupName": "disable-inactive-unused-iam",
-        "logStreamName": log_stream_name,
-        "logEvents": [
-            {"timestamp": int(round(time.time() * 1000)), "message": message}
-        ],
-    }
-
-    if "uploadSequenceToken" in response["logStreams"][0]:
-        event_log.update({"sequenceToken": response["logStreams"][0]["uploadSequenceToken"]})
-
-    response = logs.put_log_events(**event_log)
+    get_log_sink().log(log_stream_name, message)
 
 
 if __name__ == "__main__":
+    import pprint
     print("starting")
     pprint.pprint(lambda_handler())
     print("finished")
@@ -0,0 +1,56 @@
+import typing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import boto3
+from accounts.organization import assume_role
+
+# number of accounts audited at the same time, most of their time is spent waiting for their credential report
+MAX_WORKERS: int = 8
+
+
+def audit_organization(audit_account: typing.Callable[[str, boto3.Session], dict[str, list[dict]]],
+                       accounts: list[str], role_name: str, sts_client, max_workers: int = MAX_WORKERS,
+                       session_hook: typing.Callable[[boto3.Session], None] = None
+                       ) -> tuple[dict[str, list[dict]], dict[str, str]]:
+    """Run audit_account in every account concurrently and merge their findings
+
+    Arguments:
+        audit_account: called with each account and a session opened in it, returns lists of findings by category
+        accounts: accounts to audit, the account of sts_client is audited with the default session
+        role_name: role assumed in the other accounts
+        sts_client: client assuming the role
+        max_workers: number of accounts audited at the same time
+        session_hook: called with each session before it is used, e.g. to instrument it
+
+    Returns:
+        the findings of all accounts by category, each tagged with its "account", and the error of each account that
+        could not be audited
+    """
+    own_account = sts_client.get_caller_identity()["Account"]
+
+    def audit(account: str) -> dict[str, list[dict]]:
+        if account == own_account:
+            session = boto3.DEFAULT_SESSION or boto3.Session()
+        else:
+            session = assume_role(sts_client, account, role_name, "iam-watcher")
+            if session_hook:
+                session_hook(session)
+        return audit_account(account, session)
+
+    findings: dict[str, list[dict]] = {}
+    errors: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(audit, account): account for account in accounts}
+        for future in as_completed(futures):
+            account = futures[future]
+            try:
+                for category, items in future.result().items():
+                    findings.setdefault(category, []).extend({"account": account, **item} for item in items)
+            except Exception as e:
+                print(f"ERROR\t{account}\tAudit failed -> {e}")
+                errors[account] = str(e)
+            else:
+                print(f"INFO\t{account}\tAudit done")
+
+    for items in findings.values():
+        items.sort(key=lambda item: item["account"])
+    return findings, errors
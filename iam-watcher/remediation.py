@@ -0,0 +1,235 @@
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from ratelimit.limiter import RateLimiter, call_with_retries
+from rules import ROOT_USER
+
+# remediations of a finding
+DISABLE_CONSOLE = "disable_console_access"   # delete the login profile (password) of the user
+DELETE_KEY = "delete_access_key"             # delete the access key of the finding
+DELETE_USER = "delete_user"                  # detach everything from the user, then delete it
+
+# status of an action
+DONE = "SUCCESS"
+FAILED = "ERROR"
+DRY_RUN = "DRYRUN"
+SKIPPED = "SKIPPED"
+
+# IAM calls per second, listing calls included, and users remediated at the same time
+RATE: float = 10.0
+MAX_WORKERS: int = 8
+MAX_ACTIONS: int = 500
+
+
+class Remediation(typing.NamedTuple):
+    """Remediation requested by a finding, key is the access key (1 or 2) of DELETE_KEY and last_rotated its creation
+    time in the credential report"""
+    username: str
+    kind: str
+    key: str | None = None
+    reason: str = ""
+    last_rotated: float | None = None
+
+
+class Action(typing.NamedTuple):
+    """Mutating IAM call of a user plan, operation is the name of the client method"""
+    username: str
+    operation: str
+    params: typing.Dict[str, str]
+    reason: str = ""
+
+
+class Outcome(typing.NamedTuple):
+    action: Action
+    status: str
+    detail: str = ""
+
+
+class Remediator:
+    """Execute remediations: a plan of IAM calls is built for each user, users are remediated concurrently
+
+    The actions of a user run in order and stop at its first failure. A user plan is executed entirely or not at all:
+    once max_actions actions are reserved, the plans of the remaining users are skipped. The cap is shared by all the
+    remediate calls of a Remediator, e.g. by the accounts of an organization.
+
+    Arguments:
+        dry_run: build and log the plans without calling the mutating operations, they still count in max_actions
+        max_actions: maximum number of mutating calls
+        rate: IAM calls per second per client, listing calls included
+        max_workers: number of users remediated at the same time per client
+        log: called with the log stream ("user" or "key") and the message of each action
+    """
+
+    def __init__(self, dry_run: bool = True, max_actions: int = MAX_ACTIONS, rate: float = RATE,
+                 max_workers: int = MAX_WORKERS, log: typing.Callable[[str, str], None] = None):
+        self.dry_run = dry_run
+        self.max_actions = max_actions
+        self.rate = rate
+        self.max_workers = max_workers
+        self.log = log
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    def remediate(self, iam_client, remediations: list[Remediation]) -> list[Outcome]:
+        """Remediate the users of remediations with iam_client, return the outcome of every planned action"""
+        by_user: typing.Dict[str, list[Remediation]] = {}
+        for remediation in remediations:
+            # the root user is never remediated
+            if remediation.username != ROOT_USER:
+                by_user.setdefault(remediation.username, []).append(remediation)
+        limiter = RateLimiter(self.rate)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(lambda item: self._remediate_user(iam_client, limiter, *item), by_user.items())
+            return [outcome for outcomes in results for outcome in outcomes]
+
+    def _remediate_user(self, iam_client, limiter: RateLimiter, username: str,
+                        remediations: list[Remediation]) -> list[Outcome]:
+        try:
+            plan, skipped = self._plan(iam_client, limiter, username, remediations)
+        except ClientError as err:
+            outcome = Outcome(Action(username, "plan", {}, _reasons(remediations)), FAILED, str(err))
+            self._log(outcome)
+            return [outcome]
+        for outcome in skipped:
+            self._log(outcome)
+        if not self._reserve(len(plan)):
+            outcomes = [Outcome(action, SKIPPED, f"more than {self.max_actions} actions") for action in plan]
+            for outcome in outcomes:
+                self._log(outcome)
+            return skipped + outcomes
+
+        outcomes, failed = skipped, None
+        for action in plan:
+            if failed:
+                outcome = Outcome(action, SKIPPED, f"{failed.operation} failed")
+            elif self.dry_run:
+                outcome = Outcome(action, DRY_RUN)
+            else:
+                try:
+                    call_with_retries(getattr(iam_client, action.operation), action.params, limiter)
+                    outcome = Outcome(action, DONE)
+                except ClientError as err:
+                    # already deleted or detached, e.g. by a former run
+                    if err.response["Error"]["Code"] == "NoSuchEntity":
+                        outcome = Outcome(action, DONE, "already done")
+                    else:
+                        outcome = Outcome(action, FAILED, str(err))
+            if outcome.status == FAILED:
+                failed = action
+            self._log(outcome)
+            outcomes.append(outcome)
+        return outcomes
+
+    def _reserve(self, actions: int) -> bool:
+        with self._lock:
+            if self._reserved + actions > self.max_actions:
+                return False
+            self._reserved += actions
+            return True
+
+    def _log(self, outcome: Outcome):
+        action = outcome.action
+        params = [value for name, value in action.params.items() if name != "UserName"]
+        fields = [outcome.status, action.username, action.operation, *params, action.reason]
+        message = "\t".join(field for field in fields + [outcome.detail] if field)
+        print(message)
+        if self.log:
+            self.log("key" if action.operation == DELETE_KEY else "user", message)
+
+    def _list(self, iam_client, limiter: RateLimiter, operation: str, key: str, username: str) -> list:
+        """Return all the items of an IAM listing operation of username, page by page under the rate limit"""
+        items, params = [], {"UserName": username}
+        while True:
+            response = call_with_retries(getattr(iam_client, operation), params, limiter)
+            items += response[key]
+            if not response.get("IsTruncated"):
+                return items
+            params["Marker"] = response["Marker"]
+
+    def _plan(self, iam_client, limiter: RateLimiter, username: str,
+              remediations: list[Remediation]) -> tuple[list[Action], list[Outcome]]:
+        """Return the mutating calls remediating username in their order of execution, and the remediations skipped
+        because the live state of the user no longer matches the credential report"""
+        kinds = {remediation.kind for remediation in remediations}
+        if DELETE_USER in kinds:
+            return self._plan_delete_user(iam_client, limiter, username, _reasons(remediations, DELETE_USER))
+
+        plan: list[Action] = []
+        if DISABLE_CONSOLE in kinds:
+            plan.append(Action(username, "delete_login_profile", {"UserName": username},
+                               _reasons(remediations, DISABLE_CONSOLE)))
+        skipped = []
+        by_slot: typing.Dict[str, list[Remediation]] = {}
+        for remediation in remediations:
+            if remediation.kind == DELETE_KEY:
+                by_slot.setdefault(remediation.key, []).append(remediation)
+        if by_slot:
+            # the key of a report slot is the one created when the report says it was rotated: a key rotated since the
+            # report is not the key of the finding, and is left alone
+            keys = self._list(iam_client, limiter, "list_access_keys", "AccessKeyMetadata", username)
+            for slot, slot_remediations in sorted(by_slot.items()):
+                rotated = slot_remediations[0].last_rotated
+                key = next((key for key in keys
+                            if rotated is not None and abs(key["CreateDate"].timestamp() - rotated) < 1), None)
+                if key:
+                    plan.append(Action(username, DELETE_KEY, {"UserName": username, "AccessKeyId": key["AccessKeyId"]},
+                                       _reasons(slot_remediations)))
+                else:
+                    skipped.append(Outcome(Action(username, DELETE_KEY, {"UserName": username},
+                                                  _reasons(slot_remediations)),
+                                           SKIPPED, f"access key {slot} rotated since the report"))
+        return plan, skipped
+
+    def _plan_delete_user(self, iam_client, limiter: RateLimiter, username: str,
+                          reason: str) -> tuple[list[Action], list[Outcome]]:
+        # IAM refuses to delete a user with credentials, devices, policies or groups attached
+        def listed(operation: str, key: str) -> list:
+            return self._list(iam_client, limiter, operation, key, username)
+
+        # the report may be hours old: a user given a password or an active key since then is not deleted
+        skipped = Outcome(Action(username, DELETE_USER, {"UserName": username}, reason), SKIPPED)
+        try:
+            call_with_retries(iam_client.get_login_profile, {"UserName": username}, limiter)
+            return [], [skipped._replace(detail="has a password")]
+        except ClientError as err:
+            if err.response["Error"]["Code"] != "NoSuchEntity":
+                raise
+        keys = listed("list_access_keys", "AccessKeyMetadata")
+        if any(key["Status"] == "Active" for key in keys):
+            return [], [skipped._replace(detail="has an active access key")]
+
+        plan = [Action(username, DELETE_KEY, {"UserName": username, "AccessKeyId": key["AccessKeyId"]}, reason)
+                for key in keys]
+        plan += [Action(username, "delete_signing_certificate",
+                        {"UserName": username, "CertificateId": certificate["CertificateId"]}, reason)
+                 for certificate in listed("list_signing_certificates", "Certificates")]
+        plan += [Action(username, "delete_ssh_public_key",
+                        {"UserName": username, "SSHPublicKeyId": key["SSHPublicKeyId"]}, reason)
+                 for key in listed("list_ssh_public_keys", "SSHPublicKeys")]
+        plan += [Action(username, "deactivate_mfa_device",
+                        {"UserName": username, "SerialNumber": device["SerialNumber"]}, reason)
+                 for device in listed("list_mfa_devices", "MFADevices")]
+        plan += [Action(username, "delete_user_policy", {"UserName": username, "PolicyName": policy}, reason)
+                 for policy in listed("list_user_policies", "PolicyNames")]
+        plan += [Action(username, "detach_user_policy", {"UserName": username, "PolicyArn": policy["PolicyArn"]},
+                        reason)
+                 for policy in listed("list_attached_user_policies", "AttachedPolicies")]
+        plan += [Action(username, "remove_user_from_group", {"UserName": username, "GroupName": group["GroupName"]},
+                        reason)
+                 for group in listed("list_groups_for_user", "Groups")]
+        plan.append(Action(username, DELETE_USER, {"UserName": username}, reason))
+        return plan, []
+
+
+def _reasons(remediations: list[Remediation], kind: str = None) -> str:
+    return ",".join(sorted({remediation.reason for remediation in remediations
+                            if kind is None or remediation.kind == kind}))
+
+
+def summarize(outcomes: list[Outcome]) -> typing.Dict[str, int]:
+    """Return the number of actions by status"""
+    counts: typing.Dict[str, int] = {}
+    for outcome in outcomes:
+        counts[outcome.status] = counts.get(outcome.status, 0) + 1
+    return counts
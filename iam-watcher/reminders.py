@@ -0,0 +1,207 @@
+import json
+import threading
+import time
+import typing
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+from ratelimit.limiter import THROTTLING_ERROR_CODES, RateLimiter, call_with_retries
+from rules import REMINDER, Finding
+from snapshot import batch_get_users, batch_put_users
+
+# send_bulk_templated_email limit
+MAX_DESTINATIONS: int = 50
+# emails of fewer users are read with list_user_tags, of more from the pages of get_account_authorization_details
+MAX_TAG_LOOKUPS: int = 20
+EMAIL_TAG: str = "email"
+# retry delays of the throttled sends, SES refills its send rate every second
+BASE_DELAY: float = 1.0
+MAX_DELAY: float = 20.0
+# days a sent reminder is kept in the table, with DynamoDB TTL enabled on its "expires" attribute
+SENT_RETENTION_DAYS: int = 7
+
+TEMPLATE_NAME: str = "iam-watcher-reminder"
+TEMPLATE: typing.Dict[str, str] = {
+    "SubjectPart": "Your AWS IAM credentials expire in {{days_left}} days",
+    "TextPart": "Hello {{username}},\n\n"
+                "{{#if password_days_left}}The password of your IAM user {{username}} in account {{account}} "
+                "expires in {{password_days_left}} days.\n{{/if}}"
+                "{{#if key_days_left}}An access key of your IAM user {{username}} in account {{account}} "
+                "expires in {{key_days_left}} days.\n{{/if}}"
+                "\nPlease rotate them before they are deleted.\n",
+}
+
+# every variable of the template has a value, SES does not render a template with a missing one
+DEFAULT_TEMPLATE_DATA: str = json.dumps({"username": "", "account": "", "days_left": "", "password_days_left": None,
+                                         "key_days_left": None})
+
+
+class Reminder(typing.NamedTuple):
+    """Credentials of a user reaching a reminder day, days left before the expiration of each, None if not due"""
+    username: str
+    password_days_left: int | None = None
+    key_days_left: int | None = None
+
+    def template_data(self, account: str) -> str:
+        days_left = min(days for days in (self.password_days_left, self.key_days_left) if days is not None)
+        # 0 days left is falsy in the template conditions, sent as a string
+        return json.dumps({"username": self.username, "account": account or "", "days_left": days_left,
+                           "password_days_left": _template_days(self.password_days_left),
+                           "key_days_left": _template_days(self.key_days_left)})
+
+
+def _template_days(days: int | None) -> str | None:
+    return None if days is None else str(days)
+
+
+class ReminderReport(typing.NamedTuple):
+    """Usernames by outcome: sent, already reminded today, without email tag, failed"""
+    sent: list[str]
+    duplicate: list[str]
+    no_email: list[str]
+    failed: list[str]
+
+    def counts(self) -> typing.Dict[str, int]:
+        return {name: len(usernames) for name, usernames in self._asdict().items()}
+
+
+def collect_reminders(findings: list[Finding]) -> list[Reminder]:
+    """Merge the REMINDER findings of each user in a single reminder, the earliest expiration of its access keys"""
+    days: typing.Dict[str, typing.Dict[str, int]] = {}
+    for finding in findings:
+        if finding.kind == REMINDER:
+            credential = "password" if finding.key is None else "key"
+            user = days.setdefault(finding.username, {})
+            user[credential] = min(user.get(credential, finding.days), finding.days)
+    return [Reminder(username, user.get("password"), user.get("key")) for username, user in days.items()]
+
+
+def resolve_emails(iam_client, usernames: list[str], tag: str = EMAIL_TAG) -> typing.Dict[str, str]:
+    """Return the email tag of usernames, read in bulk from the account authorization details for many users"""
+    emails = {}
+    if len(usernames) <= MAX_TAG_LOOKUPS:
+        for username in usernames:
+            try:
+                tags = iam_client.list_user_tags(UserName=username)["Tags"]
+            except ClientError as err:
+                if err.response["Error"]["Code"] != "NoSuchEntity":
+                    raise
+                continue
+            emails.update({username: item["Value"] for item in tags if item["Key"] == tag})
+        return emails
+
+    wanted = set(usernames)
+    for page in iam_client.get_paginator("get_account_authorization_details").paginate(Filter=["User"]):
+        for user in page["UserDetailList"]:
+            if user["UserName"] in wanted:
+                emails.update({user["UserName"]: item["Value"] for item in user.get("Tags", []) if item["Key"] == tag})
+    return emails
+
+
+class SentLog:
+    """Day of the last reminder sent to each user, in a DynamoDB table created by snapshot.create_table
+
+    The table must not be the table of a SnapshotStore: both write whole items with the same keys, and the items of
+    this table expire with DynamoDB TTL on their "expires" attribute.
+    """
+
+    def __init__(self, dynamo_client, table_name: str):
+        self.dynamo_client = dynamo_client
+        self.table_name = table_name
+
+    def load(self, account: str, usernames: list[str]) -> typing.Dict[str, str]:
+        items = batch_get_users(self.dynamo_client, self.table_name, account, usernames, ["sent_day"])
+        return {username: item["sent_day"]["S"] for username, item in items.items()}
+
+    def save(self, account: str, usernames: list[str], day: str, now: float):
+        expires = {"N": str(int(now) + SENT_RETENTION_DAYS * 86400)}
+        batch_put_users(self.dynamo_client, self.table_name, account,
+                        {username: {"sent_day": {"S": day}, "expires": expires} for username in usernames})
+
+
+class ReminderSender:
+    """Send reminders by email with SES templated bulk sends of MAX_DESTINATIONS users, under the SES send rate
+
+    A user gets at most one reminder a day: the users already reminded today in sent_log, or earlier in the same run
+    without sent_log, are skipped. The template is created the first time it is used if it does not exist. The send
+    rate is shared by all the send calls of a ReminderSender, e.g. by the accounts of an organization.
+
+    Arguments:
+        ses_client: SES client, e.g. created with an endpoint_url to a local SES stand-in
+        source: sender email address, verified in SES
+        max_rate: emails sent per second, the MaxSendRate of get_send_quota if None
+        sent_log: day of the last reminder of each user, kept between runs
+    """
+
+    def __init__(self, ses_client, source: str, template: str = TEMPLATE_NAME, max_rate: float = None,
+                 sent_log: SentLog = None):
+        self.ses_client = ses_client
+        self.source = source
+        self.template = template
+        self.max_rate = max_rate
+        self.sent_log = sent_log
+        self._limiter = None
+        self._sent: set[tuple[str, str, str]] = set()
+        self._lock = threading.Lock()
+
+    def _prepare(self) -> RateLimiter:
+        with self._lock:
+            if self._limiter is None:
+                try:
+                    self.ses_client.get_template(TemplateName=self.template)
+                except ClientError as err:
+                    if err.response["Error"]["Code"] != "TemplateDoesNotExist":
+                        raise
+                    self.ses_client.create_template(Template={"TemplateName": self.template, **TEMPLATE})
+                if self.max_rate is None:
+                    self.max_rate = self.ses_client.get_send_quota()["MaxSendRate"]
+                # bursts of one second of sends
+                self._limiter = RateLimiter(self.max_rate, burst=max(1, int(self.max_rate)))
+            return self._limiter
+
+    def send(self, iam_client, reminders: list[Reminder], account: str = None, now: float = None) -> ReminderReport:
+        """Send reminders to the users of account, their email read from their tags with iam_client"""
+        now = time.time() if now is None else now
+        day = datetime.fromtimestamp(now, timezone.utc).date().isoformat()
+        report = ReminderReport([], [], [], [])
+        if not reminders:
+            return report
+
+        usernames = [reminder.username for reminder in reminders]
+        sent_days = self.sent_log.load(account or "", usernames) if self.sent_log else {}
+        with self._lock:
+            due = [reminder for reminder in reminders
+                   if sent_days.get(reminder.username) != day and (account, reminder.username, day) not in self._sent]
+        report.duplicate.extend(sorted(set(usernames) - {reminder.username for reminder in due}))
+
+        emails = resolve_emails(iam_client, [reminder.username for reminder in due]) if due else {}
+        report.no_email.extend(reminder.username for reminder in due if reminder.username not in emails)
+        due = [reminder for reminder in due if reminder.username in emails]
+        if due:
+            limiter = self._prepare()
+        for start in range(0, len(due), MAX_DESTINATIONS):
+            batch = due[start:start + MAX_DESTINATIONS]
+            # every destination is an email of the send rate
+            for _ in batch:
+                limiter.acquire()
+            try:
+                statuses = self._send_batch([{
+                    "Destination": {"ToAddresses": [emails[reminder.username]]},
+                    "ReplacementTemplateData": reminder.template_data(account),
+                } for reminder in batch])
+            except ClientError as err:
+                print(f"ERROR\t{len(batch)} reminders not sent -> {err}")
+                statuses = [{"Status": "Failed"}] * len(batch)
+            for reminder, status in zip(batch, statuses):
+                (report.sent if status["Status"] == "Success" else report.failed).append(reminder.username)
+
+        with self._lock:
+            self._sent.update((account, username, day) for username in report.sent)
+        if self.sent_log and report.sent:
+            self.sent_log.save(account or "", report.sent, day, now)
+        return report
+
+    def _send_batch(self, destinations: list[dict]) -> list[dict]:
+        params = {"Source": self.source, "Template": self.template, "DefaultTemplateData": DEFAULT_TEMPLATE_DATA,
+                  "Destinations": destinations}
+        return call_with_retries(self.ses_client.send_bulk_templated_email, params, retryable=THROTTLING_ERROR_CODES,
+                                 base_delay=BASE_DELAY, max_delay=MAX_DELAY)["Status"]
@@ -0,0 +1,154 @@
+import csv
+import io
+import itertools
+import math
+import sys
+import typing
+from array import array
+from datetime import datetime
+
+# columns of the credential report by type, any other column is kept as text
+TIMESTAMP_COLUMNS = (
+    "user_creation_time",
+    "password_last_used",
+    "password_last_changed",
+    "password_next_rotation",
+    "access_key_1_last_rotated",
+    "access_key_1_last_used_date",
+    "access_key_2_last_rotated",
+    "access_key_2_last_used_date",
+    "cert_1_last_rotated",
+    "cert_2_last_rotated",
+)
+BOOLEAN_COLUMNS = (
+    "password_enabled",
+    "mfa_active",
+    "access_key_1_active",
+    "access_key_2_active",
+    "cert_1_active",
+    "cert_2_active",
+)
+
+# "N/A", "no_information", "not_supported"... are stored as missing values: NaN timestamps and -1 booleans
+BOOLEAN_VALUES = {"true": 1, "false": 0}
+MISSING_BOOLEAN = -1
+MISSING_TIMESTAMP = math.nan
+
+# rows are converted column by column by chunks of CHUNK_ROWS, the whole report is never held as text
+CHUNK_ROWS = 4096
+
+
+def parse_timestamp(value: str) -> float:
+    """Return the epoch seconds of a credential report timestamp, NaN if there is none
+
+    Report timestamps are ISO 8601 with a UTC offset (2023-01-15T10:22:33+00:00) and parsed by the C implementation
+    of datetime.fromisoformat, anything else goes through dateutil.
+    """
+    if len(value) < 19 or value[4] != "-" or value[10] != "T":
+        return MISSING_TIMESTAMP
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        # dateutil is slow to import and rarely needed
+        from dateutil import parser as dateParser
+        try:
+            return dateParser.parse(value).timestamp()
+        except (ValueError, OverflowError):
+            return MISSING_TIMESTAMP
+
+
+def _parse_boolean(value: str) -> int:
+    return BOOLEAN_VALUES.get(value, MISSING_BOOLEAN)
+
+
+def _timestamp_value(value: float) -> float | None:
+    return None if math.isnan(value) else value
+
+
+def _boolean_value(value: int) -> bool | None:
+    return None if value == MISSING_BOOLEAN else bool(value)
+
+
+class UserView:
+    """Read-only access to the row of a user in a CredentialReportTable, by column name
+
+    Timestamps are epoch seconds, booleans are bool, missing values are None.
+    """
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "CredentialReportTable", index: int):
+        self._table = table
+        self._index = index
+
+    def __getattr__(self, name: str):
+        return self._table.value(name, self._index)
+
+    def __repr__(self) -> str:
+        return f"UserView({self._table.value('user', self._index)!r})"
+
+
+class CredentialReportTable:
+    """Credential report stored by column: typed arrays for timestamps and booleans, interned strings otherwise
+    """
+    __slots__ = ("columns", "_converters", "_getters", "_length")
+
+    def __init__(self, header: list[str]):
+        self.columns: typing.Dict[str, typing.Any] = {}
+        # conversions of each column are chosen once, not per value
+        self._converters = []
+        self._getters = {}
+        for name in header:
+            if name in TIMESTAMP_COLUMNS:
+                self.columns[name] = array("d")
+                self._converters.append(parse_timestamp)
+                self._getters[name] = _timestamp_value
+            elif name in BOOLEAN_COLUMNS:
+                self.columns[name] = array("b")
+                self._converters.append(_parse_boolean)
+                self._getters[name] = _boolean_value
+            else:
+                self.columns[name] = []
+                # regions, services and N/A repeat on every row, a single string is kept for each value
+                self._converters.append(sys.intern)
+                self._getters[name] = None
+        self._length = 0
+
+    def extend(self, rows: list[list[str]]):
+        """Append rows, converted one column at a time"""
+        for column, convert, values in zip(self.columns.values(), self._converters, zip(*rows)):
+            column.extend(map(convert, values))
+        self._length += len(rows)
+
+    def value(self, name: str, index: int):
+        try:
+            getter = self._getters[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        value = self.columns[name][index]
+        return getter(value) if getter else value
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> UserView:
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return UserView(self, index)
+
+    def __iter__(self) -> typing.Iterator[UserView]:
+        return (UserView(self, index) for index in range(self._length))
+
+
+def parse_credential_report(content: bytes | typing.BinaryIO) -> CredentialReportTable:
+    """Parse a credential report (csv) line by line into a CredentialReportTable
+
+    Arguments:
+        content: report content as returned by get_credential_report, or a binary file to stream it from
+    """
+    stream = io.BytesIO(content) if isinstance(content, bytes) else content
+    reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+    header = next(reader)
+    table = CredentialReportTable(header)
+    while chunk := list(itertools.islice(reader, CHUNK_ROWS)):
+        table.extend([row for row in chunk if len(row) == len(header)])
+    return table
@@ -0,0 +1,216 @@
+import json
+import math
+import typing
+from report_parser import CredentialReportTable
+
+# kinds of rules
+INACTIVITY = "inactivity"      # credential not used for days or more
+NEVER_USED = "never_used"      # active credential never used
+AGE = "age"                    # credential not rotated for days or more
+REMINDER = "reminder"          # credential expiring (days after its rotation) in one of the schedule days
+MFA_MISSING = "mfa_missing"    # console access without MFA
+NO_CREDENTIALS = "no_credentials"  # neither password nor active access key, the root user excepted
+
+# users a rule applies to, by console access
+ALL_USERS = "all"
+CONSOLE_USERS = "console"
+PROGRAMMATIC_USERS = "programmatic"
+
+# name of the row of the root user in the credential report
+ROOT_USER = "<root_account>"
+
+
+class Credential(typing.NamedTuple):
+    """Columns of the credential report describing a credential
+    """
+    name: str
+    key: str | None
+    active: str
+    last_used: str
+    last_rotated: str
+
+
+CREDENTIALS: typing.Dict[str, list[Credential]] = {
+    "password": [Credential("password", None, "password_enabled", "password_last_used", "password_last_changed")],
+    "access_key": [
+        Credential(f"access_key_{key}", key, f"access_key_{key}_active", f"access_key_{key}_last_used_date",
+                   f"access_key_{key}_last_rotated")
+        for key in ("1", "2")
+    ],
+}
+
+
+class Rule(typing.NamedTuple):
+    """Policy declared as data, see the kinds of rules above
+
+    Arguments:
+        name: name of the findings of the rule
+        kind: INACTIVITY, NEVER_USED, AGE, REMINDER, MFA_MISSING or NO_CREDENTIALS
+        credential: "password" or "access_key" (both keys of the user)
+        days: threshold of INACTIVITY and AGE, maximum age of REMINDER
+        users: ALL_USERS, CONSOLE_USERS (password enabled) or PROGRAMMATIC_USERS (no password)
+        schedule: days before expiration a REMINDER is raised
+    """
+    name: str
+    kind: str
+    credential: str = "password"
+    days: int = 0
+    users: str = ALL_USERS
+    schedule: tuple[int, ...] = ()
+
+
+class Finding(typing.NamedTuple):
+    """A rule matching a credential of a user, days is the inactivity, age or days left according to the rule kind,
+    last_rotated the creation time of the access key of the finding, identifying it in the live state
+    """
+    rule: str
+    kind: str
+    username: str
+    credential: str
+    key: str | None = None
+    days: int | None = None
+    last_rotated: float | None = None
+
+    def to_dict(self) -> typing.Dict[str, str | int]:
+        item: typing.Dict[str, str | int] = {"username": self.username}
+        if self.key is not None:
+            item["key"] = self.key
+        if self.days is not None:
+            item[DAYS_FIELDS[self.kind]] = self.days
+        return item
+
+
+DAYS_FIELDS = {INACTIVITY: "inactivity_time", AGE: "age", REMINDER: "days_left"}
+
+Check = typing.Callable[[int, float], Finding | None]
+Deadline = typing.Callable[[int, float], float]
+
+
+def load_rules(path: str) -> list[Rule]:
+    """Read rules from a json list of objects with the fields of Rule"""
+    with open(path) as file:
+        return [Rule(**dict(rule, schedule=tuple(rule.get("schedule", ())))) for rule in json.load(file)]
+
+
+def _days(now: float, timestamp: float) -> int:
+    return int((now - timestamp) // 86400)
+
+
+def _compile(rule: Rule, credential: Credential, table: CredentialReportTable) -> Check:
+    """Return the check of rule for credential, reading the columns of table directly"""
+    columns = table.columns
+    users = columns["user"]
+    password = columns["password_enabled"]
+    active = columns[credential.active]
+    last_used = columns[credential.last_used]
+    last_rotated = columns[credential.last_rotated]
+    isnan = math.isnan
+
+    def finding(index: int, days: int = None) -> Finding:
+        rotated = None if credential.key is None or isnan(last_rotated[index]) else last_rotated[index]
+        return Finding(rule.name, rule.kind, users[index], credential.name, credential.key, days, rotated)
+
+    if rule.users == CONSOLE_USERS:
+        def applies(index: int) -> bool:
+            return active[index] == 1 and password[index] == 1
+    elif rule.users == PROGRAMMATIC_USERS:
+        def applies(index: int) -> bool:
+            return active[index] == 1 and password[index] != 1
+    else:
+        def applies(index: int) -> bool:
+            return active[index] == 1
+
+    if rule.kind == INACTIVITY:
+        def check(index: int, now: float) -> Finding | None:
+            if applies(index) and not isnan(last_used[index]):
+                days = _days(now, last_used[index])
+                if days >= rule.days:
+                    return finding(index, days)
+            return None
+    elif rule.kind == NEVER_USED:
+        def check(index: int, now: float) -> Finding | None:
+            return finding(index) if applies(index) and isnan(last_used[index]) else None
+    elif rule.kind == AGE:
+        def check(index: int, now: float) -> Finding | None:
+            if applies(index) and not isnan(last_rotated[index]):
+                days = _days(now, last_rotated[index])
+                if days >= rule.days:
+                    return finding(index, days)
+            return None
+    elif rule.kind == REMINDER:
+        schedule = frozenset(rule.schedule)
+
+        def check(index: int, now: float) -> Finding | None:
+            if applies(index) and not isnan(last_rotated[index]):
+                days_left = rule.days - _days(now, last_rotated[index])
+                if days_left in schedule:
+                    return finding(index, days_left)
+            return None
+    elif rule.kind == MFA_MISSING:
+        mfa = columns["mfa_active"]
+
+        def check(index: int, now: float) -> Finding | None:
+            return finding(index) if applies(index) and mfa[index] != 1 else None
+    elif rule.kind == NO_CREDENTIALS:
+        keys = [columns[key.active] for key in CREDENTIALS["access_key"]]
+
+        def check(index: int, now: float) -> Finding | None:
+            if password[index] != 1 and all(key[index] != 1 for key in keys) and users[index] != ROOT_USER:
+                return finding(index)
+            return None
+    else:
+        raise ValueError(f"Unknown kind {rule.kind} of rule {rule.name}")
+
+    return check
+
+
+def _compile_deadline(rule: Rule, credential: Credential, table: CredentialReportTable) -> Deadline:
+    """Return the function giving the next time the check of rule for credential may change without the report row
+    changing, infinity if only a change of the row can change it"""
+    last_used = table.columns[credential.last_used]
+    last_rotated = table.columns[credential.last_rotated]
+
+    if rule.kind in (INACTIVITY, AGE):
+        column = last_used if rule.kind == INACTIVITY else last_rotated
+
+        def deadline(index: int, now: float) -> float:
+            crossing = column[index] + rule.days * 86400
+            return crossing if crossing > now else math.inf
+    elif rule.kind == REMINDER:
+        # a reminder holds for the day its days_left is in the schedule, it changes at the start and end of that day
+        offsets = sorted({(rule.days - days_left + end) * 86400 for days_left in rule.schedule for end in (0, 1)})
+
+        def deadline(index: int, now: float) -> float:
+            return next((last_rotated[index] + offset for offset in offsets if last_rotated[index] + offset > now),
+                        math.inf)
+    else:
+        def deadline(index: int, now: float) -> float:
+            return math.inf
+
+    # NaN timestamps (never used or rotated) never compare greater than now and give no deadline
+    return deadline
+
+
+def evaluate(rules: list[Rule], table: CredentialReportTable, now: float,
+             indexes: typing.Iterable[int] = None) -> list[Finding]:
+    """Evaluate all rules against all users of table in a single pass, in the order of the rules for each user
+
+    Arguments:
+        indexes: only evaluate the users at these indexes of table, all of them if None
+    """
+    checks = [_compile(rule, credential, table) for rule in rules for credential in CREDENTIALS[rule.credential]]
+    findings = []
+    for index in range(len(table)) if indexes is None else indexes:
+        for check in checks:
+            result = check(index, now)
+            if result is not None:
+                findings.append(result)
+    return findings
+
+
+def next_changes(rules: list[Rule], table: CredentialReportTable, now: float,
+                 indexes: typing.Iterable[int]) -> typing.Dict[int, float]:
+    """Return for each index of table the next time one of rules may give another result for an unchanged row"""
+    deadlines = [_compile_deadline(rule, credential, table)
+                 for rule in rules for credential in CREDENTIALS[rule.credential]]
+    return {index: min((deadline(index, now) for deadline in deadlines), default=math.inf) for index in indexes}
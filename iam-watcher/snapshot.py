@@ -0,0 +1,150 @@
+import hashlib
+import math
+import time
+import typing
+from report_parser import BOOLEAN_COLUMNS, TIMESTAMP_COLUMNS, CredentialReportTable
+from rules import Rule, next_changes
+
+# DynamoDB batch limits
+MAX_BATCH_GET_KEYS: int = 100
+MAX_BATCH_WRITE_ITEMS: int = 25
+# unprocessed keys and items are retried with an exponential backoff
+MAX_ATTEMPTS: int = 8
+BASE_DELAY: float = 0.05
+MAX_DELAY: float = 5.0
+
+
+class UnprocessedItemsError(Exception):
+    """DynamoDB left keys or items unprocessed after all attempts"""
+
+
+class UserState(typing.NamedTuple):
+    """Last evaluation of a user: digest of its report row and rules, time its findings may change for the same row
+    """
+    digest: str
+    next_check: float
+
+
+def _update_digest(digest, table: CredentialReportTable, index: int):
+    # the typed fields of a user, any change of them may change its findings. NaN timestamps are equal in their repr
+    values = [table.columns[name][index] for name in TIMESTAMP_COLUMNS + BOOLEAN_COLUMNS if name in table.columns]
+    digest.update(repr(values).encode("utf-8"))
+
+
+def _backoff(attempt: int):
+    time.sleep(min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+
+
+def create_table(dynamo_client, table_name: str):
+    """Create a table keyed by account (hash) and username (range) on demand capacity, e.g. on DynamoDB Local,
+    nothing if it exists"""
+    try:
+        dynamo_client.create_table(
+            TableName=table_name,
+            KeySchema=[{"AttributeName": "account", "KeyType": "HASH"},
+                       {"AttributeName": "username", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "account", "AttributeType": "S"},
+                                  {"AttributeName": "username", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST")
+    except dynamo_client.exceptions.ResourceInUseException:
+        return
+    dynamo_client.get_waiter("table_exists").wait(TableName=table_name)
+
+
+def batch_get_users(dynamo_client, table_name: str, account: str, usernames: list[str],
+                    attributes: list[str]) -> typing.Dict[str, dict]:
+    """Return the attributes of the items of the users of account found in a table created by create_table, with
+    BatchGetItem by MAX_BATCH_GET_KEYS"""
+    items = {}
+    # attribute names are aliased, they could be DynamoDB reserved words
+    names = {f"#a{index}": name for index, name in enumerate(["username", *attributes])}
+    for start in range(0, len(usernames), MAX_BATCH_GET_KEYS):
+        keys = [{"account": {"S": account}, "username": {"S": username}}
+                for username in usernames[start:start + MAX_BATCH_GET_KEYS]]
+        request = {table_name: {"Keys": keys, "ProjectionExpression": ", ".join(names),
+                                "ExpressionAttributeNames": names}}
+        for attempt in range(MAX_ATTEMPTS):
+            response = dynamo_client.batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(table_name, []):
+                items[item["username"]["S"]] = item
+            request = response.get("UnprocessedKeys")
+            if not request:
+                break
+            _backoff(attempt)
+        else:
+            raise UnprocessedItemsError(f"{len(request[table_name]['Keys'])} keys of {table_name} "
+                                        f"not read after {MAX_ATTEMPTS} attempts")
+    return items
+
+
+def batch_put_users(dynamo_client, table_name: str, account: str, items: typing.Dict[str, dict]):
+    """Write the items (attributes by username) of the users of account to a table created by create_table, with
+    BatchWriteItem by MAX_BATCH_WRITE_ITEMS"""
+    requests = [{"PutRequest": {"Item": {"account": {"S": account}, "username": {"S": username}, **attributes}}}
+                for username, attributes in items.items()]
+    for start in range(0, len(requests), MAX_BATCH_WRITE_ITEMS):
+        request = {table_name: requests[start:start + MAX_BATCH_WRITE_ITEMS]}
+        for attempt in range(MAX_ATTEMPTS):
+            request = dynamo_client.batch_write_item(RequestItems=request).get("UnprocessedItems")
+            if not request:
+                break
+            _backoff(attempt)
+        else:
+            raise UnprocessedItemsError(f"{len(request[table_name])} items of {table_name} "
+                                        f"not written after {MAX_ATTEMPTS} attempts")
+
+
+class SnapshotStore:
+    """Keep the last evaluation of each user in a DynamoDB table, keyed by account (hash) and username (range)
+
+    Arguments:
+        dynamo_client: DynamoDB client, e.g. created with an endpoint_url to DynamoDB Local
+        table_name: name of the table, see create_table
+    """
+
+    def __init__(self, dynamo_client, table_name: str):
+        self.dynamo_client = dynamo_client
+        self.table_name = table_name
+
+    def create_table(self):
+        create_table(self.dynamo_client, self.table_name)
+
+    def load(self, account: str, usernames: list[str]) -> typing.Dict[str, UserState]:
+        """Return the state of the users of account found in the table"""
+        items = batch_get_users(self.dynamo_client, self.table_name, account, usernames, ["digest", "next_check"])
+        return {username: UserState(item["digest"]["S"], float(item["next_check"]["N"]))
+                for username, item in items.items()}
+
+    def save(self, account: str, states: typing.Dict[str, UserState]):
+        """Write the state of the users of account"""
+        batch_put_users(self.dynamo_client, self.table_name, account, {username: {
+            "digest": {"S": state.digest},
+            # DynamoDB numbers have no infinity, users without deadline are checked again on changes only
+            "next_check": {"N": repr(state.next_check) if math.isfinite(state.next_check) else "-1"},
+        } for username, state in states.items()})
+
+
+def changed_users(store: SnapshotStore, account: str, table: CredentialReportTable, rules: list[Rule],
+                  now: float) -> tuple[list[int], typing.Dict[str, UserState]]:
+    """Compare the users of table with their last evaluation
+
+    Returns:
+        the indexes of the users to evaluate: new, changed, or whose next_check is past, and their new states to save
+        once they are evaluated
+    """
+    users = table.columns["user"]
+    previous = store.load(account, list(users))
+    # a change of the rules changes every digest, the rules are hashed once and each row on a copy
+    rules_digest = hashlib.blake2b(repr(rules).encode("utf-8"), digest_size=16)
+    digests = {}
+    indexes = []
+    for index, username in enumerate(users):
+        row = rules_digest.copy()
+        _update_digest(row, table, index)
+        digest = row.hexdigest()
+        state = previous.get(username)
+        if state is None or state.digest != digest or 0 <= state.next_check <= now:
+            indexes.append(index)
+            digests[index] = digest
+    next_checks = next_changes(rules, table, now, indexes)
+    return indexes, {users[index]: UserState(digests[index], next_checks[index]) for index in indexes}
@@ -0,0 +1,113 @@
+import time
+from botocore.exceptions import EndpointConnectionError
+from log_sink import EVENT_OVERHEAD_BYTES, MAX_BATCH_BYTES, MAX_BATCH_EVENTS, MAX_BATCH_SPAN_MS, CloudWatchLogSink
+from testing.fake_iam import client_error
+
+HOUR_MS = 3600 * 1000
+
+
+class FakeLogs:
+    """CloudWatch Logs client checking the put_log_events limits, errors are raised by the next puts in order"""
+
+    def __init__(self, groups: tuple[str, ...] = ()):
+        self.streams: dict[str, dict[str, list[dict]]] = {group: {} for group in groups}
+        self.batches: list[list[dict]] = []
+        self.errors: list[Exception] = []
+
+    def create_log_group(self, logGroupName: str):
+        if logGroupName in self.streams:
+            raise client_error("ResourceAlreadyExistsException", "CreateLogGroup")
+        self.streams[logGroupName] = {}
+
+    def create_log_stream(self, logGroupName: str, logStreamName: str):
+        if logStreamName in self.streams[logGroupName]:
+            raise client_error("ResourceAlreadyExistsException", "CreateLogStream")
+        self.streams[logGroupName][logStreamName] = []
+
+    def put_log_events(self, logGroupName: str, logStreamName: str, logEvents: list[dict]):
+        if self.errors:
+            raise self.errors.pop(0)
+        if logStreamName not in self.streams.get(logGroupName, {}):
+            raise client_error("ResourceNotFoundException", "PutLogEvents")
+        timestamps = [event["timestamp"] for event in logEvents]
+        assert len(logEvents) <= MAX_BATCH_EVENTS
+        assert sum(len(event["message"].encode("utf-8")) + EVENT_OVERHEAD_BYTES for event in logEvents) \
+            <= MAX_BATCH_BYTES
+        assert timestamps == sorted(timestamps) and timestamps[-1] - timestamps[0] < MAX_BATCH_SPAN_MS
+        self.batches.append(logEvents)
+        self.streams[logGroupName][logStreamName] += logEvents
+
+    def messages(self, group: str, stream: str) -> list[str]:
+        return [event["message"] for event in self.streams[group][stream]]
+
+
+def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_streams_are_flushed_by_batches_on_size_and_close():
+    logs = FakeLogs(groups=("iam-watcher",))
+    sink = CloudWatchLogSink(logs, "iam-watcher", flush_interval=0, max_batch_events=10)
+    for index in range(25):
+        sink.log("user", f"event {index}", timestamp=1000 + index)
+    sink.log("key", "key event", timestamp=1000)
+    assert [len(batch) for batch in logs.batches] == [10, 10]
+    sink.close()
+    assert [len(batch) for batch in logs.batches] == [10, 10, 5, 1] and sink.put_calls == 4
+    assert logs.messages("iam-watcher", "user") == [f"event {index}" for index in range(25)]
+
+
+def test_batches_respect_the_put_log_events_limits():
+    logs = FakeLogs(groups=("iam-watcher",))
+    sink = CloudWatchLogSink(logs, "iam-watcher", flush_interval=0)
+    # small events over the count limit, then events over the size limit of an event, truncated, filling the batches
+    for index in range(12000):
+        sink.log("user", "x", timestamp=index)
+    for index in range(6):
+        sink.log("user", "é" * 200000, timestamp=12000 + index)
+    # events of more than 24 hours, logged out of order
+    for hours in (30, 0, 25):
+        sink.log("key", f"{hours}h", timestamp=hours * HOUR_MS)
+    sink.close()
+    assert [len(batch) for batch in logs.batches] == [10000, 2003, 1, 2, 1, 2]
+    assert len(logs.messages("iam-watcher", "user")) == 12006
+    assert max(len(message.encode("utf-8")) for message in logs.messages("iam-watcher", "user")) \
+        == MAX_BATCH_BYTES // 4 - EVENT_OVERHEAD_BYTES
+    assert logs.messages("iam-watcher", "key") == ["0h", "25h", "30h"]
+
+
+def test_missing_group_and_streams_are_created_on_first_flush():
+    logs = FakeLogs()
+    sink = CloudWatchLogSink(logs, "iam-watcher", flush_interval=0)
+    sink.log("user", "first")
+    sink.log("key", "second")
+    sink.close()
+    assert {stream: logs.messages("iam-watcher", stream) for stream in ("user", "key")} == {
+        "user": ["first"], "key": ["second"]}
+
+
+def test_periodic_flush_survives_errors(capsys):
+    logs = FakeLogs(groups=("iam-watcher",))
+    logs.create_log_stream("iam-watcher", "user")
+    logs.errors = [EndpointConnectionError(endpoint_url="http://localhost:4566")]
+    sink = CloudWatchLogSink(logs, "iam-watcher", flush_interval=0.01)
+    sink.log("user", "lost")
+    wait_for(lambda: "1 log events lost" in capsys.readouterr().out)
+
+    # an error out of the calls, the flush is done by the next period
+    flush = sink.flush
+    failures = [RuntimeError("unexpected")]
+
+    def failing_flush(stream: str = None):
+        if failures:
+            raise failures.pop()
+        flush(stream)
+    sink.flush = failing_flush
+    sink.log("user", "sent")
+    wait_for(lambda: logs.messages("iam-watcher", "user") == ["sent"])
+    assert not failures and sink._thread.is_alive()
+    sink.close()
+    assert "Periodic flush failed -> RuntimeError('unexpected')" in capsys.readouterr().out
@@ -0,0 +1,114 @@
+from remediation import (DELETE_KEY, DELETE_USER, DISABLE_CONSOLE, DONE, DRY_RUN, FAILED, SKIPPED, Remediation,
+                         Remediator)
+from rules import ROOT_USER
+from testing.fake_iam import FakeIAM
+
+
+def remediate(iam: FakeIAM, *remediations: Remediation, **options):
+    options.setdefault("dry_run", False)
+    return Remediator(rate=1000, **options).remediate(iam, list(remediations))
+
+
+def statuses(outcomes) -> list[tuple[str, str]]:
+    return [(outcome.action.operation, outcome.status) for outcome in outcomes]
+
+
+def test_delete_key_of_the_report_rotation_date():
+    iam = FakeIAM()
+    iam.add_user("bob")
+    old, new = iam.add_key("bob"), iam.add_key("bob")
+    outcomes = remediate(iam, Remediation("bob", DELETE_KEY, "2", "expired_key", new["CreateDate"].timestamp()))
+    assert statuses(outcomes) == [(DELETE_KEY, DONE)]
+    assert iam.users["bob"]["keys"] == [old]
+
+
+def test_delete_key_skipped_when_rotated_since_the_report():
+    iam = FakeIAM()
+    iam.add_user("bob")
+    reported = iam.add_key("bob")["CreateDate"].timestamp()
+    # the reported key was rotated: deleted and replaced by a new active key
+    iam.users["bob"]["keys"] = []
+    iam.add_key("bob")
+    outcomes = remediate(iam, Remediation("bob", DELETE_KEY, "1", "expired_key", reported),
+                         Remediation("bob", DELETE_KEY, "2", "never_used_key", None))
+    assert statuses(outcomes) == [(DELETE_KEY, SKIPPED), (DELETE_KEY, SKIPPED)]
+    assert len(iam.users["bob"]["keys"]) == 1
+    assert iam.mutating_operations() == []
+
+
+def test_disable_console_and_delete_key():
+    iam = FakeIAM()
+    key = iam.add_user("bob", password=True, keys=("Active",))["keys"][0]
+    outcomes = remediate(iam, Remediation("bob", DISABLE_CONSOLE, None, "expired_password"),
+                         Remediation("bob", DELETE_KEY, "1", "expired_key", key["CreateDate"].timestamp()))
+    assert statuses(outcomes) == [("delete_login_profile", DONE), (DELETE_KEY, DONE)]
+    assert not iam.users["bob"]["password"] and not iam.users["bob"]["keys"]
+
+
+def test_delete_user_removes_everything_attached_first():
+    iam = FakeIAM()
+    iam.add_user("bob", keys=("Inactive",), groups=("devs",), policies=("arn:aws:iam::aws:policy/ReadOnlyAccess",))
+    iam.users["bob"]["mfa"].append("arn:aws:iam::123456789012:mfa/bob")
+    iam.users["bob"]["inline"].append("inline")
+    outcomes = remediate(iam, Remediation("bob", DELETE_USER, None, "no_credentials_user"))
+    assert statuses(outcomes) == [(DELETE_KEY, DONE), ("deactivate_mfa_device", DONE), ("delete_user_policy", DONE),
+                                  ("detach_user_policy", DONE), ("remove_user_from_group", DONE),
+                                  (DELETE_USER, DONE)]
+    assert "bob" not in iam.users
+
+
+def test_delete_user_skipped_when_credentials_came_back():
+    iam = FakeIAM()
+    iam.add_user("console", password=True)
+    iam.add_user("api", keys=("Inactive", "Active"))
+    outcomes = remediate(iam, Remediation("console", DELETE_USER, None, "no_credentials_user"),
+                         Remediation("api", DELETE_USER, None, "no_credentials_user"))
+    assert sorted((outcome.action.username, outcome.status, outcome.detail) for outcome in outcomes) == [
+        ("api", SKIPPED, "has an active access key"), ("console", SKIPPED, "has a password")]
+    assert set(iam.users) == {"console", "api"} and len(iam.users["api"]["keys"]) == 2
+    assert iam.mutating_operations() == []
+
+
+def test_root_user_is_never_remediated():
+    iam = FakeIAM()
+    assert remediate(iam, Remediation(ROOT_USER, DELETE_USER, None, "no_credentials_user")) == []
+    assert iam.calls == []
+
+
+def test_dry_run_only_lists():
+    iam = FakeIAM()
+    iam.add_user("bob", password=True)
+    outcomes = remediate(iam, Remediation("bob", DISABLE_CONSOLE, None, "expired_password"), dry_run=True)
+    assert statuses(outcomes) == [("delete_login_profile", DRY_RUN)]
+    assert iam.mutating_operations() == []
+
+
+def test_failure_skips_the_rest_of_the_user_plan():
+    iam = FakeIAM()
+    iam.add_user("bob", keys=("Inactive",))
+    iam.errors[DELETE_KEY] = ["AccessDenied"]
+    outcomes = remediate(iam, Remediation("bob", DELETE_USER, None, "no_credentials_user"))
+    assert statuses(outcomes) == [(DELETE_KEY, FAILED), (DELETE_USER, SKIPPED)]
+    assert "bob" in iam.users
+
+
+def test_throttled_calls_are_retried_and_missing_entities_are_done():
+    iam = FakeIAM()
+    iam.add_user("bob", password=True)
+    iam.errors["delete_login_profile"] = ["Throttling", "NoSuchEntity"]
+    outcomes = remediate(iam, Remediation("bob", DISABLE_CONSOLE, None, "expired_password"))
+    assert [(outcome.status, outcome.detail) for outcome in outcomes] == [(DONE, "already done")]
+    assert iam.operations().count("delete_login_profile") == 2
+
+
+def test_plans_over_max_actions_are_skipped_as_a_whole():
+    iam = FakeIAM()
+    for name in ("alice", "bob", "carol"):
+        iam.add_user(name, password=True)
+    remediator = Remediator(dry_run=False, max_actions=2, rate=1000, max_workers=1)
+    outcomes = remediator.remediate(iam, [Remediation(name, DISABLE_CONSOLE, None, "expired_password")
+                                          for name in ("alice", "bob", "carol")])
+    assert [outcome.status for outcome in outcomes] == [DONE, DONE, SKIPPED]
+    # the cap is shared by the next calls
+    assert statuses(remediator.remediate(iam, [Remediation("carol", DISABLE_CONSOLE, None, "expired_password")])) \
+        == [("delete_login_profile", SKIPPED)]
@@ -0,0 +1,104 @@
+import json
+from datetime import datetime, timezone
+import pytest
+import main
+import reminders
+from reminders import MAX_DESTINATIONS, Reminder, ReminderSender, SentLog
+from testing.fake_dynamodb import FakeDynamoDB
+from testing.fake_iam import FakeIAM, client_error
+
+NOW = datetime(2026, 6, 1, 12, tzinfo=timezone.utc).timestamp()
+DAY = 86400
+
+
+class FakeSES:
+    """SES client of the templated bulk sends, the destinations in failing are answered with a Failed status"""
+
+    def __init__(self, failing: tuple[str, ...] = ()):
+        self.templates = {}
+        self.failing = set(failing)
+        self.sends: list[dict] = []
+        # error codes raised by the next sends, in order
+        self.errors: list[str] = []
+
+    def get_template(self, TemplateName: str):
+        if TemplateName not in self.templates:
+            raise client_error("TemplateDoesNotExist", "GetTemplate")
+        return {"Template": self.templates[TemplateName]}
+
+    def create_template(self, Template: dict):
+        self.templates[Template["TemplateName"]] = Template
+
+    def get_send_quota(self):
+        return {"MaxSendRate": 1000.0}
+
+    def send_bulk_templated_email(self, **params):
+        if self.errors:
+            raise client_error(self.errors.pop(0), "SendBulkTemplatedEmail")
+        self.sends.append(params)
+        return {"Status": [{"Status": "Failed" if destination["Destination"]["ToAddresses"][0] in self.failing
+                            else "Success"} for destination in params["Destinations"]]}
+
+    def recipients(self) -> list[str]:
+        return [destination["Destination"]["ToAddresses"][0]
+                for params in self.sends for destination in params["Destinations"]]
+
+
+def account_users(count: int, without_email: tuple[str, ...] = ()) -> FakeIAM:
+    iam = FakeIAM()
+    for index in range(count):
+        name = f"user{index}"
+        iam.add_user(name, password=True, tags=None if name in without_email else {"email": f"{name}@example.com"})
+    return iam
+
+
+def test_reminders_are_sent_by_bulk_sends_of_50():
+    iam, ses = account_users(120), FakeSES()
+    report = ReminderSender(ses, "watcher@example.com").send(
+        iam, [Reminder(f"user{index}", key_days_left=7) for index in range(120)], account="123456789012", now=NOW)
+    assert len(report.sent) == 120 and not report.failed
+    assert [len(params["Destinations"]) for params in ses.sends] == [MAX_DESTINATIONS, MAX_DESTINATIONS, 20]
+    assert list(ses.templates) == ["iam-watcher-reminder"]
+    # emails of many users are read from the authorization details, not user by user
+    assert "list_user_tags" not in iam.operations()
+    assert json.loads(ses.sends[0]["Destinations"][0]["ReplacementTemplateData"]) == {
+        "username": "user0", "account": "123456789012", "days_left": 7, "password_days_left": None,
+        "key_days_left": "7"}
+
+
+def test_users_are_reminded_once_a_day_across_runs():
+    iam, ses, dynamo = account_users(3), FakeSES(), FakeDynamoDB()
+    due = [Reminder("user0", password_days_left=7), Reminder("user1", password_days_left=1, key_days_left=0)]
+    first = ReminderSender(ses, "watcher@example.com", sent_log=SentLog(dynamo, "reminders")).send(iam, due, now=NOW)
+    assert first.sent == ["user0", "user1"]
+    assert {item["username"]["S"]: item["sent_day"]["S"] for item in dynamo.items("reminders")} == {
+        "user0": "2026-06-01", "user1": "2026-06-01"}
+
+    # another invocation of the same day, then of the next day
+    second = ReminderSender(ses, "watcher@example.com", sent_log=SentLog(dynamo, "reminders"))
+    report = second.send(iam, due + [Reminder("user2", key_days_left=28)], now=NOW + 3600)
+    assert report.sent == ["user2"] and report.duplicate == ["user0", "user1"]
+    assert second.send(iam, due, now=NOW + DAY).sent == ["user0", "user1"]
+    assert ses.recipients() == ["user0@example.com", "user1@example.com", "user2@example.com", "user0@example.com",
+                                "user1@example.com"]
+
+
+def test_users_without_email_failed_and_throttled_sends(monkeypatch):
+    monkeypatch.setattr(reminders, "BASE_DELAY", 0)
+    iam, ses = account_users(3, without_email=("user1",)), FakeSES(failing=("user2@example.com",))
+    ses.errors = ["Throttling"]
+    sender = ReminderSender(ses, "watcher@example.com", max_rate=100)
+    report = sender.send(iam, [Reminder(f"user{index}", password_days_left=7) for index in range(3)], now=NOW)
+    assert report.counts() == {"sent": 1, "duplicate": 0, "no_email": 1, "failed": 1}
+    assert report.no_email == ["user1"] and report.failed == ["user2"]
+    # a failed reminder is not recorded as sent, it is sent again by the next run of the day
+    assert sender.send(iam, [Reminder("user2", password_days_left=7)], now=NOW).failed == ["user2"]
+
+
+def test_reminder_table_is_not_the_snapshot_table(monkeypatch):
+    monkeypatch.setattr(main, "SEND_REMINDERS", True)
+    monkeypatch.setattr(main, "REMEDIATION", None)
+    monkeypatch.setattr(main, "REMINDER_TABLE", "iam-watcher")
+    monkeypatch.setattr(main, "SNAPSHOT_TABLE", "iam-watcher")
+    with pytest.raises(ValueError, match="another table"):
+        main.lambda_handler()
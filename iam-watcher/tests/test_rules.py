@@ -0,0 +1,121 @@
+import random
+from datetime import datetime, timedelta, timezone
+import pytest
+from main import GRACE_PERIOD, MAX_AKSK_AGE, MAX_PASSWORD_AGE, RULES
+from report_parser import parse_credential_report
+from rules import ROOT_USER, evaluate
+
+HEADER = ("user,arn,user_creation_time,password_enabled,password_last_used,password_last_changed,"
+          "password_next_rotation,mfa_active,access_key_1_active,access_key_1_last_rotated,"
+          "access_key_1_last_used_date,access_key_1_last_used_region,access_key_1_last_used_service,"
+          "access_key_2_active,access_key_2_last_rotated,access_key_2_last_used_date,access_key_2_last_used_region,"
+          "access_key_2_last_used_service,cert_1_active,cert_1_last_rotated,cert_2_active,cert_2_last_rotated")
+NOW = datetime(2026, 6, 1, 12, tzinfo=timezone.utc)
+
+
+def timestamp(days_ago: float | None) -> str:
+    if days_ago is None:
+        return "N/A"
+    return (NOW - timedelta(days=days_ago)).isoformat(timespec="seconds")
+
+
+def row(user: str, password: bool = False, password_used: float = None, password_changed: float = None,
+        mfa: bool = False, keys: tuple[tuple[bool, float | None, float | None], ...] = ()) -> str:
+    """Report line of a user, keys as (active, days since rotation, days since last use)"""
+    fields = [user, f"arn:aws:iam::123456789012:user/{user}", timestamp(400), str(password).lower(),
+              timestamp(password_used) if password else "N/A", timestamp(password_changed) if password else "N/A",
+              "N/A", str(mfa).lower()]
+    for active, rotated, used in list(keys) + [(False, None, None)] * (2 - len(keys)):
+        fields += [str(active).lower(), timestamp(rotated), timestamp(used), "us-east-1" if used else "N/A",
+                   "s3" if used else "N/A"]
+    fields += ["false", "N/A", "false", "N/A"]
+    return ",".join(fields)
+
+
+def findings_of(*rows: str) -> dict[str, list[dict]]:
+    table = parse_credential_report("\n".join((HEADER,) + rows).encode())
+    findings: dict[str, list[dict]] = {rule.name: [] for rule in RULES}
+    for finding in evaluate(RULES, table, NOW.timestamp()):
+        findings[finding.rule].append(finding.to_dict())
+    return findings
+
+
+def legacy_findings(users: list[dict]) -> dict[str, list[dict]]:
+    """Findings of the four categories of the former lambda_handler, from the same users"""
+    findings = {"inactive_past_90_days_user": [], "never_logged_in_user": [], "inactive_past_90_days_key": [],
+                "never_used_key": []}
+    for user in users:
+        if user["password"]:
+            if user["password_used"] is not None:
+                delta = (NOW - (NOW - timedelta(days=user["password_used"])).replace(microsecond=0)).days
+                if delta >= 90:
+                    findings["inactive_past_90_days_user"].append({"username": user["user"], "inactivity_time": delta})
+            else:
+                findings["never_logged_in_user"].append({"username": user["user"]})
+        else:
+            for key, (active, _, used) in enumerate(user["keys"], start=1):
+                if not active:
+                    continue
+                if used is None:
+                    findings["never_used_key"].append({"username": user["user"], "key": str(key)})
+                    continue
+                delta = (NOW - (NOW - timedelta(days=used)).replace(microsecond=0)).days
+                if delta >= 90:
+                    findings["inactive_past_90_days_key"].append({"username": user["user"], "key": str(key),
+                                                                  "inactivity_time": delta})
+    return findings
+
+
+def test_rules_match_the_legacy_thresholds():
+    generator = random.Random(7)
+
+    def days() -> float | None:
+        # around the 90 days threshold, fractions of days included, or never
+        return generator.choice([None, generator.uniform(0, 200), generator.choice([89, 89.99, 90, 90.01, 91])])
+
+    users = []
+    for index in range(500):
+        password = generator.random() < 0.5
+        users.append({"user": f"user{index}", "password": password, "password_used": days(),
+                      "keys": [(generator.random() < 0.7, generator.uniform(0, 200), days())
+                               for _ in range(generator.randint(0, 2))]})
+    findings = findings_of(*(row(user["user"], user["password"], user["password_used"], 10, keys=tuple(user["keys"]))
+                             for user in users))
+    for name, expected in legacy_findings(users).items():
+        assert findings[name] == expected, name
+
+
+@pytest.mark.parametrize("used, expected", [(89.9, []), (90, [{"username": "alice", "inactivity_time": 90}])])
+def test_password_inactivity_threshold(used, expected):
+    assert findings_of(row("alice", password=True, password_used=used, password_changed=10))[
+        "inactive_past_90_days_user"] == expected
+
+
+def test_keys_of_console_users_are_left_to_the_password_rules():
+    findings = findings_of(row("alice", password=True, password_used=1, password_changed=1, mfa=True,
+                               keys=((True, 300, None), (True, 300, 200))))
+    assert findings["never_used_key"] == findings["inactive_past_90_days_key"] == []
+    assert findings["expired_key"] == [{"username": "alice", "key": "1", "age": 300},
+                                       {"username": "alice", "key": "2", "age": 300}]
+
+
+def test_expiration_and_reminders():
+    expired = MAX_PASSWORD_AGE + GRACE_PERIOD
+    findings = findings_of(row("old", password=True, password_used=1, password_changed=expired, mfa=True),
+                           row("soon", password=True, password_used=1, password_changed=MAX_PASSWORD_AGE - 7,
+                               mfa=True),
+                           row("key", keys=((True, MAX_AKSK_AGE - 28, 1),)))
+    assert findings["expired_password"] == [{"username": "old", "age": expired}]
+    assert findings["password_rotation_reminder"] == [{"username": "soon", "days_left": 7}]
+    assert findings["key_rotation_reminder"] == [{"username": "key", "key": "1", "days_left": 28}]
+
+
+def test_users_without_credentials_except_root():
+    findings = findings_of(row(ROOT_USER), row("empty", keys=((False, 10, 5),)), row("api", keys=((True, 10, 5),)))
+    assert findings["no_credentials_user"] == [{"username": "empty"}]
+
+
+def test_findings_carry_the_rotation_of_their_key():
+    table = parse_credential_report("\n".join((HEADER, row("bob", keys=((True, 300, None),)))).encode())
+    finding = next(finding for finding in evaluate(RULES, table, NOW.timestamp()) if finding.rule == "expired_key")
+    assert finding.last_rotated == (NOW - timedelta(days=300)).timestamp()
@@ -0,0 +1,87 @@
+import math
+import pytest
+import snapshot
+from main import MAX_PASSWORD_AGE, REMINDER_SCHEDULE, RULES
+from report_parser import parse_credential_report
+from snapshot import (MAX_ATTEMPTS, MAX_BATCH_GET_KEYS, MAX_BATCH_WRITE_ITEMS, SnapshotStore, UnprocessedItemsError,
+                      UserState, changed_users)
+from test_rules import HEADER, NOW, row
+from testing.fake_dynamodb import FakeDynamoDB
+
+DAY = 86400
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(snapshot, "BASE_DELAY", 0)
+
+
+def states(count: int) -> dict[str, UserState]:
+    return {f"user{index}": UserState(f"digest{index}", NOW.timestamp() + index) for index in range(count)}
+
+
+def batch_sizes(dynamo: FakeDynamoDB, operation: str) -> list[int]:
+    """Keys or items of each call of operation to the snapshots table"""
+    return [len(params["snapshots"]["Keys"] if operation == "batch_get_item" else params["snapshots"])
+            for name, params in dynamo.calls if name == operation]
+
+
+def test_states_are_written_and_read_by_batches():
+    dynamo = FakeDynamoDB()
+    store = SnapshotStore(dynamo, "snapshots")
+    saved = {**states(60), "console": UserState("digest", math.inf)}
+    store.save("123456789012", saved)
+    assert batch_sizes(dynamo, "batch_write_item") == [MAX_BATCH_WRITE_ITEMS, MAX_BATCH_WRITE_ITEMS, 11]
+
+    usernames = [f"user{index}" for index in range(250)] + ["console"]
+    loaded = store.load("123456789012", usernames)
+    assert batch_sizes(dynamo, "batch_get_item") == [MAX_BATCH_GET_KEYS, MAX_BATCH_GET_KEYS, 51]
+    # users without deadline are stored with -1, DynamoDB numbers have no infinity
+    assert loaded == {**states(60), "console": UserState("digest", -1.0)}
+    assert store.load("210987654321", usernames) == {}
+
+
+def test_unprocessed_keys_and_items_are_retried():
+    dynamo = FakeDynamoDB()
+    store = SnapshotStore(dynamo, "snapshots")
+    # the first call of each batch leaves part of it unprocessed, as a throttled table
+    dynamo.unprocessed = [20, 0, 5, 0]
+    store.save("123456789012", states(30))
+    assert batch_sizes(dynamo, "batch_write_item") == [25, 20, 5, 5]
+
+    dynamo.unprocessed = [30, 10, 0]
+    assert store.load("123456789012", [f"user{index}" for index in range(30)]) == states(30)
+    assert batch_sizes(dynamo, "batch_get_item") == [30, 30, 10]
+
+
+def test_keys_and_items_still_unprocessed_raise():
+    dynamo = FakeDynamoDB()
+    store = SnapshotStore(dynamo, "snapshots")
+    dynamo.unprocessed = [1] * MAX_ATTEMPTS
+    with pytest.raises(UnprocessedItemsError, match="1 items of snapshots not written after 8 attempts"):
+        store.save("123456789012", states(3))
+    dynamo.unprocessed = [1] * MAX_ATTEMPTS
+    with pytest.raises(UnprocessedItemsError, match="1 keys of snapshots not read"):
+        store.load("123456789012", ["user0"])
+
+
+def test_only_changed_users_are_evaluated_again():
+    store = SnapshotStore(FakeDynamoDB(), "snapshots")
+    rows = {"alice": row("alice", password=True, password_used=1, password_changed=10, mfa=True),
+            "bob": row("bob", keys=((True, 10, 1),)),
+            "carol": row("carol", keys=((True, 100, 1),))}
+
+    def evaluate(now: float, **changed: str) -> list[str]:
+        table = parse_credential_report("\n".join([HEADER, *{**rows, **changed}.values()]).encode())
+        indexes, saved = changed_users(store, "123456789012", table, RULES, now)
+        store.save("123456789012", saved)
+        return [table.columns["user"][index] for index in indexes]
+
+    now = NOW.timestamp()
+    assert evaluate(now) == ["alice", "bob", "carol"]
+    assert evaluate(now + 3600) == []
+    assert evaluate(now + 3600, bob=row("bob", keys=((True, 10, 0.5),))) == ["bob"]
+    # the first reminder day of the password of alice, changed 10 days ago, comes with the same report row
+    reminder = now + (MAX_PASSWORD_AGE - max(REMINDER_SCHEDULE) - 10) * DAY
+    assert "alice" not in evaluate(reminder - 3600)
+    assert "alice" in evaluate(reminder + 3600)
@@ -0,0 +1,193 @@
+"""Per API call metrics of boto3 clients, collected through botocore events.
+
+Shared by all the tools of the repository: attach an ApiMetrics to a boto3 session (or a single client), every call
+made afterwards is counted per (service, operation, region) with its retries, throttles, errors and latency.
+"""
+
+import bisect
+import threading
+import time
+from typing import NamedTuple
+from ratelimit.limiter import THROTTLING_ERROR_CODES
+
+# Upper bounds in seconds of the latency histogram buckets, Prometheus style
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class CallKey(NamedTuple):
+    """Metrics are aggregated per service, operation and region."""
+
+    service: str
+    operation: str
+    region: str
+
+
+class CallStats:
+    """Counters and latency histogram of the calls to an API."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, latency: float):
+        """Add the latency of a call."""
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def merge(self, other: 'CallStats'):
+        """Add the counters and histogram of other."""
+        self.calls += other.calls
+        self.errors += other.errors
+        self.retries += other.retries
+        self.throttles += other.throttles
+        self.latency_sum += other.latency_sum
+        self.latency_max = max(self.latency_max, other.latency_max)
+        self.buckets = [count + other_count for count, other_count in zip(self.buckets, other.buckets)]
+
+    def quantile(self, quantile: float) -> float:
+        """Estimate a latency quantile from the histogram, as the upper bound of the bucket holding it."""
+        rank = quantile * sum(self.buckets)
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.latency_max
+        return 0.0
+
+
+class ApiMetrics:
+    """Collect call counts, retries, throttles, errors and latency of the AWS API calls made by instrumented clients.
+
+    A call is measured from the botocore before-call event to its after-call (or after-call-error) event, retries
+    included. Throttles are counted on each attempt, including the ones retried by botocore.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: CallKey) -> CallStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats.setdefault(key, CallStats())
+        return stats
+
+    @staticmethod
+    def _key(model, context: dict) -> CallKey:
+        return CallKey(model.service_model.service_name, model.name, context.get('client_region') or "global")
+
+    def _before_call(self, model, context, **kwargs):
+        # after-call-error does not give the operation model, the request context is kept until the call ends
+        context['metrics_key'] = self._key(model, context)
+        context['metrics_start'] = time.monotonic()
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        self._record(context, parsed.get('Error', {}).get('Code'),
+                     parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0))
+
+    def _after_call_error(self, exception, context, **kwargs):
+        self._record(context, type(exception).__name__, 0)
+
+    def _needs_retry(self, response, operation, request_dict, **kwargs):
+        # Called by botocore for every attempt, returning None leaves the retry decision to botocore
+        if response is not None and response[1].get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+            key = self._key(operation, request_dict['context'])
+            with self._lock:
+                self._get(key).throttles += 1
+
+    def _record(self, context: dict, error_code: str, retries: int):
+        if 'metrics_key' not in context:
+            return
+        latency = time.monotonic() - context['metrics_start']
+        with self._lock:
+            stats = self._get(context['metrics_key'])
+            stats.calls += 1
+            stats.retries += retries
+            stats.errors += error_code is not None
+            stats.observe(latency)
+
+    def _register(self, events):
+        events.register('before-call', self._before_call, unique_id=f"api-metrics-before-call-{id(self)}")
+        events.register('after-call', self._after_call, unique_id=f"api-metrics-after-call-{id(self)}")
+        events.register('after-call-error', self._after_call_error,
+                        unique_id=f"api-metrics-after-call-error-{id(self)}")
+        events.register('needs-retry', self._needs_retry, unique_id=f"api-metrics-needs-retry-{id(self)}")
+
+    def instrument_session(self, session):
+        """Measure the calls of every client created afterwards from session (boto3.Session)."""
+        self._register(session.events)
+
+    def instrument_client(self, client):
+        """Measure the calls of an already created client."""
+        self._register(client.meta.events)
+
+    def snapshot(self) -> dict:
+        """Return a copy of the statistics, by CallKey."""
+        with self._lock:
+            return {key: _copy(stats) for key, stats in self._stats.items()}
+
+    def merge(self, snapshot: dict):
+        """Add the statistics of a snapshot, e.g. taken in another process."""
+        with self._lock:
+            for key, stats in snapshot.items():
+                self._get(key).merge(stats)
+
+    def reset(self):
+        """Forget the statistics collected so far, e.g. by a former invocation of a warm Lambda."""
+        with self._lock:
+            self._stats = {}
+
+    def summary(self) -> str:
+        """Return a table of the statistics, slowest APIs (by total time spent) first."""
+        stats = self.snapshot()
+        lines = [f"{'Service':<16} {'Operation':<40} {'Region':<16} {'Calls':>7} {'Errors':>7} {'Retries':>7} "
+                 f"{'Throttles':>9} {'Avg ms':>8} {'p99 ms':>8} {'Total s':>8}"]
+        for key, call in sorted(stats.items(), key=lambda item: item[1].latency_sum, reverse=True):
+            lines.append(f"{key.service:<16} {key.operation:<40} {key.region:<16} {call.calls:>7} {call.errors:>7} "
+                         f"{call.retries:>7} {call.throttles:>9} {call.latency_sum / max(call.calls, 1) * 1000:>8.1f} "
+                         f"{call.quantile(0.99) * 1000:>8.0f} {call.latency_sum:>8.2f}")
+        return "\n".join(lines)
+
+    def to_prometheus(self) -> str:
+        """Return the statistics in Prometheus text exposition format."""
+        stats = self.snapshot()
+        lines = []
+        counters = (("aws_api_calls_total", "Calls made", "calls"),
+                    ("aws_api_errors_total", "Calls ending with an error", "errors"),
+                    ("aws_api_retries_total", "Attempts retried by botocore", "retries"),
+                    ("aws_api_throttles_total", "Attempts throttled", "throttles"))
+        for name, description, attribute in counters:
+            lines += [f"# HELP {name} {description}.", f"# TYPE {name} counter"]
+            lines += [f"{name}{{{_labels(key)}}} {getattr(call, attribute)}" for key, call in stats.items()]
+
+        name = "aws_api_call_duration_seconds"
+        lines += [f"# HELP {name} Duration of the calls, retries included.", f"# TYPE {name} histogram"]
+        for key, call in stats.items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), call.buckets):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{_labels(key)},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{_labels(key)}}} {call.latency_sum}")
+            lines.append(f"{name}_count{{{_labels(key)}}} {call.calls}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write the statistics to path in Prometheus text exposition format."""
+        with open(path, "w") as file:
+            file.write(self.to_prometheus())
+
+
+def _copy(stats: CallStats) -> CallStats:
+    copy = CallStats()
+    copy.__dict__.update(stats.__dict__, buckets=list(stats.buckets))
+    return copy
+
+
+def _labels(key: CallKey) -> str:
+    return f'service="{key.service}",operation="{key.operation}",region="{key.region}"'
@@ -0,0 +1,179 @@
+import csv
+import json
+import sys
+import typing
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
+import boto3
+from botocore.config import Config
+
+# Deprecation dates of the Lambda runtimes (phase 1, no more security patches) from the Lambda documentation,
+# completed or overridden with --deprecations
+DEPRECATIONS: typing.Dict[str, str] = {
+    "python2.7": "2021-07-15",
+    "python3.6": "2022-07-18",
+    "python3.7": "2023-12-04",
+    "python3.8": "2024-10-14",
+    "python3.9": "2025-12-15",
+    "nodejs10.x": "2021-07-30",
+    "nodejs12.x": "2023-03-31",
+    "nodejs14.x": "2023-12-04",
+    "nodejs16.x": "2024-06-12",
+    "nodejs18.x": "2025-09-01",
+    "java8": "2024-01-08",
+    "dotnetcore2.1": "2022-01-05",
+    "dotnetcore3.1": "2023-04-03",
+    "dotnet6": "2024-12-20",
+    "dotnet7": "2024-05-14",
+    "go1.x": "2024-01-08",
+    "ruby2.5": "2021-07-30",
+    "ruby2.7": "2023-12-07",
+    "provided": "2024-01-08",
+}
+
+# one worker per region of an account, list_functions pages are small (50 functions)
+MAX_WORKERS: int = 17
+# throttled list_functions calls are retried by botocore
+CLIENT_CONFIG = Config(retries={"mode": "standard", "max_attempts": 10})
+
+
+class FunctionRecord(typing.NamedTuple):
+    """A function (or a version with all_versions) found by the scan, runtime is empty for container images"""
+    account: str
+    region: str
+    name: str
+    arn: str
+    runtime: str
+    package_type: str
+    last_modified: str
+    deprecation: str
+
+
+FIELDS = list(FunctionRecord._fields)
+
+
+class Inventory:
+    """Functions found by a scan, indexed by runtime, region and deprecation date, with the scan errors
+    """
+
+    def __init__(self, deprecations: typing.Dict[str, str] = None):
+        self.deprecations = dict(DEPRECATIONS, **(deprecations or {}))
+        self.records: list[FunctionRecord] = []
+        self.by_runtime: typing.Dict[str, list[FunctionRecord]] = {}
+        self.by_region: typing.Dict[str, list[FunctionRecord]] = {}
+        self.by_deprecation: typing.Dict[str, list[FunctionRecord]] = {}
+        # error by "account/region" not scanned
+        self.errors: typing.Dict[str, str] = {}
+
+    def add(self, account: str, region: str, function: dict):
+        runtime = function.get("Runtime", "")
+        record = FunctionRecord(account, region, function["FunctionName"], function["FunctionArn"], runtime,
+                                function.get("PackageType", "Zip"), function.get("LastModified", ""),
+                                self.deprecations.get(runtime, ""))
+        self.records.append(record)
+        self.by_runtime.setdefault(runtime, []).append(record)
+        self.by_region.setdefault(region, []).append(record)
+        if record.deprecation:
+            self.by_deprecation.setdefault(record.deprecation, []).append(record)
+
+    def deprecated(self, before: date = None) -> list[FunctionRecord]:
+        """Return the functions whose runtime is deprecated before a date (today by default), earliest first"""
+        limit = (before or date.today()).isoformat()
+        return [record for deprecation in sorted(self.by_deprecation) if deprecation < limit
+                for record in self.by_deprecation[deprecation]]
+
+    def summary(self) -> dict:
+        return {
+            "functions": len(self.records),
+            "by_runtime": {runtime: len(records) for runtime, records in sorted(self.by_runtime.items())},
+            "by_region": {region: len(records) for region, records in sorted(self.by_region.items())},
+            "by_deprecation": {deprecation: len(records)
+                               for deprecation, records in sorted(self.by_deprecation.items())},
+            "deprecated": len(self.deprecated()),
+            "errors": self.errors,
+        }
+
+    def sort(self):
+        self.records.sort()
+        for index in (self.by_runtime, self.by_region, self.by_deprecation):
+            for records in index.values():
+                records.sort()
+
+    def write_json(self, file: typing.TextIO):
+        json.dump({"summary": self.summary(), "functions": [record._asdict() for record in self.records]}, file,
+                  indent=2)
+        file.write("\n")
+
+    def write_csv(self, file: typing.TextIO):
+        writer = csv.writer(file)
+        writer.writerow(FIELDS)
+        writer.writerows(self.records)
+
+
+def enabled_regions(session: boto3.Session) -> list[str]:
+    """Return the regions enabled in the account of session, opt-in regions included once enabled"""
+    return sorted(region["RegionName"] for region in
+                  session.client("ec2", region_name="us-east-1").describe_regions()["Regions"])
+
+
+def list_functions(lambda_client, all_versions: bool = False) -> typing.Iterator[dict]:
+    params = {"FunctionVersion": "ALL"} if all_versions else {}
+    for page in lambda_client.get_paginator("list_functions").paginate(**params):
+        yield from page["Functions"]
+
+
+def scan(accounts: list[str], open_session: typing.Callable[[str], boto3.Session], regions: list[str] = None,
+         max_workers: int = MAX_WORKERS, all_versions: bool = False,
+         deprecations: typing.Dict[str, str] = None) -> Inventory:
+    """List the functions of every account and region concurrently
+
+    Arguments:
+        accounts: accounts to scan
+        open_session: return a session opened in an account, e.g. by assuming a role, called by the workers
+        regions: regions to scan, the regions enabled in each account if None
+        max_workers: number of accounts set up and regions listed at the same time
+        all_versions: also list the published versions of the functions, they keep the runtime they were published
+            with
+        deprecations: deprecation date of runtimes, in addition to DEPRECATIONS
+
+    Returns:
+        the functions found, and the error of each account and region that could not be scanned
+    """
+    inventory = Inventory(deprecations)
+
+    def setup(account: str) -> typing.Dict[str, typing.Any]:
+        # the clients of a session are all created by the worker setting up its account, creating clients from a
+        # session is not thread safe
+        session = open_session(account)
+        return {region: session.client("lambda", region_name=region, config=CLIENT_CONFIG)
+                for region in regions or enabled_regions(session)}
+
+    def list_all(client) -> list[dict]:
+        return list(list_functions(client, all_versions))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # the regions of an account are listed as soon as it is set up, region is None for the setup of an account
+        pending = {executor.submit(setup, account): (account, None) for account in accounts}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            # records are only added by this thread
+            for future in done:
+                account, region = pending.pop(future)
+                if region is None:
+                    try:
+                        clients = future.result()
+                    except Exception as e:
+                        print(f"ERROR\t{account}\tAccount not set up -> {e}", file=sys.stderr)
+                        inventory.errors[account] = str(e)
+                        continue
+                    pending.update({executor.submit(list_all, client): (account, client_region)
+                                    for client_region, client in clients.items()})
+                    continue
+                try:
+                    for function in future.result():
+                        inventory.add(account, region, function)
+                except Exception as e:
+                    print(f"ERROR\t{account}\t{region}\tFunctions not listed -> {e}", file=sys.stderr)
+                    inventory.errors[f"{account}/{region}"] = str(e)
+    inventory.sort()
+    return inventory
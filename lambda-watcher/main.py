@@ -1,17 +1,88 @@
+import argparse
+import json
+import os
+import sys
+import typing
 import boto3
 from boto_session_manager import BotoSesManager
 
-# function to scan lambda runtime in all region of an account
+# Modules shared by all the tools live at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from accounts.organization import assume_role, list_member_accounts  # noqa: E402
+from instrumentation.metrics import ApiMetrics  # noqa: E402
+from inventory import MAX_WORKERS, Inventory, scan  # noqa: E402
 
+# function to scan lambda runtime in all region of an account, or of several accounts
 
-def scan_lambda_runtime():
+
+def scan_lambda_runtime(metrics: ApiMetrics = None, accounts: list[str] = None, role_name: str = None,
+                        organization: bool = False, regions: list[str] = None, max_workers: int = MAX_WORKERS,
+                        all_versions: bool = False, deprecations: typing.Dict[str, str] = None) -> Inventory:
     bsm = BotoSesManager()
-    lambda_client = bsm.lambda_client
-    response = lambda_client.list_functions()
-    for function in response["Functions"]:
-        print(function["Runtime"])
-        print(function["FunctionArn"])
-        print(function["FunctionName"])
+    if metrics:
+        # clients are created lazily by bsm, from its session
+        metrics.instrument_session(bsm.boto_ses)
+    if organization:
+        accounts = list(list_member_accounts(bsm.boto_ses.client("organizations")))
+
+    # the other accounts are scanned with role_name, assumed from the current account by the workers
+    own_account = bsm.aws_account_id
+    sts_client = bsm.boto_ses.client("sts")
+
+    def open_session(account: str) -> boto3.Session:
+        if account == own_account:
+            return bsm.boto_ses
+        session = assume_role(sts_client, account, role_name, "lambda-watcher")
+        if metrics:
+            metrics.instrument_session(session)
+        return session
+
+    return scan(accounts or [own_account], open_session, regions, max_workers=max_workers, all_versions=all_versions,
+                deprecations=deprecations)
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Inventory the Lambda functions and runtimes of all the regions.")
+    parser.add_argument("--regions", nargs="+", help="Only scan these regions, all enabled regions by default")
+    parser.add_argument("--accounts", nargs="+", help="Scan these accounts with --role, the current one by default")
+    parser.add_argument("--organization", action="store_true",
+                        help="Scan all the active accounts of the organization with --role")
+    parser.add_argument("--role", default="OrganizationAccountAccessRole", help="Role assumed in the other accounts")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Number of regions scanned at the same time")
+    parser.add_argument("--all-versions", action="store_true", help="Also list the published versions")
+    parser.add_argument("--deprecations", help="Json file of runtime deprecation dates, e.g. {\"python3.10\": "
+                                               "\"2026-10-31\"}, in addition to the known ones")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Output format")
+    parser.add_argument("--output", help="Output file, the standard output by default")
+    args = parser.parse_args()
+
+    deprecations = None
+    if args.deprecations:
+        with open(args.deprecations) as file:
+            deprecations = json.load(file)
+
+    metrics = ApiMetrics()
+    inventory = scan_lambda_runtime(metrics, args.accounts, args.role, args.organization, args.regions, args.workers,
+                                    args.all_versions, deprecations)
+
+    file = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            inventory.write_csv(file)
+        else:
+            inventory.write_json(file)
+    finally:
+        if args.output:
+            file.close()
+
+    # the standard output may hold the inventory, the summaries go to the standard error
+    summary = inventory.summary()
+    print(f"{summary['functions']} functions, {summary['deprecated']} with a deprecated runtime, "
+          f"{len(summary['errors'])} errors", file=sys.stderr)
+    print(f"AWS API calls:\n{metrics.summary()}", file=sys.stderr)
+    if os.environ.get("METRICS_FILE"):
+        metrics.write_prometheus(os.environ["METRICS_FILE"])
 
 
-scan_lambda_runtime()
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,74 @@
+"""Client side rate limiting and retries of AWS API calls.
+
+Shared by the tools of the repository calling APIs with a low account-wide quota (IAM writes, SES sends, EC2 calls of
+all-region-modifier): a RateLimiter is shared by the threads making the calls, call_with_retries retries the throttled
+and transient errors with an exponential backoff and full jitter.
+"""
+
+import random
+import threading
+import time
+from typing import Callable
+from botocore.exceptions import ClientError
+
+# Error codes of the throttling responses of AWS APIs, also counted as throttles by instrumentation.metrics
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "SlowDown",
+    "PriorRequestNotComplete",
+}
+MAX_ATTEMPTS = 6
+BASE_DELAY = 0.5
+MAX_DELAY = 10.0
+RETRYABLE_ERROR_CODES = THROTTLING_ERROR_CODES | {"ServiceFailure", "ConcurrentModification"}
+
+
+class RateLimiter:
+    """Token bucket shared by threads, rate calls per second with bursts of burst calls.
+
+    A caller takes its token at once and waits for it outside of the lock: the tokens taken ahead of time are owed by
+    the next callers, who wait in turn, so that several buckets can be reserved before waiting for the longest.
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return the number of seconds to wait before it can be used."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        """Block until a call is allowed."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def call_with_retries(method: Callable, params: dict, limiter: RateLimiter = None,
+                      retryable: set = RETRYABLE_ERROR_CODES, max_attempts: int = MAX_ATTEMPTS,
+                      base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY):
+    """Return method(**params), each attempt acquiring limiter, errors with a retryable code being retried."""
+    for attempt in range(max_attempts):
+        if limiter:
+            limiter.acquire()
+        try:
+            return method(**params)
+        except ClientError as err:
+            if err.response["Error"]["Code"] not in retryable or attempt == max_attempts - 1:
+                raise
+        time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
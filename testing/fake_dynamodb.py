@@ -0,0 +1,66 @@
+"""In-memory DynamoDB client for the unit tests of the tools keeping items in tables.
+
+Implements the batch calls with their limits (keys and items per request) and their partial results: the keys and
+items of a call can be left unprocessed to simulate a throttled table, and every call is recorded.
+"""
+
+from botocore.exceptions import ClientError
+
+MAX_BATCH_GET_KEYS = 100
+MAX_BATCH_WRITE_ITEMS = 25
+
+
+def _key(item: dict) -> tuple:
+    return tuple(sorted((name, next(iter(value.values()))) for name, value in item.items()
+                        if name in ("account", "username")))
+
+
+class FakeDynamoDB:
+    """DynamoDB client of tables keyed by account (hash) and username (range)."""
+
+    def __init__(self):
+        # items of each table by key
+        self.tables: dict[str, dict[tuple, dict]] = {}
+        # (operation, params) of every call
+        self.calls: list[tuple[str, dict]] = []
+        # number of keys or items left unprocessed by the next batch calls, in order
+        self.unprocessed: list[int] = []
+
+    def _record(self, operation: str, params: dict) -> int:
+        self.calls.append((operation, params))
+        return self.unprocessed.pop(0) if self.unprocessed else 0
+
+    def items(self, table_name: str) -> list[dict]:
+        return list(self.tables.get(table_name, {}).values())
+
+    def batch_get_item(self, RequestItems: dict):
+        skipped = self._record("batch_get_item", RequestItems)
+        responses, unprocessed = {}, {}
+        for table_name, request in RequestItems.items():
+            keys = request["Keys"]
+            if len(keys) > MAX_BATCH_GET_KEYS:
+                raise ClientError({"Error": {"Code": "ValidationException"}}, "BatchGetItem")
+            kept = len(keys) - min(skipped, len(keys))
+            if kept < len(keys):
+                unprocessed[table_name] = {**request, "Keys": keys[kept:]}
+            names = request.get("ExpressionAttributeNames", {})
+            projection = [names.get(name.strip(), name.strip()) for name in request["ProjectionExpression"].split(",")]
+            table = self.tables.get(table_name, {})
+            responses[table_name] = [{name: value for name, value in table[_key(key)].items() if name in projection}
+                                     for key in keys[:kept] if _key(key) in table]
+        return {"Responses": responses, "UnprocessedKeys": unprocessed}
+
+    def batch_write_item(self, RequestItems: dict):
+        skipped = self._record("batch_write_item", RequestItems)
+        unprocessed = {}
+        for table_name, requests in RequestItems.items():
+            if len(requests) > MAX_BATCH_WRITE_ITEMS:
+                raise ClientError({"Error": {"Code": "ValidationException"}}, "BatchWriteItem")
+            kept = len(requests) - min(skipped, len(requests))
+            if kept < len(requests):
+                unprocessed[table_name] = requests[kept:]
+            table = self.tables.setdefault(table_name, {})
+            for request in requests[:kept]:
+                item = request["PutRequest"]["Item"]
+                table[_key(item)] = item
+        return {"UnprocessedItems": unprocessed}
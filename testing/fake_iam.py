@@ -0,0 +1,287 @@
+"""In-memory IAM client for the unit tests of the tools creating or deleting IAM resources.
+
+Implements the calls of iam-watcher remediations and of iam-builder plans with the errors IAM returns for them
+(NoSuchEntity, EntityAlreadyExists, DeleteConflict...). Every call is recorded, and errors can be injected per
+operation to simulate throttling or failures.
+"""
+
+import json
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from botocore.exceptions import ClientError
+
+ACCOUNT = "123456789012"
+# creation date of the entities, each entity is created one second after the former one
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def client_error(code: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": f"{code} (fake)"}}, operation)
+
+
+class FakeIAM:
+    """IAM client of a single account, the calls not implemented raise AttributeError."""
+
+    def __init__(self, account: str = ACCOUNT):
+        self.account = account
+        self.users: dict[str, dict] = {}
+        self.groups: dict[str, dict] = {}
+        self.roles: dict[str, dict] = {}
+        # by ARN
+        self.policies: dict[str, dict] = {}
+        # (operation, params) of every call
+        self.calls: list[tuple[str, dict]] = []
+        # error codes raised by the next calls of an operation, in order
+        self.errors: dict[str, list[str]] = {}
+        self._created = 0
+
+    def _now(self) -> datetime:
+        self._created += 1
+        return EPOCH + timedelta(seconds=self._created)
+
+    def __getattr__(self, operation: str):
+        method = getattr(type(self), f"_{operation}", None)
+        if method is None:
+            raise AttributeError(operation)
+
+        def call(**params):
+            self.calls.append((operation, params))
+            if self.errors.get(operation):
+                raise client_error(self.errors[operation].pop(0), operation)
+            return method(self, **params) or {}
+        return call
+
+    def operations(self) -> list[str]:
+        return [operation for operation, _ in self.calls]
+
+    def mutating_operations(self) -> list[str]:
+        return [operation for operation in self.operations() if not operation.startswith(("get_", "list_"))]
+
+    # state helpers of the tests, they are not recorded as calls
+
+    def add_user(self, name: str, password: bool = False, keys: tuple[str, ...] = (), path: str = "/",
+                 groups: tuple[str, ...] = (), policies: tuple[str, ...] = (), tags: dict = None) -> dict:
+        """Create a user with a login profile if password, and an access key of each status of keys"""
+        self.users[name] = {"path": path, "password": password, "keys": [], "groups": set(groups),
+                            "policies": set(policies), "tags": dict(tags or {}), "inline": [], "mfa": [],
+                            "certificates": [], "ssh_keys": []}
+        for status in keys:
+            self.add_key(name, status)
+        return self.users[name]
+
+    def add_key(self, username: str, status: str = "Active") -> dict:
+        created = self._now()
+        key = {"UserName": username, "AccessKeyId": f"AKIA{self._created:016d}", "Status": status,
+               "CreateDate": created}
+        self.users[username]["keys"].append(key)
+        return key
+
+    def policy_arn(self, name: str, path: str = "/") -> str:
+        return f"arn:aws:iam::{self.account}:policy{path}{name}"
+
+    def _user(self, name: str, operation: str) -> dict:
+        if name not in self.users:
+            raise client_error("NoSuchEntity", operation)
+        return self.users[name]
+
+    @staticmethod
+    def _page(key: str, items: list) -> dict:
+        return {key: items, "IsTruncated": False}
+
+    # users
+
+    def _get_login_profile(self, UserName: str):
+        if not self._user(UserName, "GetLoginProfile")["password"]:
+            raise client_error("NoSuchEntity", "GetLoginProfile")
+        return {"LoginProfile": {"UserName": UserName}}
+
+    def _delete_login_profile(self, UserName: str):
+        self._get_login_profile(UserName)
+        self.users[UserName]["password"] = False
+
+    def _list_access_keys(self, UserName: str, **params):
+        return self._page("AccessKeyMetadata", list(self._user(UserName, "ListAccessKeys")["keys"]))
+
+    def _delete_access_key(self, UserName: str, AccessKeyId: str):
+        keys = self._user(UserName, "DeleteAccessKey")["keys"]
+        if not any(key["AccessKeyId"] == AccessKeyId for key in keys):
+            raise client_error("NoSuchEntity", "DeleteAccessKey")
+        keys[:] = [key for key in keys if key["AccessKeyId"] != AccessKeyId]
+
+    def _list_signing_certificates(self, UserName: str, **params):
+        return self._page("Certificates", self._user(UserName, "ListSigningCertificates")["certificates"])
+
+    def _list_ssh_public_keys(self, UserName: str, **params):
+        return self._page("SSHPublicKeys", self._user(UserName, "ListSSHPublicKeys")["ssh_keys"])
+
+    def _list_mfa_devices(self, UserName: str, **params):
+        return self._page("MFADevices", [{"SerialNumber": serial}
+                                         for serial in self._user(UserName, "ListMFADevices")["mfa"]])
+
+    def _deactivate_mfa_device(self, UserName: str, SerialNumber: str):
+        self._user(UserName, "DeactivateMFADevice")["mfa"].remove(SerialNumber)
+
+    def _list_user_policies(self, UserName: str, **params):
+        return self._page("PolicyNames", list(self._user(UserName, "ListUserPolicies")["inline"]))
+
+    def _delete_user_policy(self, UserName: str, PolicyName: str):
+        self._user(UserName, "DeleteUserPolicy")["inline"].remove(PolicyName)
+
+    def _list_attached_user_policies(self, UserName: str, **params):
+        return self._page("AttachedPolicies", [{"PolicyArn": arn} for arn in
+                                               sorted(self._user(UserName, "ListAttachedUserPolicies")["policies"])])
+
+    def _list_groups_for_user(self, UserName: str, **params):
+        return self._page("Groups", [{"GroupName": group} for group in
+                                     sorted(self._user(UserName, "ListGroupsForUser")["groups"])])
+
+    def _create_user(self, UserName: str, Path: str = "/", Tags: list = ()):
+        if UserName in self.users:
+            raise client_error("EntityAlreadyExists", "CreateUser")
+        self.add_user(UserName, path=Path, tags={tag["Key"]: tag["Value"] for tag in Tags})
+
+    def _delete_user(self, UserName: str):
+        user = self._user(UserName, "DeleteUser")
+        if any(user[name] for name in ("password", "keys", "groups", "policies", "inline", "mfa", "certificates",
+                                       "ssh_keys")):
+            raise client_error("DeleteConflict", "DeleteUser")
+        del self.users[UserName]
+
+    def _tag_user(self, UserName: str, Tags: list):
+        self._user(UserName, "TagUser")["tags"].update({tag["Key"]: tag["Value"] for tag in Tags})
+
+    def _untag_user(self, UserName: str, TagKeys: list):
+        tags = self._user(UserName, "UntagUser")["tags"]
+        for key in TagKeys:
+            tags.pop(key, None)
+
+    def _list_user_tags(self, UserName: str, **params):
+        return self._page("Tags", [{"Key": key, "Value": value}
+                                   for key, value in self._user(UserName, "ListUserTags")["tags"].items()])
+
+    # groups
+
+    def _create_group(self, GroupName: str, Path: str = "/"):
+        if GroupName in self.groups:
+            raise client_error("EntityAlreadyExists", "CreateGroup")
+        self.groups[GroupName] = {"path": Path, "policies": set()}
+
+    def _add_user_to_group(self, UserName: str, GroupName: str):
+        if GroupName not in self.groups:
+            raise client_error("NoSuchEntity", "AddUserToGroup")
+        self._user(UserName, "AddUserToGroup")["groups"].add(GroupName)
+
+    def _remove_user_from_group(self, UserName: str, GroupName: str):
+        groups = self._user(UserName, "RemoveUserFromGroup")["groups"]
+        if GroupName not in groups:
+            raise client_error("NoSuchEntity", "RemoveUserFromGroup")
+        groups.remove(GroupName)
+
+    # roles
+
+    def _create_role(self, RoleName: str, AssumeRolePolicyDocument: str, Path: str = "/", Tags: list = ()):
+        if RoleName in self.roles:
+            raise client_error("EntityAlreadyExists", "CreateRole")
+        self.roles[RoleName] = {"path": Path, "trust": json.loads(AssumeRolePolicyDocument), "policies": set(),
+                                "tags": {tag["Key"]: tag["Value"] for tag in Tags}}
+
+    def _update_assume_role_policy(self, RoleName: str, PolicyDocument: str):
+        if RoleName not in self.roles:
+            raise client_error("NoSuchEntity", "UpdateAssumeRolePolicy")
+        self.roles[RoleName]["trust"] = json.loads(PolicyDocument)
+
+    def _tag_role(self, RoleName: str, Tags: list):
+        self.roles[RoleName]["tags"].update({tag["Key"]: tag["Value"] for tag in Tags})
+
+    def _untag_role(self, RoleName: str, TagKeys: list):
+        for key in TagKeys:
+            self.roles[RoleName]["tags"].pop(key, None)
+
+    # managed policies
+
+    def _create_policy(self, PolicyName: str, PolicyDocument: str, Path: str = "/"):
+        arn = self.policy_arn(PolicyName, Path)
+        if arn in self.policies:
+            raise client_error("EntityAlreadyExists", "CreatePolicy")
+        self.policies[arn] = {"name": PolicyName, "path": Path, "default": "v1",
+                              "versions": [("v1", json.loads(PolicyDocument), self._now())]}
+        return {"Policy": {"Arn": arn}}
+
+    def _create_policy_version(self, PolicyArn: str, PolicyDocument: str, SetAsDefault: bool = False):
+        policy = self.policies[PolicyArn]
+        if len(policy["versions"]) >= 5:
+            raise client_error("LimitExceeded", "CreatePolicyVersion")
+        version = f"v{max(int(version[1:]) for version, _, _ in policy['versions']) + 1}"
+        policy["versions"].append((version, json.loads(PolicyDocument), self._now()))
+        if SetAsDefault:
+            policy["default"] = version
+
+    def _delete_policy_version(self, PolicyArn: str, VersionId: str):
+        policy = self.policies[PolicyArn]
+        if VersionId == policy["default"]:
+            raise client_error("DeleteConflict", "DeletePolicyVersion")
+        policy["versions"] = [version for version in policy["versions"] if version[0] != VersionId]
+
+    def _attach(self, entity: dict, arn: str, operation: str):
+        if arn.startswith(f"arn:aws:iam::{self.account}:") and arn not in self.policies:
+            raise client_error("NoSuchEntity", operation)
+        entity["policies"].add(arn)
+
+    def _attach_user_policy(self, UserName: str, PolicyArn: str):
+        self._attach(self._user(UserName, "AttachUserPolicy"), PolicyArn, "AttachUserPolicy")
+
+    def _detach_user_policy(self, UserName: str, PolicyArn: str):
+        self._user(UserName, "DetachUserPolicy")["policies"].discard(PolicyArn)
+
+    def _attach_group_policy(self, GroupName: str, PolicyArn: str):
+        self._attach(self.groups[GroupName], PolicyArn, "AttachGroupPolicy")
+
+    def _detach_group_policy(self, GroupName: str, PolicyArn: str):
+        self.groups[GroupName]["policies"].discard(PolicyArn)
+
+    def _attach_role_policy(self, RoleName: str, PolicyArn: str):
+        self._attach(self.roles[RoleName], PolicyArn, "AttachRolePolicy")
+
+    def _detach_role_policy(self, RoleName: str, PolicyArn: str):
+        self.roles[RoleName]["policies"].discard(PolicyArn)
+
+    # authorization details, as a single page with url encoded documents like the raw IAM response
+
+    def get_paginator(self, operation: str):
+        if operation != "get_account_authorization_details":
+            raise AttributeError(operation)
+        fake = self
+
+        class Paginator:
+            def paginate(self, **params):
+                fake.calls.append((operation, params))
+                yield fake._authorization_details()
+        return Paginator()
+
+    def _authorization_details(self) -> dict:
+        def attached(entity: dict) -> list[dict]:
+            return [{"PolicyArn": arn} for arn in sorted(entity["policies"])]
+
+        def tags(entity: dict) -> list[dict]:
+            return [{"Key": key, "Value": value} for key, value in entity["tags"].items()]
+
+        def encoded(document: dict) -> str:
+            return urllib.parse.quote(json.dumps(document))
+
+        return {
+            "UserDetailList": [{"UserName": name, "Path": user["path"], "GroupList": sorted(user["groups"]),
+                                "AttachedManagedPolicies": attached(user), "Tags": tags(user)}
+                               for name, user in self.users.items()],
+            "GroupDetailList": [{"GroupName": name, "Path": group["path"], "AttachedManagedPolicies": attached(group)}
+                                for name, group in self.groups.items()],
+            "RoleDetailList": [{"RoleName": name, "Path": role["path"],
+                                "AssumeRolePolicyDocument": encoded(role["trust"]),
+                                "AttachedManagedPolicies": attached(role), "Tags": tags(role)}
+                               for name, role in self.roles.items()],
+            "Policies": [{"PolicyName": policy["name"], "Path": policy["path"], "Arn": arn,
+                          "PolicyVersionList": [{"VersionId": version, "Document": encoded(document),
+                                                 "IsDefaultVersion": version == policy["default"], "CreateDate": date}
+                                                for version, document, date in policy["versions"]]}
+                         for arn, policy in self.policies.items()],
+            "IsTruncated": False,
+        }